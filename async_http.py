@@ -0,0 +1,72 @@
+from __future__ import annotations
+
+import asyncio
+import time
+import weakref
+
+import httpx
+
+try:
+    from http_client import DEFAULT_HEADERS, HTTP_POOL_HOSTS, HTTP_POOL_PER_HOST, HTTP_RETRIES
+    from metrics import record_io
+except ImportError:
+    from .http_client import DEFAULT_HEADERS, HTTP_POOL_HOSTS, HTTP_POOL_PER_HOST, HTTP_RETRIES
+    from .metrics import record_io
+
+
+# httpx.AsyncClient is bound to the loop it was created on, so keep one per running loop.
+_CLIENTS: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncClient]" = weakref.WeakKeyDictionary()
+
+
+def get_async_client() -> httpx.AsyncClient:
+    loop = asyncio.get_running_loop()
+    client = _CLIENTS.get(loop)
+    if client is None or client.is_closed:
+        client = httpx.AsyncClient(
+            headers=DEFAULT_HEADERS,
+            follow_redirects=True,
+            transport=httpx.AsyncHTTPTransport(
+                retries=HTTP_RETRIES,
+                limits=httpx.Limits(
+                    max_connections=HTTP_POOL_HOSTS * HTTP_POOL_PER_HOST,
+                    max_keepalive_connections=HTTP_POOL_HOSTS * HTTP_POOL_PER_HOST,
+                ),
+            ),
+        )
+        _CLIENTS[loop] = client
+    return client
+
+
+async def _request(method: str, url: str, **kwargs) -> httpx.Response:
+    started = time.perf_counter()
+    try:
+        response = await get_async_client().request(method, url, **kwargs)
+    except Exception:
+        record_io(f"http_{method.lower()}", time.perf_counter() - started, error=True)
+        raise
+    record_io(
+        f"http_{method.lower()}",
+        time.perf_counter() - started,
+        bytes_in=len(response.content),
+        bytes_out=len(response.request.content),
+    )
+    return response
+
+
+async def async_http_get(url: str, **kwargs) -> httpx.Response:
+    return await _request("GET", url, **kwargs)
+
+
+async def async_http_head(url: str, **kwargs) -> httpx.Response:
+    return await _request("HEAD", url, **kwargs)
+
+
+async def async_http_post(url: str, **kwargs) -> httpx.Response:
+    return await _request("POST", url, **kwargs)
+
+
+async def close_async_client() -> None:
+    loop = asyncio.get_running_loop()
+    client = _CLIENTS.pop(loop, None)
+    if client is not None:
+        await client.aclose()
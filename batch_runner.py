@@ -0,0 +1,243 @@
+from __future__ import annotations
+
+import asyncio
+import csv
+import json
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+from typing import Any, Callable, Dict, List
+
+try:
+    from browser_pool import shutdown_browser_pool
+    from http_client import connection_stats
+    from llm_cache import cache_stats as llm_cache_stats
+    from llm_dispatcher import dispatcher_stats
+    from metrics import metrics_snapshot, start_metrics_server
+    from multi_agent_runner import build_app, close_async_resources, run_pipeline_async
+    from page_cache import cache_stats
+    from parse_pool import warm_parse_pool
+    from single_flight import single_flight_stats
+    from state import make_initial_state
+except ImportError:
+    from .browser_pool import shutdown_browser_pool
+    from .http_client import connection_stats
+    from .llm_cache import cache_stats as llm_cache_stats
+    from .llm_dispatcher import dispatcher_stats
+    from .metrics import metrics_snapshot, start_metrics_server
+    from .multi_agent_runner import build_app, close_async_resources, run_pipeline_async
+    from .page_cache import cache_stats
+    from .parse_pool import warm_parse_pool
+    from .single_flight import single_flight_stats
+    from .state import make_initial_state
+
+_SAFE_ID = re.compile(r"[^A-Za-z0-9_.-]+")
+
+
+def load_goals(path: str) -> List[Dict[str, Any]]:
+    # JSONL lines are {"goal": ..., "id": ..., "max_iterations": ...} objects or bare strings;
+    # CSV needs a "goal" column and may have "id" and "max_iterations".
+    source = Path(path)
+    if source.suffix.lower() == ".csv":
+        with source.open(newline="", encoding="utf-8") as handle:
+            entries = [dict(row) for row in csv.DictReader(handle)]
+    else:
+        entries = []
+        for line in source.read_text(encoding="utf-8").splitlines():
+            if not line.strip():
+                continue
+            value = json.loads(line)
+            entries.append({"goal": value} if isinstance(value, str) else dict(value))
+
+    goals: List[Dict[str, Any]] = []
+    used = set()
+    for number, entry in enumerate(entries, start=1):
+        goal = str(entry.get("goal") or "").strip()
+        if not goal:
+            continue
+        default_id = f"goal-{number:04d}"
+        goal_id = _SAFE_ID.sub("-", str(entry.get("id") or default_id)).strip("-")[:80] or default_id
+        if goal_id in used:
+            goal_id = f"{goal_id}-{number}"
+        used.add(goal_id)
+        max_iterations = str(entry.get("max_iterations") or "").strip()
+        goals.append({"id": goal_id, "goal": goal, "max_iterations": int(max_iterations) if max_iterations else 0})
+    return goals
+
+
+def _record(entry: Dict[str, Any], result: Dict[str, Any] | None, wall: float, error: str) -> Dict[str, Any]:
+    record = {
+        "id": entry["id"],
+        "goal": entry["goal"],
+        "status": "failed" if error else "ok",
+        "wall_seconds": round(wall, 3),
+    }
+    if result is not None:
+        extracted = result.get("extracted_output") if isinstance(result.get("extracted_output"), dict) else {}
+        rows = extracted.get("rows") if isinstance(extracted.get("rows"), list) else result.get("extracted_items") or []
+        record.update(
+            {
+                "rows": len(rows),
+                "iterations": result.get("iteration"),
+                "global_confidence": result.get("global_confidence"),
+                "warnings": len(result.get("errors", [])),
+            }
+        )
+    if error:
+        record["error"] = error
+    return record
+
+
+def _percentile(values: List[float], pct: float) -> float:
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(pct * len(ordered)))]
+
+
+# Runs many goals in one process. One compiled graph is shared, and so is everything
+# process-wide behind it: HTTP pools, page and LLM caches, the Ollama dispatcher, the parse
+# pool and browser pool. Identical page fetches and LLM prompts that overlap across goals are
+# collapsed by single_flight. Each goal's record is appended to results.jsonl and handed to
+# `on_result` (with its final state) as soon as it finishes.
+class BatchRunner:
+    def __init__(
+        self,
+        out_dir: str,
+        concurrency: int = 4,
+        max_iterations: int = 2,
+        async_mode: bool = False,
+        streaming: bool = False,
+        on_result: Callable[[Dict[str, Any], Dict[str, Any] | None], None] | None = None,
+    ):
+        self.out_dir = Path(out_dir)
+        self.concurrency = max(1, concurrency)
+        self.max_iterations = max(1, max_iterations)
+        self.async_mode = async_mode
+        self.streaming = streaming
+        self.on_result = on_result
+        self._lock = threading.Lock()
+        self._records: List[Dict[str, Any]] = []
+
+    def _iterations(self, entry: Dict[str, Any]) -> int:
+        return max(1, entry.get("max_iterations") or self.max_iterations)
+
+    def _finish(self, entry: Dict[str, Any], result: Dict[str, Any] | None, wall: float, error: str) -> None:
+        record = _record(entry, result, wall, error)
+        with self._lock:
+            self._records.append(record)
+            done = len(self._records)
+            with (self.out_dir / "results.jsonl").open("a", encoding="utf-8") as handle:
+                handle.write(json.dumps(record, ensure_ascii=False) + "\n")
+            if self.on_result is not None:
+                self.on_result(record, result)
+            # Printed under the lock too, so the counts appear in order.
+            print(
+                f"[BATCH] {done} done: {entry['id']} {record['status']} in {record['wall_seconds']}s "
+                f"rows={record.get('rows', 0)}",
+                flush=True,
+            )
+
+    def _run_sync(self, goals: List[Dict[str, Any]]) -> None:
+        warm_parse_pool()
+        start_metrics_server()
+        app = build_app(streaming=self.streaming)
+
+        def _one(entry: Dict[str, Any]) -> None:
+            started = time.perf_counter()
+            result, error = None, ""
+            try:
+                result = app.invoke(make_initial_state(goal=entry["goal"], max_iterations=self._iterations(entry)))
+            except Exception as exc:
+                error = f"{type(exc).__name__}: {exc}"
+            self._finish(entry, result, time.perf_counter() - started, error)
+
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="goal") as executor:
+            for future in as_completed([executor.submit(_one, entry) for entry in goals]):
+                future.result()
+
+    async def _run_async(self, goals: List[Dict[str, Any]]) -> None:
+        app = build_app(async_mode=True, streaming=self.streaming)
+        slots = asyncio.Semaphore(self.concurrency)
+
+        async def _one(entry: Dict[str, Any]) -> None:
+            async with slots:
+                started = time.perf_counter()
+                result, error = None, ""
+                try:
+                    result = await run_pipeline_async(
+                        entry["goal"], max_iterations=self._iterations(entry), app=app, streaming=self.streaming
+                    )
+                except Exception as exc:
+                    error = f"{type(exc).__name__}: {exc}"
+                # Output files are written off the loop so other goals keep running.
+                await asyncio.to_thread(self._finish, entry, result, time.perf_counter() - started, error)
+
+        try:
+            await asyncio.gather(*(_one(entry) for entry in goals))
+        finally:
+            await close_async_resources()
+
+    def run(self, goals: List[Dict[str, Any]]) -> Dict[str, Any]:
+        self.out_dir.mkdir(parents=True, exist_ok=True)
+        (self.out_dir / "results.jsonl").write_text("", encoding="utf-8")
+        self._records = []
+        started = time.perf_counter()
+        if self.async_mode:
+            asyncio.run(self._run_async(goals))
+        else:
+            # Goals go through app.invoke rather than run_pipeline, so its teardown is done here.
+            try:
+                self._run_sync(goals)
+            finally:
+                self.close()
+        elapsed = time.perf_counter() - started
+
+        report = self.report(elapsed)
+        (self.out_dir / "report.json").write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+        return report
+
+    def close(self) -> None:
+        # What run_pipeline does after each goal, once for the whole batch: the sync graph's
+        # Playwright pages and browser. The async path closes its own clients as well.
+        shutdown_browser_pool()
+
+    def report(self, elapsed: float) -> Dict[str, Any]:
+        walls = [record["wall_seconds"] for record in self._records]
+        ok = sum(1 for record in self._records if record["status"] == "ok")
+        http_stats = connection_stats()
+        page_stats = cache_stats()
+        llm_stats = llm_cache_stats()
+        return {
+            "goals": len(self._records),
+            "ok": ok,
+            "failed": len(self._records) - ok,
+            "concurrency": self.concurrency,
+            "async_mode": self.async_mode,
+            "elapsed_seconds": round(elapsed, 3),
+            "goals_per_min": round(60.0 * len(self._records) / elapsed, 2) if elapsed else 0.0,
+            # Sum of per-goal wall time over elapsed time: how many goals were effectively in flight.
+            "overlap": round(sum(walls) / elapsed, 2) if elapsed else 0.0,
+            "goal_seconds": {
+                "p50": round(_percentile(walls, 0.5), 3),
+                "p90": round(_percentile(walls, 0.9), 3),
+                "max": round(max(walls, default=0.0), 3),
+            },
+            "rows": sum(record.get("rows", 0) for record in self._records),
+            "single_flight": single_flight_stats(),
+            "http": {
+                "requests": http_stats["requests"],
+                "new_connections": http_stats["new_connections"],
+                "reused_connections": http_stats["reused_connections"],
+            },
+            "page_cache": {"hits": page_stats["hits"], "misses": page_stats["misses"]},
+            "llm_cache": {
+                "hits": llm_stats["memory_hits"] + llm_stats["disk_hits"],
+                "misses": llm_stats["misses"],
+                "hit_rate": round(llm_stats["hit_rate"], 3),
+            },
+            "llm_dispatcher": dispatcher_stats(),
+            "metrics": metrics_snapshot(),
+        }
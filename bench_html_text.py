@@ -0,0 +1,151 @@
+from __future__ import annotations
+
+import argparse
+import json
+import random
+import time
+import zlib
+from pathlib import Path
+
+try:
+    import html_text
+except ImportError:
+    from . import html_text
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Benchmark HTML-to-text engines on saved pages.")
+    parser.add_argument("--pages", default="", help="Directory of saved .html/.htm pages (searched recursively).")
+    parser.add_argument("--page-cache-dir", default=".page_cache", help="Also read pages stored in the page cache.")
+    parser.add_argument("--limit", type=int, default=0, help="Use at most this many pages (0 = all).")
+    parser.add_argument("--repeat", type=int, default=3, help="Timed passes over the corpus per engine.")
+    parser.add_argument("--save-json", default="", help="Optional path for the benchmark report.")
+    parser.add_argument(
+        "--check",
+        action="store_true",
+        help="Compare lxml against bs4 page by page, print the pages that differ and exit 1 if any do.",
+    )
+    parser.add_argument("--fuzz", type=int, default=0, help="Add this many generated tag-soup documents.")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for --fuzz.")
+    return parser
+
+
+def _load_corpus(pages_dir: str, cache_dir: str, limit: int) -> list:
+    corpus = []
+    if pages_dir:
+        for path in sorted(Path(pages_dir).rglob("*.htm*")):
+            corpus.append(path.read_text(encoding="utf-8", errors="replace"))
+    blobs = Path(cache_dir) / "blobs"
+    if blobs.is_dir():
+        for path in sorted(blobs.glob("*.z")):
+            corpus.append(zlib.decompress(path.read_bytes()).decode("utf-8", errors="replace"))
+    return corpus[:limit] if limit > 0 else corpus
+
+
+_SOUP_TAGS = (
+    "p li h1 h2 div span a b i u small ul ol table tr td script style nav section header form "
+    "blockquote pre code em br img"
+).split()
+_SOUP_WORDS = "alpha beta gamma delta &amp; &lt; &copy; &nbsp; &#169; &#x41; lorem ipsum dolor sit amet".split()
+
+
+def _soup(rng: random.Random, depth: int = 0) -> str:
+    # Random nesting with a few unclosed tags: the repairs real pages need, in small documents.
+    out = []
+    for _ in range(rng.randint(1, 5)):
+        roll = rng.random()
+        if roll < 0.4 or depth > 4:
+            out.append(" ".join(rng.choice(_SOUP_WORDS) for _ in range(rng.randint(1, 15))))
+        elif roll < 0.45:
+            out.append("<!-- <p> -->")
+        else:
+            tag = rng.choice(_SOUP_TAGS)
+            if tag in html_text.VOID_TAGS:
+                out.append(f"<{tag}>")
+            else:
+                end = f"</{tag}>" if rng.random() > 0.05 else ""
+                out.append(f"<{tag}>{_soup(rng, depth + 1)}{end}")
+    return "".join(out)
+
+
+def _fuzz_corpus(count: int, seed: int) -> list:
+    rng = random.Random(seed)
+    return [f"<html><body>{_soup(rng)}</body></html>" for _ in range(count)]
+
+
+def _check(corpus: list) -> int:
+    # The lxml engine must match bs4 exactly; pages its guard sends to bs4 match trivially.
+    differing = 0
+    for idx, html in enumerate(corpus):
+        expected = html_text._bs4_text(html)
+        actual = html_text._lxml_text(html)
+        if actual == expected:
+            continue
+        differing += 1
+        if differing <= 5:
+            print(f"[CHECK] page {idx} differs ({len(html)} chars): {html[:300]!r}")
+            print(f"[CHECK]   bs4:  {expected[:200]!r}")
+            print(f"[CHECK]   lxml: {actual[:200]!r}")
+    print(f"[CHECK] lxml output differs from bs4 on {differing}/{len(corpus)} pages")
+    return 1 if differing else 0
+
+
+def _time_engine(engine: str, corpus: list, repeat: int) -> dict:
+    extract = html_text.ENGINES[engine]
+    per_page = [float("inf")] * len(corpus)
+    for _ in range(max(1, repeat)):
+        for idx, html in enumerate(corpus):
+            started = time.perf_counter()
+            extract(html)
+            per_page[idx] = min(per_page[idx], time.perf_counter() - started)
+    total = sum(per_page)
+    megabytes = sum(len(html.encode("utf-8")) for html in corpus) / 1e6
+    ordered = sorted(per_page)
+    return {
+        "engine": engine,
+        "mb_per_s": round(megabytes / total, 2) if total else 0.0,
+        "mean_ms": round(1000 * total / len(corpus), 3),
+        "p50_ms": round(1000 * ordered[len(ordered) // 2], 3),
+        "p95_ms": round(1000 * ordered[min(len(ordered) - 1, int(0.95 * len(ordered)))], 3),
+    }
+
+
+def main() -> int:
+    args = build_parser().parse_args()
+    corpus = _load_corpus(args.pages, args.page_cache_dir, args.limit) + _fuzz_corpus(args.fuzz, args.seed)
+    if not corpus:
+        print("[BENCH] no pages found; pass --pages DIR or --fuzz N, or populate the page cache first")
+        return 1
+    if args.check:
+        if "lxml" not in html_text.ENGINES:
+            print("[CHECK] lxml is not installed; only the bs4 engine is available")
+            return 1
+        return _check(corpus)
+    megabytes = sum(len(html.encode("utf-8")) for html in corpus) / 1e6
+    print(f"[BENCH] pages={len(corpus)} size={megabytes:.2f}MB engines={', '.join(html_text.ENGINES)}")
+
+    report = {"pages": len(corpus), "megabytes": round(megabytes, 3), "engines": {}}
+    for engine in html_text.ENGINES:
+        timing = _time_engine(engine, corpus, args.repeat)
+        report["engines"][engine] = timing
+        print(
+            f"[BENCH] {engine:<5} {timing['mb_per_s']:>7} MB/s  mean={timing['mean_ms']}ms "
+            f"p50={timing['p50_ms']}ms p95={timing['p95_ms']}ms"
+        )
+
+    if "lxml" in html_text.ENGINES:
+        # Pages the guard sends to bs4 still count toward lxml's timings above.
+        fast = sum(1 for html in corpus if html_text._lxml_safe(html_text._HTML5_VOID.sub("<br>", html)))
+        identical = sum(1 for html in corpus if html_text._lxml_text(html) == html_text._bs4_text(html))
+        report["lxml_fast_path_pages"] = fast
+        report["lxml_identical_pages"] = identical
+        print(f"[BENCH] lxml fast path on {fast}/{len(corpus)} pages; output identical on {identical}/{len(corpus)}")
+
+    if args.save_json:
+        Path(args.save_json).write_text(json.dumps(report, indent=2), encoding="utf-8")
+        print(f"Saved benchmark report to: {args.save_json}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,254 @@
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import time
+from pathlib import Path
+
+try:
+    from bench_servers import StandInServers
+except ImportError:
+    from .bench_servers import StandInServers
+
+DEFAULT_GOALS = [
+    "Extract PROTACs and linkers from 2025 in table format",
+    "List PROTAC degraders with their E3 ligase and target from 2025 studies",
+]
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        description="Benchmark the full pipeline offline against stand-in search, page and Ollama servers."
+    )
+    parser.add_argument("--goal", action="append", default=[], help="Goal to run (repeatable; defaults to two PROTAC goals).")
+    parser.add_argument("--repeat", type=int, default=3, help="Timed runs per goal.")
+    parser.add_argument("--max-iterations", type=int, default=1)
+    parser.add_argument("--async-mode", action="store_true", help="Run the async graph.")
+    parser.add_argument("--streaming", action="store_true", help="Use the overlapped scrape+retrieval node.")
+    parser.add_argument("--articles", type=int, default=10, help="Article pages served by the stand-in web.")
+    parser.add_argument("--paragraphs", type=int, default=12, help="Paragraphs per article (page size knob).")
+    parser.add_argument("--slow-seconds", type=float, default=3.0, help="Delay of the one slow page.")
+    parser.add_argument("--llm-latency", type=float, default=0.05, help="Fixed seconds per stand-in LLM call.")
+    parser.add_argument(
+        "--llm-latency-per-kchar", type=float, default=0.01, help="Extra seconds per 1000 prompt characters."
+    )
+    parser.add_argument("--save-json", default="", help="Optional path for the benchmark report.")
+    parser.add_argument("--compare", default="", help="Earlier report to diff against.")
+    return parser
+
+
+def _configure_env(servers: StandInServers, args) -> None:
+    # Module constants read these at import, so they are set before the pipeline is imported.
+    # Caches are off so every repeat does the same work.
+    os.environ["OLLAMA_HOST"] = servers.ollama_host
+    os.environ["DUCKDUCKGO_SEARCH_URL"] = servers.search_url
+    os.environ["MAX_PAPERS"] = str(args.articles + 5)
+    for name in ("PAGE_CACHE_ENABLED", "LLM_CACHE_ENABLED", "EMBED_STORE_ENABLED", "SCRAPE_USE_PLAYWRIGHT"):
+        os.environ[name] = "0"
+
+
+def _percentile(values: list, pct: float) -> float:
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(pct * len(ordered)))]
+
+
+def _peak_rss_mb() -> dict:
+    try:
+        import resource
+    except ImportError:
+        return {}
+    # ru_maxrss is kilobytes on Linux; parse workers are counted under children.
+    return {
+        "self": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        "children": round(resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024, 1),
+    }
+
+
+def _git_commit() -> str:
+    try:
+        out = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=Path(__file__).resolve().parent,
+            capture_output=True,
+            text=True,
+            timeout=10,
+        )
+    except (OSError, subprocess.SubprocessError):
+        return ""
+    return out.stdout.strip()
+
+
+def _record(node_times: dict, event, last: float) -> float:
+    # A node's time is the gap since the previous event: nodes run one at a time, so the gap
+    # is that node's wall time plus a little graph overhead.
+    now = time.perf_counter()
+    if isinstance(event, dict):
+        for node_name in event:
+            if node_name != "__end__":
+                node_times.setdefault(node_name, []).append(now - last)
+    return now
+
+
+def _run_sync(app, state, node_times: dict) -> dict:
+    final_state = state
+    last = time.perf_counter()
+    for event in app.stream(state):
+        last = _record(node_times, event, last)
+        for node_state in event.values() if isinstance(event, dict) else ():
+            if isinstance(node_state, dict):
+                final_state = node_state
+    return final_state
+
+
+async def _run_async(app, state, node_times: dict) -> dict:
+    final_state = state
+    last = time.perf_counter()
+    async for event in app.astream(state):
+        last = _record(node_times, event, last)
+        for node_state in event.values() if isinstance(event, dict) else ():
+            if isinstance(node_state, dict):
+                final_state = node_state
+    return final_state
+
+
+def _bench(args, goals: list) -> dict:
+    try:
+        from multi_agent_runner import build_app, close_async_resources
+        from parse_pool import shutdown_parse_pool, warm_parse_pool
+        from state import make_initial_state
+    except ImportError:
+        from .multi_agent_runner import build_app, close_async_resources
+        from .parse_pool import shutdown_parse_pool, warm_parse_pool
+        from .state import make_initial_state
+
+    warm_parse_pool()
+    started = time.perf_counter()
+    app = build_app(async_mode=args.async_mode, streaming=args.streaming)
+    build_seconds = time.perf_counter() - started
+
+    node_times: dict = {}
+    runs = []
+    loop = asyncio.new_event_loop() if args.async_mode else None
+    try:
+        for run_idx in range(max(1, args.repeat)):
+            for goal in goals:
+                state = make_initial_state(goal=goal, max_iterations=max(1, args.max_iterations))
+                started = time.perf_counter()
+                if loop is not None:
+                    result = loop.run_until_complete(_run_async(app, state, node_times))
+                else:
+                    result = _run_sync(app, state, node_times)
+                wall = time.perf_counter() - started
+                rows = (result.get("extracted_output") or {}).get("rows") or []
+                runs.append({"goal": goal, "repeat": run_idx, "wall_s": round(wall, 3), "rows": len(rows)})
+                print(f"[BENCH] run {run_idx + 1} goal={goal[:50]!r} wall={wall:.2f}s rows={len(rows)}", flush=True)
+    finally:
+        if loop is not None:
+            loop.run_until_complete(close_async_resources())
+            loop.close()
+        shutdown_parse_pool()
+
+    walls = [run["wall_s"] for run in runs]
+    total = sum(walls)
+    return {
+        "build_app_s": round(build_seconds, 4),
+        "runs": runs,
+        "wall_s": {
+            "total": round(total, 3),
+            "p50": round(_percentile(walls, 0.5), 3),
+            "p90": round(_percentile(walls, 0.9), 3),
+        },
+        "goals_per_min": round(60.0 * len(runs) / total, 2) if total else 0.0,
+        "stages": {
+            name: {
+                "calls": len(times),
+                "p50_ms": round(1000 * _percentile(times, 0.5), 1),
+                "p90_ms": round(1000 * _percentile(times, 0.9), 1),
+                "p99_ms": round(1000 * _percentile(times, 0.99), 1),
+            }
+            for name, times in node_times.items()
+        },
+    }
+
+
+def _print_compare(report: dict, old: dict) -> None:
+    def _delta(new: float, before: float) -> str:
+        if not before:
+            return "n/a"
+        return f"{100.0 * (new - before) / before:+.1f}%"
+
+    print(f"[BENCH] compare against {old.get('commit') or 'baseline'}:")
+    print(
+        f"[BENCH]   wall p50 {old['wall_s']['p50']}s -> {report['wall_s']['p50']}s "
+        f"({_delta(report['wall_s']['p50'], old['wall_s']['p50'])})"
+    )
+    print(
+        f"[BENCH]   goals/min {old['goals_per_min']} -> {report['goals_per_min']} "
+        f"({_delta(report['goals_per_min'], old['goals_per_min'])})"
+    )
+    for name, stage in report["stages"].items():
+        before = old.get("stages", {}).get(name)
+        if before:
+            print(
+                f"[BENCH]   {name:<16} p50 {before['p50_ms']}ms -> {stage['p50_ms']}ms "
+                f"({_delta(stage['p50_ms'], before['p50_ms'])})"
+            )
+
+
+def main() -> int:
+    args = build_parser().parse_args()
+    goals = args.goal or DEFAULT_GOALS
+
+    with StandInServers(
+        articles=args.articles,
+        paragraphs=args.paragraphs,
+        slow_seconds=args.slow_seconds,
+        llm_latency=args.llm_latency,
+        llm_latency_per_kchar=args.llm_latency_per_kchar,
+    ) as servers:
+        _configure_env(servers, args)
+        print(
+            f"[BENCH] web={servers.web.base_url} ollama={servers.ollama_host} goals={len(goals)} "
+            f"repeat={args.repeat} async={args.async_mode} streaming={args.streaming}",
+            flush=True,
+        )
+        report = _bench(args, goals)
+        report["llm_calls"] = servers.llm_calls()
+
+    report["commit"] = _git_commit()
+    report["config"] = {
+        "async_mode": args.async_mode,
+        "streaming": args.streaming,
+        "max_iterations": args.max_iterations,
+        "articles": args.articles,
+        "paragraphs": args.paragraphs,
+        "llm_latency": args.llm_latency,
+    }
+    report["peak_rss_mb"] = _peak_rss_mb()
+
+    print(
+        f"[BENCH] wall total={report['wall_s']['total']}s p50={report['wall_s']['p50']}s "
+        f"p90={report['wall_s']['p90']}s goals/min={report['goals_per_min']} build_app={report['build_app_s']}s"
+    )
+    for name, stage in report["stages"].items():
+        print(
+            f"[BENCH] {name:<16} calls={stage['calls']:<3} p50={stage['p50_ms']}ms "
+            f"p90={stage['p90_ms']}ms p99={stage['p99_ms']}ms"
+        )
+    print(f"[BENCH] llm calls={report['llm_calls']} peak_rss_mb={report['peak_rss_mb']}")
+
+    if args.compare:
+        _print_compare(report, json.loads(Path(args.compare).read_text(encoding="utf-8")))
+    if args.save_json:
+        Path(args.save_json).write_text(json.dumps(report, indent=2), encoding="utf-8")
+        print(f"Saved benchmark report to: {args.save_json}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,94 @@
+from __future__ import annotations
+
+import argparse
+import json
+import time
+from pathlib import Path
+
+try:
+    import retrieval_agent
+except ImportError:
+    from . import retrieval_agent
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Compare retrieval engines on documents saved in a result JSON.")
+    parser.add_argument("--input", default="result.json", help="Result JSON with scraped_docs (from run_local.py).")
+    parser.add_argument("--goal", default="", help="Override the goal stored in the result JSON.")
+    parser.add_argument(
+        "--engines",
+        nargs="+",
+        choices=["keyword", "bm25", "embedding", "hybrid"],
+        default=["keyword", "bm25"],
+        help="Engines to compare; overlap is reported against the first.",
+    )
+    parser.add_argument("--repeat", type=int, default=20, help="Timed repetitions per engine.")
+    parser.add_argument("--top", type=int, default=5, help="Number of top chunks to print per engine.")
+    parser.add_argument("--save-json", default="", help="Optional path for the benchmark report.")
+    return parser
+
+
+def _rank(engine: str, docs: list, goal: str) -> list:
+    configured = retrieval_agent.RETRIEVAL_ENGINE
+    retrieval_agent.RETRIEVAL_ENGINE = engine
+    ranked, errors = [], []
+    try:
+        for doc, gated in zip(docs, retrieval_agent._gated_by_doc(docs, goal, errors)):
+            ranked.extend(retrieval_agent._doc_hits(doc, gated))
+    finally:
+        retrieval_agent.RETRIEVAL_ENGINE = configured
+    state = {"retrieved_chunks": [], "agent_confidences": {}}
+    retrieval_agent._finish_retrieval(state, ranked, [item["score"] for item in ranked])
+    for error in dict.fromkeys(errors):
+        print(f"[BENCH] {engine}: {error}")
+    return state["retrieved_chunks"]
+
+
+def _time_engine(engine: str, docs: list, goal: str, repeat: int) -> dict:
+    timings = []
+    for _ in range(max(1, repeat)):
+        started = time.perf_counter()
+        _rank(engine, docs, goal)
+        timings.append(time.perf_counter() - started)
+    timings.sort()
+    return {
+        "engine": engine,
+        "median_ms": round(1000 * timings[len(timings) // 2], 3),
+        "min_ms": round(1000 * timings[0], 3),
+    }
+
+
+def main() -> int:
+    args = build_parser().parse_args()
+    saved = json.loads(Path(args.input).read_text(encoding="utf-8"))
+    docs = saved.get("scraped_docs", [])
+    goal = args.goal or saved.get("goal", "")
+    chunk_count = sum(len(retrieval_agent._chunk_text(doc["full_text"])) for doc in docs)
+    print(f"[BENCH] docs={len(docs)} chunks={chunk_count} goal={goal[:80]!r}")
+
+    report = {"input": args.input, "goal": goal, "docs": len(docs), "chunks": chunk_count, "engines": {}}
+    rankings = {}
+    for engine in args.engines:
+        rankings[engine] = _rank(engine, docs, goal)
+        timing = _time_engine(engine, docs, goal, args.repeat)
+        report["engines"][engine] = {**timing, "retrieved": len(rankings[engine])}
+        print(f"[BENCH] {engine:<8} median={timing['median_ms']}ms min={timing['min_ms']}ms retrieved={len(rankings[engine])}")
+        for item in rankings[engine][: args.top]:
+            print(f"    {item['score']:.3f}  {item['title'][:40]!r}  {item['chunk'][:70]!r}")
+
+    baseline = {item["chunk"] for item in rankings[args.engines[0]]}
+    report["top_k_jaccard"] = {}
+    for engine in args.engines[1:]:
+        other = {item["chunk"] for item in rankings[engine]}
+        union = baseline | other
+        report["top_k_jaccard"][engine] = round(len(baseline & other) / len(union), 3) if union else 1.0
+        print(f"[BENCH] top-k overlap (Jaccard) {args.engines[0]} vs {engine}: {report['top_k_jaccard'][engine]}")
+
+    if args.save_json:
+        Path(args.save_json).write_text(json.dumps(report, indent=2), encoding="utf-8")
+        print(f"Saved benchmark report to: {args.save_json}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,331 @@
+from __future__ import annotations
+
+import ast
+import hashlib
+import html
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List
+from urllib.parse import parse_qs, urlparse
+
+
+TOPIC_TERMS = {
+    "targets": ["BRD4", "BTK", "AR", "ER", "KRAS G12C", "CDK9", "SMARCA2", "IRAK4"],
+    "ligases": ["VHL", "CRBN", "MDM2", "IAP", "DCAF16"],
+    "linkers": ["PEG3", "PEG4", "alkyl C8", "piperazine", "triazole click", "rigid spirocyclic", "alkyne"],
+    "assays": ["HiBiT degradation", "western blot", "TR-FRET ternary complex", "NanoBRET", "proteomics"],
+}
+SENTENCES = [
+    "The PROTAC {name} recruits {ligase} to degrade {target} through a {linker} linker.",
+    "In 2025 the authors report a DC50 of {dc50} nM and Dmax of {dmax}% for {target} in {assay} assays.",
+    "Replacing the {linker} linker shortened the ternary complex and changed selectivity against {target}.",
+    "Linker length and rigidity were varied systematically, and {linker} gave the best permeability.",
+    "Cell viability dropped in lines dependent on {target}, while {ligase} knockout abolished degradation.",
+    "Pharmacokinetic profiling of {name} in mice showed oral bioavailability of {dmax}% after optimisation.",
+]
+BOILERPLATE = (
+    "<nav><ul><li>Home</li><li>Journals</li><li>Subscribe to our newsletter for updates</li></ul></nav>"
+    "<script>window.dataLayer = window.dataLayer || []; function gtag(){dataLayer.push(arguments);}</script>"
+    "<style>body { font-family: sans-serif; } .ad { display: none; }</style>"
+)
+FOOTER = "<footer><p>Copyright 2025 Example Publisher. All rights reserved. Cookie settings.</p></footer>"
+
+
+def _article_text(idx: int, paragraphs: int) -> List[str]:
+    rng = random.Random(idx)
+    out = []
+    for _ in range(paragraphs):
+        values = {
+            "name": f"DEG-{idx:02d}{rng.randint(1, 9)}",
+            "target": rng.choice(TOPIC_TERMS["targets"]),
+            "ligase": rng.choice(TOPIC_TERMS["ligases"]),
+            "linker": rng.choice(TOPIC_TERMS["linkers"]),
+            "assay": rng.choice(TOPIC_TERMS["assays"]),
+            "dc50": rng.randint(1, 500),
+            "dmax": rng.randint(40, 98),
+        }
+        out.append(" ".join(rng.choice(SENTENCES).format(**values) for _ in range(3)))
+    return out
+
+
+def article_title(idx: int) -> str:
+    target = TOPIC_TERMS["targets"][idx % len(TOPIC_TERMS["targets"])]
+    return f"PROTAC linkers for {target} degradation: 2025 study {idx}"
+
+
+def article_html(idx: int, paragraphs: int) -> str:
+    body = "".join(f"<p>{html.escape(text)}</p>" for text in _article_text(idx, paragraphs))
+    return (
+        f"<html><head><title>{html.escape(article_title(idx))}</title></head><body>{BOILERPLATE}"
+        f"<article><h1>{html.escape(article_title(idx))}</h1>{body}</article>{FOOTER}</body></html>"
+    )
+
+
+CAPTCHA_HTML = "<html><body><h1>Verify you are human</h1><p>Complete the captcha to continue.</p></body></html>"
+
+
+# Serves a fixed corpus: DuckDuckGo-style search results, article pages, a mirror of the first
+# article (near-duplicate content), a tracking-parameter variant of a URL, plus slow, 403 and
+# captcha pages, so every scrape and filter path is exercised without the network.
+class _WebHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server_version = "BenchWeb/1.0"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status: int, body: str = "", content_type: str = "text/html; charset=utf-8") -> None:
+        payload = body.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(payload)
+
+    def _page(self) -> tuple[int, str]:
+        config = self.server.config
+        path = urlparse(self.path).path
+        match = re.fullmatch(r"/(article|mirror)/(\d+)", path)
+        if match and int(match.group(2)) < config["articles"]:
+            return 200, article_html(int(match.group(2)), config["paragraphs"])
+        if path == "/slow/0":
+            time.sleep(config["slow_seconds"])
+            return 200, article_html(config["articles"], config["paragraphs"])
+        if path == "/forbidden/0":
+            return 403, "<html><body><p>Forbidden</p></body></html>"
+        if path == "/captcha/0":
+            return 200, CAPTCHA_HTML
+        return 404, "<html><body><p>Not found</p></body></html>"
+
+    def do_HEAD(self):
+        if urlparse(self.path).path == "/slow/0":
+            self._send(200)
+            return
+        status, body = self._page()
+        self._send(status, body)
+
+    def do_GET(self):
+        status, body = self._page()
+        self._send(status, body)
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", "0") or 0)
+        query = parse_qs(self.rfile.read(length).decode("utf-8")).get("q", [""])[0]
+        if urlparse(self.path).path != "/html/":
+            self._send(404)
+            return
+        self._send(200, self.server.search_page(query))
+
+
+class _WebServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, config: Dict):
+        super().__init__(("127.0.0.1", 0), _WebHandler)
+        self.config = config
+        self.base_url = f"http://127.0.0.1:{self.server_address[1]}"
+
+    def _links(self) -> List[tuple[str, str]]:
+        links = [(f"{self.base_url}/article/{idx}", article_title(idx)) for idx in range(self.config["articles"])]
+        links += [
+            (f"{self.base_url}/mirror/0", f"{article_title(0)} (mirror)"),
+            (f"{self.base_url}/article/1?utm_source=newsletter", f"{article_title(1)} - shared"),
+            (f"{self.base_url}/slow/0", article_title(self.config["articles"])),
+            (f"{self.base_url}/forbidden/0", "PROTAC linkers 2025 review (paywalled)"),
+            (f"{self.base_url}/captcha/0", "PROTAC linkers 2025 preprint (captcha)"),
+        ]
+        return links
+
+    def search_page(self, query: str) -> str:
+        blocks = [
+            f'<div class="result"><a class="result__a" href="{html.escape(url)}">{html.escape(title)}</a>'
+            f'<a class="result__snippet">{html.escape(query)}: linker chemistry, ternary complex and degradation data.</a>'
+            "</div>"
+            for url, title in self._links()
+        ]
+        return f"<html><body><div class=\"results\">{''.join(blocks)}</div></body></html>"
+
+
+def _schema_hint(messages: List[Dict]) -> str:
+    for message in messages:
+        if message.get("role") == "system":
+            match = re.search(r"Schema hint:\s*(.*)$", message.get("content", ""), re.S)
+            if match:
+                return match.group(1).strip()
+    return ""
+
+
+def _canned_answer(hint: str, prompt: str) -> Dict:
+    if "search_query" in hint:
+        return {
+            "search_query": "PROTAC linkers 2025",
+            "output_format": "table",
+            "table_columns": ["PROTAC", "Target", "Linker", "Source URL"],
+        }
+    if "results:[" in hint:
+        count = len(re.findall(r"^\[\d+\] Title:", prompt, re.M))
+        return {"results": [{"index": idx, "relevant": True, "score": 0.8} for idx in range(count)]}
+    if "relevant:boolean" in hint:
+        return {"relevant": True, "score": 0.8}
+    if hint.startswith("{score"):
+        return {"score": 0.7}
+
+    sources = re.findall(r"^Source: (.*) \((http[^)\s]*)\)$", prompt, re.M)
+    if "columns:string[]" in hint:
+        match = re.search(r"^Preferred columns: (\[.*\])$", prompt, re.M)
+        try:
+            columns = [str(col) for col in ast.literal_eval(match.group(1))] if match else []
+        except (ValueError, SyntaxError):
+            columns = []
+        columns = columns or ["Finding", "Source URL"]
+        rows = []
+        for title, url in sources:
+            row = {col: "NA" for col in columns}
+            row[columns[0]] = title
+            for col in columns:
+                if "url" in col.lower():
+                    row[col] = url
+            rows.append(row)
+        return {"columns": columns, "rows": rows}
+    return {"format": "json", "items": [{"finding": title, "source_url": url} for title, url in sources]}
+
+
+# Stands in for Ollama: /api/tags for health probes, /api/chat with canned JSON per schema
+# hint, and /api/embed with deterministic hashed vectors. Chat latency is a fixed cost plus a
+# per-1000-prompt-characters cost, roughly how prompt processing scales on a real model.
+class _OllamaHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server_version = "BenchOllama/1.0"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _json(self, status: int, payload: Dict) -> None:
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if urlparse(self.path).path == "/api/tags":
+            self._json(200, {"models": [{"name": name, "model": name} for name in self.server.config["models"]]})
+        else:
+            self._json(404, {"error": "not found"})
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", "0") or 0)
+        request = json.loads(self.rfile.read(length) or b"{}")
+        path = urlparse(self.path).path
+        config = self.server.config
+        with self.server.lock:
+            self.server.calls[path] = self.server.calls.get(path, 0) + 1
+
+        if path == "/api/chat":
+            messages = request.get("messages", [])
+            prompt = "\n".join(str(message.get("content", "")) for message in messages)
+            time.sleep(config["latency"] + config["latency_per_kchar"] * len(prompt) / 1000.0)
+            content = json.dumps(_canned_answer(_schema_hint(messages), messages[-1].get("content", "") if messages else ""))
+            self._json(
+                200,
+                {
+                    "model": request.get("model", ""),
+                    "created_at": "2025-01-01T00:00:00Z",
+                    "message": {"role": "assistant", "content": content},
+                    "done": True,
+                    "done_reason": "stop",
+                    "prompt_eval_count": len(prompt) // 4,
+                    "eval_count": len(content) // 4,
+                },
+            )
+        elif path == "/api/generate":
+            # preload_models sends an empty prompt; Ollama answers it by loading the model, with no tokens.
+            time.sleep(config["latency"])
+            self._json(
+                200,
+                {
+                    "model": request.get("model", ""),
+                    "created_at": "2025-01-01T00:00:00Z",
+                    "response": "",
+                    "done": True,
+                    "done_reason": "load",
+                },
+            )
+        elif path == "/api/embed":
+            inputs = request.get("input", [])
+            inputs = [inputs] if isinstance(inputs, str) else inputs
+            time.sleep(config["latency"])
+            self._json(200, {"model": request.get("model", ""), "embeddings": [_embed(text) for text in inputs]})
+        else:
+            self._json(404, {"error": "not found"})
+
+
+def _embed(text: str, dim: int = 64) -> List[float]:
+    vector = [0.0] * dim
+    for token in re.findall(r"\w+", text.lower()):
+        digest = hashlib.blake2b(token.encode("utf-8"), digest_size=4).digest()
+        vector[int.from_bytes(digest, "big") % dim] += 1.0
+    norm = sum(v * v for v in vector) ** 0.5 or 1.0
+    return [v / norm for v in vector]
+
+
+class _OllamaServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, config: Dict):
+        super().__init__(("127.0.0.1", 0), _OllamaHandler)
+        self.config = config
+        self.lock = threading.Lock()
+        self.calls: Dict[str, int] = {}
+        self.base_url = f"http://127.0.0.1:{self.server_address[1]}"
+
+
+class StandInServers:
+    def __init__(
+        self,
+        articles: int = 10,
+        paragraphs: int = 12,
+        slow_seconds: float = 3.0,
+        llm_latency: float = 0.05,
+        llm_latency_per_kchar: float = 0.01,
+        models: List[str] | None = None,
+    ):
+        self.web = _WebServer({"articles": articles, "paragraphs": paragraphs, "slow_seconds": slow_seconds})
+        self.ollama = _OllamaServer(
+            {
+                "latency": llm_latency,
+                "latency_per_kchar": llm_latency_per_kchar,
+                "models": models or ["llama3.2:1b", "llama3.2:3b", "nomic-embed-text"],
+            }
+        )
+        self._threads: List[threading.Thread] = []
+
+    @property
+    def search_url(self) -> str:
+        return f"{self.web.base_url}/html/"
+
+    @property
+    def ollama_host(self) -> str:
+        return self.ollama.base_url
+
+    def llm_calls(self) -> Dict[str, int]:
+        with self.ollama.lock:
+            return dict(self.ollama.calls)
+
+    def __enter__(self) -> "StandInServers":
+        for server in (self.web, self.ollama):
+            thread = threading.Thread(target=server.serve_forever, name="bench-server", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        return self
+
+    def __exit__(self, *exc) -> None:
+        for server in (self.web, self.ollama):
+            server.shutdown()
+            server.server_close()
@@ -0,0 +1,89 @@
+from __future__ import annotations
+
+import heapq
+import math
+import os
+import re
+from collections import Counter
+from typing import Dict, List, Sequence
+
+TOKEN_PATTERN = re.compile(r"[A-Za-z0-9\-]+")
+BM25_K1 = float(os.getenv("BM25_K1", "1.2"))
+BM25_TITLE_WEIGHT = float(os.getenv("BM25_TITLE_WEIGHT", "2.0"))
+BM25_BODY_WEIGHT = float(os.getenv("BM25_BODY_WEIGHT", "1.0"))
+BM25_TITLE_B = float(os.getenv("BM25_TITLE_B", "0.3"))
+BM25_BODY_B = float(os.getenv("BM25_BODY_B", "0.75"))
+
+
+def tokenize(text: str) -> List[str]:
+    return [t.lower() for t in TOKEN_PATTERN.findall(text) if len(t) > 2]
+
+
+def query_terms(text: str) -> List[str]:
+    return list(dict.fromkeys(tokenize(text)))
+
+
+# BM25F over two fields: field term frequencies are length-normalised and weighted before
+# a single saturation per term, so a term repeated in the title and body is not counted twice.
+class BM25Index:
+    def __init__(
+        self,
+        k1: float = BM25_K1,
+        weights: Dict[str, float] | None = None,
+        b: Dict[str, float] | None = None,
+    ):
+        self.k1 = k1
+        self.weights = weights or {"title": BM25_TITLE_WEIGHT, "body": BM25_BODY_WEIGHT}
+        self.b = b or {"title": BM25_TITLE_B, "body": BM25_BODY_B}
+        self.postings: Dict[str, Dict[int, Dict[str, int]]] = {}
+        self.lengths: List[Dict[str, int]] = []
+        self._length_totals = {field: 0 for field in self.weights}
+
+    def __len__(self) -> int:
+        return len(self.lengths)
+
+    def add(self, fields: Dict[str, str]) -> int:
+        doc_id = len(self.lengths)
+        lengths = {}
+        for field in self.weights:
+            tokens = tokenize(fields.get(field, ""))
+            lengths[field] = len(tokens)
+            self._length_totals[field] += len(tokens)
+            for term, count in Counter(tokens).items():
+                self.postings.setdefault(term, {}).setdefault(doc_id, {})[field] = count
+        self.lengths.append(lengths)
+        return doc_id
+
+    def idf(self, term: str) -> float:
+        n = len(self.lengths)
+        df = len(self.postings.get(term, {}))
+        return math.log(1.0 + (n - df + 0.5) / (df + 0.5))
+
+    def score_all(self, terms: Sequence[str]) -> Dict[int, float]:
+        if not self.lengths or not terms:
+            return {}
+        n = len(self.lengths)
+        avg = {field: (total / n) or 1.0 for field, total in self._length_totals.items()}
+        idfs = {term: self.idf(term) for term in terms}
+
+        scores: Dict[int, float] = {}
+        for term in terms:
+            for doc_id, field_tf in self.postings.get(term, {}).items():
+                weighted_tf = 0.0
+                for field, tf in field_tf.items():
+                    length_ratio = self.lengths[doc_id][field] / avg[field]
+                    weighted_tf += self.weights[field] * tf / (1.0 - self.b[field] + self.b[field] * length_ratio)
+                contribution = idfs[term] * weighted_tf / (self.k1 + weighted_tf)
+                scores[doc_id] = scores.get(doc_id, 0.0) + contribution
+        return scores
+
+    def reference_score(self, terms: Sequence[str]) -> float:
+        # The score of an average-length chunk holding every term once in its body. It depends
+        # on the query, not on the chunks that happen to match, so it is a fixed yardstick.
+        weighted_tf = self.weights.get("body", 1.0)
+        return sum(self.idf(term) for term in terms) * weighted_tf / (self.k1 + weighted_tf)
+
+    def top_k(self, terms: Sequence[str], k: int, min_score: float = 0.0) -> List[tuple[float, int]]:
+        scored = ((score, doc_id) for doc_id, score in self.score_all(terms).items() if score >= min_score)
+        # Lower doc ids win ties, matching a stable sort over insertion order.
+        return heapq.nsmallest(k, scored, key=lambda item: (-item[0], item[1]))
@@ -0,0 +1,154 @@
+from __future__ import annotations
+
+import asyncio
+import atexit
+import os
+import threading
+from typing import Any, List, Optional
+
+
+PLAYWRIGHT_POOL_SIZE = max(1, int(os.getenv("PLAYWRIGHT_POOL_SIZE", "3")))
+PLAYWRIGHT_BLOCK_RESOURCES = os.getenv("PLAYWRIGHT_BLOCK_RESOURCES", "1") == "1"
+PLAYWRIGHT_NAV_TIMEOUT_MS = int(os.getenv("PLAYWRIGHT_NAV_TIMEOUT_MS", "20000"))
+PLAYWRIGHT_SETTLE_MS = int(os.getenv("PLAYWRIGHT_SETTLE_MS", "700"))
+BLOCKED_RESOURCE_TYPES = {"image", "font", "media"}
+USER_AGENT = "Mozilla/5.0"
+
+_POOL = None
+_POOL_FAILED = False
+_POOL_LOCK = threading.Lock()
+
+
+# One headless Chromium driven from a private event loop thread. Callers on any thread
+# submit URLs; up to `size` pages render at once, each in its own reusable context.
+class BrowserPool:
+    def __init__(self, size: int = PLAYWRIGHT_POOL_SIZE, block_resources: bool = PLAYWRIGHT_BLOCK_RESOURCES):
+        self.size = max(1, size)
+        self.block_resources = block_resources
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="browser-pool", daemon=True)
+        self._playwright: Any = None
+        self._browser: Any = None
+        self._slots: Optional[asyncio.Queue] = None
+        self._contexts: List[Any] = []
+        self._closed = False
+
+    def start(self) -> None:
+        self._thread.start()
+        try:
+            asyncio.run_coroutine_threadsafe(self._startup(), self._loop).result(timeout=60)
+        except BaseException:
+            self.close()
+            raise
+
+    async def _startup(self) -> None:
+        from playwright.async_api import async_playwright
+
+        self._playwright = await async_playwright().start()
+        self._browser = await self._playwright.chromium.launch(headless=True)
+        self._slots = asyncio.Queue()
+        for _ in range(self.size):
+            context = await self._new_context()
+            self._contexts.append(context)
+            await self._slots.put((context, await context.new_page()))
+
+    async def _new_context(self):
+        context = await self._browser.new_context(user_agent=USER_AGENT)
+        if self.block_resources:
+            await context.route("**/*", self._route)
+        return context
+
+    @staticmethod
+    async def _route(route) -> None:
+        if route.request.resource_type in BLOCKED_RESOURCE_TYPES:
+            await route.abort()
+        else:
+            await route.continue_()
+
+    async def _render(self, url: str) -> str:
+        context, page = await self._slots.get()
+        try:
+            if page.is_closed():
+                page = await context.new_page()
+            await page.goto(url, timeout=PLAYWRIGHT_NAV_TIMEOUT_MS, wait_until="domcontentloaded")
+            await page.wait_for_timeout(PLAYWRIGHT_SETTLE_MS)
+            return await page.content()
+        except Exception:
+            # Start the next render on a clean page rather than whatever this one was stuck on.
+            try:
+                await page.close()
+            except Exception:
+                pass
+            page = await context.new_page()
+            raise
+        finally:
+            self._slots.put_nowait((context, page))
+
+    def render(self, url: str) -> str:
+        if self._closed:
+            return ""
+        future = asyncio.run_coroutine_threadsafe(self._render(url), self._loop)
+        try:
+            return future.result(timeout=(PLAYWRIGHT_NAV_TIMEOUT_MS + PLAYWRIGHT_SETTLE_MS) / 1000.0 + 10)
+        except Exception:
+            future.cancel()
+            return ""
+
+    async def _shutdown(self) -> None:
+        for context in self._contexts:
+            try:
+                await context.close()
+            except Exception:
+                pass
+        self._contexts = []
+        if self._browser is not None:
+            try:
+                await self._browser.close()
+            except Exception:
+                pass
+        if self._playwright is not None:
+            try:
+                await self._playwright.stop()
+            except Exception:
+                pass
+
+    def close(self) -> None:
+        if self._closed:
+            return
+        self._closed = True
+        if self._thread.is_alive():
+            try:
+                asyncio.run_coroutine_threadsafe(self._shutdown(), self._loop).result(timeout=30)
+            except Exception:
+                pass
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join(timeout=5)
+        if not self._loop.is_running():
+            self._loop.close()
+
+
+def get_browser_pool() -> Optional[BrowserPool]:
+    global _POOL, _POOL_FAILED
+    with _POOL_LOCK:
+        if _POOL is None and not _POOL_FAILED:
+            pool = BrowserPool(size=max(1, int(os.getenv("PLAYWRIGHT_POOL_SIZE", str(PLAYWRIGHT_POOL_SIZE)))))
+            try:
+                pool.start()
+            except Exception:
+                # Playwright or Chromium is missing; do not retry the launch for every URL.
+                _POOL_FAILED = True
+                return None
+            _POOL = pool
+        return _POOL
+
+
+def shutdown_browser_pool() -> None:
+    global _POOL, _POOL_FAILED
+    with _POOL_LOCK:
+        if _POOL is not None:
+            _POOL.close()
+            _POOL = None
+        _POOL_FAILED = False
+
+
+atexit.register(shutdown_browser_pool)
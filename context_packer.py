@@ -0,0 +1,104 @@
+from __future__ import annotations
+
+import math
+import os
+import re
+from typing import Any, Callable, Dict, List
+
+try:
+    from llm_client import OLLAMA_NUM_CTX
+    from near_dup import MinHashLSH
+except ImportError:
+    from .llm_client import OLLAMA_NUM_CTX
+    from .near_dup import MinHashLSH
+
+
+# Tokens kept free for the model's JSON answer.
+EXTRACTION_OUTPUT_TOKENS = max(128, int(os.getenv("EXTRACTION_OUTPUT_TOKENS", "1024")))
+# 0 sizes the context from OLLAMA_NUM_CTX; any other value is a fixed budget for the chunk text.
+EXTRACTION_CONTEXT_TOKENS = max(0, int(os.getenv("EXTRACTION_CONTEXT_TOKENS", "0")))
+PACK_MAX_CHUNK_TOKENS = max(32, int(os.getenv("PACK_MAX_CHUNK_TOKENS", "350")))
+PACK_MIN_CHUNK_TOKENS = 48
+# A chunk this similar (estimated Jaccard over word shingles) to one already packed adds little.
+PACK_REDUNDANCY_THRESHOLD = float(os.getenv("PACK_REDUNDANCY_THRESHOLD", "0.5"))
+_WORD = re.compile(r"\w+|[^\w\s]")
+_SENTENCE = re.compile(r"(?<=[.!?])\s+")
+
+
+def estimate_tokens(text: str) -> int:
+    # Llama-family tokenizers average about 4 characters per token on English prose, but
+    # numbers, chemical names and punctuation split finer; taking the larger estimate keeps
+    # the prompt under the window without a tokenizer.
+    return max(math.ceil(len(text) / 4), math.ceil(len(_WORD.findall(text)) * 0.75))
+
+
+def context_budget(prompt_overhead: str) -> int:
+    fixed = int(os.getenv("EXTRACTION_CONTEXT_TOKENS", str(EXTRACTION_CONTEXT_TOKENS)))
+    if fixed:
+        return fixed
+    num_ctx = max(512, int(os.getenv("OLLAMA_NUM_CTX", str(OLLAMA_NUM_CTX))))
+    reserve = max(128, int(os.getenv("EXTRACTION_OUTPUT_TOKENS", str(EXTRACTION_OUTPUT_TOKENS))))
+    return max(0, num_ctx - reserve - estimate_tokens(prompt_overhead))
+
+
+def trim_to_tokens(text: str, max_tokens: int) -> str:
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    kept: List[str] = []
+    used = 0
+    for sentence in _SENTENCE.split(text):
+        cost = estimate_tokens(sentence) + 1
+        if used + cost > max_tokens:
+            break
+        kept.append(sentence)
+        used += cost
+    if kept:
+        return " ".join(kept)
+    # The first sentence alone is too long: cut it at a word boundary.
+    cut = text[: max_tokens * 4]
+    cut = cut[: cut.rfind(" ")] if " " in cut else cut
+    while cut and estimate_tokens(cut) > max_tokens:
+        cut = cut[: int(len(cut) * 0.9)]
+    return cut
+
+
+def pack_chunks(
+    chunks: List[Dict[str, Any]],
+    budget: int,
+    render: Callable[[Dict[str, Any], str], str],
+) -> tuple[List[str], Dict[str, Any]]:
+    # Greedy by retrieval score: each chunk is capped at PACK_MAX_CHUNK_TOKENS, and the last one
+    # that fits is trimmed to the remaining budget rather than dropped.
+    per_chunk = max(32, int(os.getenv("PACK_MAX_CHUNK_TOKENS", str(PACK_MAX_CHUNK_TOKENS))))
+    redundancy = MinHashLSH(float(os.getenv("PACK_REDUNDANCY_THRESHOLD", str(PACK_REDUNDANCY_THRESHOLD))))
+    ordered = sorted(enumerate(chunks), key=lambda pair: (-float(pair[1].get("score", 0.0)), pair[0]))
+
+    parts: List[str] = []
+    packed: List[Dict[str, Any]] = []
+    dropped: List[Dict[str, Any]] = []
+    used = 0
+    for idx, item in ordered:
+        text = str(item.get("chunk", ""))
+        entry = {"index": idx, "url": item.get("url", ""), "score": round(float(item.get("score", 0.0)), 4)}
+        overhead = estimate_tokens(render(item, "")) + 2
+        room = min(per_chunk, budget - used - overhead)
+        if room < PACK_MIN_CHUNK_TOKENS:
+            dropped.append({**entry, "reason": "budget"})
+            continue
+        if redundancy.add(text):
+            dropped.append({**entry, "reason": "redundant"})
+            continue
+        trimmed = trim_to_tokens(text, room)
+        part = render(item, trimmed)
+        cost = estimate_tokens(part) + 2
+        used += cost
+        parts.append(part)
+        packed.append({**entry, "tokens": cost, "trimmed": len(trimmed) < len(text)})
+
+    report = {
+        "budget_tokens": budget,
+        "used_tokens": used,
+        "packed": packed,
+        "dropped": dropped,
+    }
+    return parts, report
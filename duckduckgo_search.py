@@ -1,12 +1,19 @@
 from __future__ import annotations
 
+import os
 from urllib.parse import urlparse
 
-import requests
 from bs4 import BeautifulSoup
 
+try:
+    from async_http import async_http_post
+    from http_client import http_post
+except ImportError:
+    from .async_http import async_http_post
+    from .http_client import http_post
 
-SEARCH_URL = "https://html.duckduckgo.com/html/"
+
+SEARCH_URL = os.getenv("DUCKDUCKGO_SEARCH_URL", "https://html.duckduckgo.com/html/")
 HEADERS = {"User-Agent": "Mozilla/5.0"}
 
 
@@ -28,22 +35,8 @@ def _is_noise_result(url: str) -> bool:
     return False
 
 
-def search_duckduckgo(query: str, max_results: int = 10, timeout: int = 15):
-    if not query:
-        return []
-
-    try:
-        response = requests.post(
-            SEARCH_URL,
-            data={"q": query},
-            headers=HEADERS,
-            timeout=timeout,
-        )
-        response.raise_for_status()
-    except Exception:
-        return []
-
-    soup = BeautifulSoup(response.text, "html.parser")
+def _parse_results(html: str, max_results: int):
+    soup = BeautifulSoup(html, "html.parser")
     results = []
 
     for block in soup.select(".result"):
@@ -80,3 +73,38 @@ def search_duckduckgo(query: str, max_results: int = 10, timeout: int = 15):
 
     return results
 
+
+def search_duckduckgo(query: str, max_results: int = 10, timeout: int = 15):
+    if not query:
+        return []
+
+    try:
+        response = http_post(
+            SEARCH_URL,
+            data={"q": query},
+            headers=HEADERS,
+            timeout=timeout,
+        )
+        response.raise_for_status()
+    except Exception:
+        return []
+
+    return _parse_results(response.text, max_results)
+
+
+async def search_duckduckgo_async(query: str, max_results: int = 10, timeout: int = 15):
+    if not query:
+        return []
+
+    try:
+        response = await async_http_post(
+            SEARCH_URL,
+            data={"q": query},
+            headers=HEADERS,
+            timeout=timeout,
+        )
+        response.raise_for_status()
+    except Exception:
+        return []
+
+    return _parse_results(response.text, max_results)
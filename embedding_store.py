@@ -0,0 +1,245 @@
+from __future__ import annotations
+
+import atexit
+import hashlib
+import os
+import re
+import threading
+import time
+import zlib
+from pathlib import Path
+from typing import Dict, Sequence, Tuple
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+try:
+    from bm25_index import tokenize
+    from llm_client import embed_texts
+except ImportError:
+    from .bm25_index import tokenize
+    from .llm_client import embed_texts
+
+
+EMBED_STORE_DIR = os.getenv("EMBED_STORE_DIR", ".embed_store")
+EMBED_BACKEND = os.getenv("EMBED_BACKEND", "ollama").strip().lower()
+EMBED_MODEL = os.getenv("OLLAMA_MODEL_EMBED", "nomic-embed-text")
+EMBED_BATCH_SIZE = max(1, int(os.getenv("EMBED_BATCH_SIZE", "32")))
+EMBED_HASH_DIM = max(16, int(os.getenv("EMBED_HASH_DIM", "512")))
+# Vectors kept per model; past this the least recently used are dropped (768 floats ~ 3 KB each).
+EMBED_STORE_MAX_ENTRIES = max(1, int(os.getenv("EMBED_STORE_MAX_ENTRIES", "50000")))
+
+_LOCK = threading.Lock()
+# model name -> (content key -> row, L2-normalised float32 matrix, last-used time per row, unsaved rows)
+_STORES: Dict[str, Tuple[Dict[str, int], object, object, int]] = {}
+_STATS = {"hits": 0, "misses": 0, "embedded": 0, "batches": 0, "evicted": 0}
+
+
+def is_enabled() -> bool:
+    return os.getenv("EMBED_STORE_ENABLED", "1") == "1"
+
+
+def content_key(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def _backend() -> str:
+    return os.getenv("EMBED_BACKEND", EMBED_BACKEND).strip().lower()
+
+
+def _model_name() -> str:
+    if _backend() == "hashing":
+        return f"hashing-{int(os.getenv('EMBED_HASH_DIM', str(EMBED_HASH_DIM)))}"
+    return os.getenv("OLLAMA_MODEL_EMBED", EMBED_MODEL)
+
+
+def _store_path(model: str) -> Path:
+    slug = re.sub(r"[^A-Za-z0-9._-]+", "_", model)
+    return Path(os.getenv("EMBED_STORE_DIR", EMBED_STORE_DIR)) / f"{slug}.npz"
+
+
+def _max_entries() -> int:
+    return max(1, int(os.getenv("EMBED_STORE_MAX_ENTRIES", str(EMBED_STORE_MAX_ENTRIES))))
+
+
+def _load(model: str) -> Tuple[Dict[str, int], object, object, int]:
+    store = _STORES.get(model)
+    if store is not None:
+        return store
+    rows: Dict[str, int] = {}
+    matrix = used = None
+    path = _store_path(model)
+    if is_enabled() and path.exists():
+        try:
+            with np.load(path) as data:
+                rows = {str(key): idx for idx, key in enumerate(data["keys"])}
+                matrix = np.asarray(data["vectors"], dtype=np.float32)
+                # Stores written before eviction existed have no usage times; they all tie.
+                used = np.asarray(data["used"], dtype=np.float64) if "used" in data.files else np.zeros(len(rows))
+        except Exception:
+            rows, matrix, used = {}, None, None
+    _STORES[model] = (rows, matrix, used, 0)
+    _evict(model)
+    return _STORES[model]
+
+
+def _append(model: str, keys: Sequence[str], vectors) -> None:
+    rows, matrix, used, unsaved = _STORES[model]
+    if matrix is not None and matrix.shape[1] != vectors.shape[1]:
+        # The model behind this name changed dimension; start the store over.
+        rows, matrix, used, unsaved = {}, None, None, 0
+    fresh = [idx for idx, key in enumerate(keys) if key not in rows]
+    if fresh:
+        for idx in fresh:
+            rows[keys[idx]] = len(rows)
+        picked = vectors[fresh]
+        stamps = np.full(len(fresh), time.time())
+        matrix = picked if matrix is None else np.vstack([matrix, picked])
+        used = stamps if used is None else np.concatenate([used, stamps])
+        unsaved += len(fresh)
+    _STORES[model] = (rows, matrix, used, unsaved)
+
+
+def _evict(model: str) -> None:
+    rows, matrix, used, unsaved = _STORES[model]
+    limit = _max_entries()
+    if len(rows) <= limit:
+        return
+    # Keep the most recently used rows, in their existing order.
+    keep = np.sort(np.argsort(used, kind="stable")[-limit:])
+    keys = [""] * len(rows)
+    for key, idx in rows.items():
+        keys[idx] = key
+    _STATS["evicted"] += len(rows) - limit
+    rows = {keys[idx]: row for row, idx in enumerate(keep)}
+    _STORES[model] = (rows, matrix[keep], used[keep], max(unsaved, 1))
+
+
+def _save(model: str) -> None:
+    rows, matrix, used, unsaved = _STORES[model]
+    if not unsaved or matrix is None or not is_enabled():
+        return
+    path = _store_path(model)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    keys = np.empty(len(rows), dtype=object)
+    for key, idx in rows.items():
+        keys[idx] = key
+    # np.savez appends .npz to names without it, so the temp file keeps the suffix.
+    tmp_path = path.with_name(path.stem + ".tmp.npz")
+    np.savez(tmp_path, keys=keys.astype(str), vectors=matrix, used=used)
+    os.replace(tmp_path, path)
+    _STORES[model] = (rows, matrix, used, 0)
+
+
+def save_embedding_store() -> None:
+    # Rewriting the .npz costs time in proportion to the whole store, so it happens once at
+    # shutdown (registered with atexit) rather than after every retrieval call.
+    if np is None:
+        return
+    with _LOCK:
+        for model in list(_STORES):
+            _save(model)
+
+
+def _normalise(matrix):
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return (matrix / norms).astype(np.float32)
+
+
+def _hashing_embed(texts: Sequence[str], dim: int):
+    # Offline stand-in for an embedding model: signed feature hashing of word unigrams and
+    # bigrams. crc32 rather than hash() so vectors are stable across processes.
+    matrix = np.zeros((len(texts), dim), dtype=np.float32)
+    for row, text in enumerate(texts):
+        tokens = tokenize(text)
+        for feature in tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]:
+            digest = zlib.crc32(feature.encode("utf-8"))
+            matrix[row, digest % dim] += 1.0 if digest >> 31 else -1.0
+    return matrix
+
+
+def _embed_batch(texts: Sequence[str], model: str):
+    if _backend() == "hashing":
+        return _hashing_embed(texts, int(model.rsplit("-", 1)[1])), ""
+    vectors, warning = embed_texts(texts, model)
+    if vectors is None:
+        return None, warning
+    return np.asarray(vectors, dtype=np.float32), ""
+
+
+def embed(texts: Sequence[str]):
+    if np is None:
+        return None, "embedding-unavailable: numpy is not installed"
+    model = _model_name()
+    keys = [content_key(text) for text in texts]
+    with _LOCK:
+        rows, matrix, used, _ = _load(model)
+        # Stored vectors are copied out now: another call may evict their rows before this one
+        # finishes embedding the rest.
+        found = [key for key in dict.fromkeys(keys) if key in rows]
+        vectors = {}
+        if found:
+            picked = [rows[key] for key in found]
+            used[picked] = time.time()
+            vectors = dict(zip(found, matrix[picked]))
+        pending = {key: text for key, text in zip(keys, texts) if key not in rows}
+        _STATS["hits"] += len(keys) - sum(1 for key in keys if key in pending)
+        _STATS["misses"] += len(pending)
+
+    warning = ""
+    pending_keys = list(pending)
+    embedded_keys: list = []
+    embedded: list = []
+    batch_size = max(1, int(os.getenv("EMBED_BATCH_SIZE", str(EMBED_BATCH_SIZE))))
+    for start in range(0, len(pending_keys), batch_size):
+        batch_keys = pending_keys[start : start + batch_size]
+        batch, warning = _embed_batch([pending[key] for key in batch_keys], model)
+        if batch is None:
+            break
+        embedded_keys += batch_keys
+        embedded.append(batch)
+        with _LOCK:
+            _STATS["embedded"] += len(batch_keys)
+            _STATS["batches"] += 1
+
+    if embedded:
+        # One stack for the whole call; whatever was embedded before a failure is kept.
+        fresh = _normalise(np.vstack(embedded))
+        vectors.update(zip(embedded_keys, fresh))
+        with _LOCK:
+            _append(model, embedded_keys, fresh)
+            _evict(model)
+    if warning:
+        return None, warning
+    if len({vector.shape[0] for vector in vectors.values()}) > 1:
+        return None, f"embedding-store-reset: model={model} changed dimension"
+    return np.stack([vectors[key] for key in keys]), ""
+
+
+def cosine_scores(query: str, texts: Sequence[str]):
+    if not texts:
+        return [], ""
+    matrix, warning = embed([query, *texts])
+    if matrix is None:
+        return None, warning
+    # Rows are unit length, so one matrix-vector product gives every cosine similarity.
+    return (matrix[1:] @ matrix[0]).tolist(), ""
+
+
+def embedding_stats() -> Dict[str, int]:
+    with _LOCK:
+        stats = dict(_STATS)
+        stats["stored"] = sum(len(store[0]) for store in _STORES.values())
+    return stats
+
+
+def reset_stats() -> None:
+    with _LOCK:
+        for key in _STATS:
+            _STATS[key] = 0
+
+
+atexit.register(save_embedding_store)
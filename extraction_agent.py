@@ -1,15 +1,29 @@
 from __future__ import annotations
 
+import asyncio
 import os
 import re
+from concurrent.futures import ThreadPoolExecutor
 from typing import Any, Dict, List
 
 try:
-    from llm_client import call_llm_json, pop_warning
+    from context_packer import context_budget, estimate_tokens, pack_chunks
+    from llm_client import LLMResult, _json_system_prompt, call_llm_json_result, call_llm_json_result_async
+    from metrics import carry_context
+    from run_registry import carried, chunk_key, mark_done, unseen
 except ImportError:
-    from .llm_client import call_llm_json, pop_warning
+    from .context_packer import context_budget, estimate_tokens, pack_chunks
+    from .llm_client import LLMResult, _json_system_prompt, call_llm_json_result, call_llm_json_result_async
+    from .metrics import carry_context
+    from .run_registry import carried, chunk_key, mark_done, unseen
 
 EXTRACTION_MODEL = os.getenv("OLLAMA_MODEL_EXTRACTOR", os.getenv("OLLAMA_MODEL", "llama3.2:3b"))
+# "map_reduce" extracts each batch of chunks with its own call and merges the rows.
+EXTRACTION_MODE = os.getenv("EXTRACTION_MODE", "single").strip().lower()
+# Batches hold one source document each ("doc") or about EXTRACTION_BATCH_TOKENS of chunk text ("budget").
+EXTRACTION_BATCH_BY = os.getenv("EXTRACTION_BATCH_BY", "doc").strip().lower()
+EXTRACTION_BATCH_TOKENS = max(200, int(os.getenv("EXTRACTION_BATCH_TOKENS", "1500")))
+EXTRACTION_MAP_WORKERS = max(1, int(os.getenv("EXTRACTION_MAP_WORKERS", "4")))
 
 
 def _split_columns(text: str) -> List[str]:
@@ -146,23 +160,28 @@ def _default_rows(chunks: List[Dict[str, Any]], goal: str, columns: List[str]) -
     }
 
 
-def extraction_node(state):
-    goal = state["goal"]
-    output_format = state["output_format"]
-    columns = state["table_columns"]
+def _render_chunk(item: Dict[str, Any], text: str) -> str:
+    return f"Source: {item['title']} ({item['url']})\nScore: {item['score']:.2f}\nText: {text}"
 
-    context_parts = []
-    for item in state["retrieved_chunks"][:18]:
-        context_parts.append(
-            f"Source: {item['title']} ({item['url']})\n"
-            f"Score: {item['score']:.2f}\n"
-            f"Text: {item['chunk'][:900]}"
-        )
-    context_text = "\n\n".join(context_parts)
 
-    if output_format == "table":
-        fallback = _default_rows(state["retrieved_chunks"], goal=goal, columns=columns)
-        prompt = f"""
+def _build_context(state, chunks: List[Dict[str, Any]], prompt_overhead: str) -> tuple[str, Dict[str, Any]]:
+    # Chunks are packed by score into what is left of the model's window after the prompt and
+    # the answer; the report of what was packed or dropped ends up in state["context_pack"].
+    parts, report = pack_chunks(chunks, context_budget(prompt_overhead), _render_chunk)
+    handled = {entry["index"] for entry in report["packed"]}
+    handled.update(entry["index"] for entry in report["dropped"] if entry["reason"] == "redundant")
+    # Chunks left out for lack of room stay eligible for the next iteration's extraction.
+    mark_done(state, "extraction", [item for idx, item in enumerate(chunks) if idx in handled], chunk_key)
+    return "\n\n".join(parts), report
+
+
+def _chunks_to_extract(state) -> List[Dict[str, Any]]:
+    # Chunks that were already in an earlier iteration's context have their rows in the state.
+    return unseen(state, "extraction", state["retrieved_chunks"], chunk_key)
+
+
+def _table_prompt(goal: str, columns: List[str], context_text: str) -> str:
+    return f"""
 User goal:
 {goal}
 
@@ -171,45 +190,16 @@ Output must be a JSON object with:
 - columns: string[]
 - rows: object[]
 
-Preferred columns: {fallback['columns']}
+Preferred columns: {columns}
 Use "NA" if a value is missing.
 
 Context:
 {context_text}
 """
-        extracted = call_llm_json(
-            prompt=prompt,
-            schema_hint="{columns:string[], rows:object[]}",
-            fallback=fallback,
-            model_name=EXTRACTION_MODEL,
-        )
-        warning = pop_warning()
-        if warning:
-            state["errors"].append(warning)
 
-        if not isinstance(extracted.get("rows"), list):
-            extracted = fallback
-        if not isinstance(extracted.get("columns"), list):
-            extracted["columns"] = fallback["columns"]
-        extracted["columns"] = _normalize_columns(extracted.get("columns", []), goal)
-        extracted["rows"] = _normalize_rows(extracted.get("rows", []), extracted["columns"])
 
-        state["extracted_output"] = extracted
-        state["extracted_items"] = extracted.get("rows", [])
-    else:
-        fallback = {
-            "format": output_format,
-            "items": [
-                {
-                    "finding": item["chunk"][:220],
-                    "source_title": item["title"],
-                    "source_url": item["url"],
-                }
-                for item in state["retrieved_chunks"][:12]
-            ],
-        }
-
-        prompt = f"""
+def _items_prompt(goal: str, output_format: str, context_text: str) -> str:
+    return f"""
 User goal:
 {goal}
 
@@ -222,20 +212,80 @@ Return JSON:
 Context:
 {context_text}
 """
-        extracted = call_llm_json(
-            prompt=prompt,
-            schema_hint="{format:string, items:object[]}",
-            fallback=fallback,
-            model_name=EXTRACTION_MODEL,
-        )
-        warning = pop_warning()
-        if warning:
-            state["errors"].append(warning)
 
+
+def _extraction_request(state, chunks: List[Dict[str, Any]]) -> tuple[str, str, Dict[str, Any], Dict[str, Any]]:
+    goal = state["goal"]
+    output_format = state["output_format"]
+    columns = state["table_columns"]
+
+    if output_format == "table":
+        fallback = _default_rows(chunks, goal=goal, columns=columns)
+        schema_hint = "{columns:string[], rows:object[]}"
+        overhead = _json_system_prompt(schema_hint) + _table_prompt(goal, fallback["columns"], "")
+        context_text, report = _build_context(state, chunks, overhead)
+        return _table_prompt(goal, fallback["columns"], context_text), schema_hint, fallback, report
+
+    fallback = {
+        "format": output_format,
+        "items": [
+            {
+                "finding": item["chunk"][:220],
+                "source_title": item["title"],
+                "source_url": item["url"],
+            }
+            for item in chunks[:12]
+        ],
+    }
+
+    schema_hint = "{format:string, items:object[]}"
+    overhead = _json_system_prompt(schema_hint) + _items_prompt(goal, output_format, "")
+    context_text, report = _build_context(state, chunks, overhead)
+    return _items_prompt(goal, output_format, context_text), schema_hint, fallback, report
+
+
+def _dedupe_rows(rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    seen = set()
+    deduped = []
+    for row in rows:
+        key = tuple(str(value).strip().lower() for value in row.values())
+        if key in seen:
+            continue
+        seen.add(key)
+        deduped.append(row)
+    return deduped
+
+
+def _apply_extraction(state, result, fallback: Dict[str, Any]):
+    goal = state["goal"]
+    if result.warning:
+        state["errors"].append(result.warning)
+    extracted = result.data
+
+    if state["output_format"] == "table":
+        if not isinstance(extracted.get("rows"), list):
+            extracted = fallback
+        if not isinstance(extracted.get("columns"), list):
+            extracted["columns"] = fallback["columns"]
+        previous = carried(state, "extracted_items")
+        if previous:
+            # Earlier rows are kept; columns are the union of both iterations' columns.
+            extracted["columns"] = state["extracted_output"].get("columns", []) + extracted["columns"]
+        extracted["columns"] = _normalize_columns(extracted.get("columns", []), goal)
+        extracted["rows"] = _normalize_rows(previous + extracted.get("rows", []), extracted["columns"])
+        if previous:
+            extracted["rows"] = _dedupe_rows(extracted["rows"])
+
+        state["extracted_output"] = extracted
+        state["extracted_items"] = extracted.get("rows", [])
+    else:
         items = extracted.get("items") if isinstance(extracted, dict) else []
         if not isinstance(items, list):
             extracted = fallback
             items = fallback["items"]
+        items = carried(state, "extracted_items") + items
+        if isinstance(extracted, dict):
+            extracted["items"] = items
 
         state["extracted_output"] = extracted
         state["extracted_items"] = items
@@ -243,3 +293,155 @@ Context:
     count_score = min(len(state["extracted_items"]) / 10.0, 1.0)
     state["agent_confidences"]["extraction"] = count_score
     return state
+
+
+def _extraction_batches(chunks: List[Dict[str, Any]]) -> List[List[int]]:
+    if os.getenv("EXTRACTION_BATCH_BY", EXTRACTION_BATCH_BY).strip().lower() == "budget":
+        limit = max(200, int(os.getenv("EXTRACTION_BATCH_TOKENS", str(EXTRACTION_BATCH_TOKENS))))
+        batches: List[List[int]] = []
+        used = limit
+        for idx, item in enumerate(chunks):
+            cost = estimate_tokens(str(item.get("chunk", "")))
+            if used + cost > limit:
+                batches.append([])
+                used = 0
+            batches[-1].append(idx)
+            used += cost
+        return batches
+
+    by_url: Dict[str, List[int]] = {}
+    for idx, item in enumerate(chunks):
+        by_url.setdefault(str(item.get("url", "")), []).append(idx)
+    return list(by_url.values())
+
+
+def _map_requests(state, chunks: List[Dict[str, Any]]) -> tuple[List[List[Dict[str, Any]]], List[tuple]]:
+    # Packing registers chunks in the run registry, so every request is built on this thread.
+    batches = [[chunks[idx] for idx in batch] for batch in _extraction_batches(chunks)]
+    requests = [_extraction_request(state, batch) for batch in batches]
+
+    reports = [request[3] for request in requests]
+    state["context_pack"] = {
+        "batches": len(batches),
+        "budget_tokens": sum(report["budget_tokens"] for report in reports),
+        "used_tokens": sum(report["used_tokens"] for report in reports),
+        "packed": [entry for report in reports for entry in report["packed"]],
+        "dropped": [entry for report in reports for entry in report["dropped"]],
+    }
+    return batches, requests
+
+
+def _column_key(name: Any) -> str:
+    return re.sub(r"[\s_]+", " ", str(name)).strip().lower()
+
+
+def _reduce_results(state, batches, requests, results) -> tuple[LLMResult, Dict[str, Any]]:
+    # Every batch was asked for the same unified columns; rows are re-keyed onto them ignoring
+    # case and "_" vs " " ("source_url" is "Source URL"), and a row missing its Source URL
+    # inherits the batch's only URL. A batch that came back with no rows (or items) counts as
+    # fallen back: small models answer an empty list when they lose track of the schema.
+    for warning in dict.fromkeys(result.warning for result in results if result.warning):
+        state["errors"].append(warning)
+
+    if state["output_format"] != "table":
+        items = []
+        for request, result in zip(requests, results):
+            batch_items = result.data.get("items")
+            if not isinstance(batch_items, list) or not batch_items:
+                batch_items = request[2]["items"]
+            items.extend(item for item in batch_items if isinstance(item, dict))
+        fallback = {
+            "format": state["output_format"],
+            "items": [item for request in requests for item in request[2]["items"]],
+        }
+        merged = {"format": state["output_format"], "items": items}
+        return LLMResult(content="", model=EXTRACTION_MODEL, data=merged), fallback
+
+    columns = requests[0][2]["columns"]
+    lookup = {_column_key(column): column for column in columns}
+    url_column = next((c for c in columns if "source url" in c.lower() or c.lower() == "url"), "")
+    rows: List[Dict[str, Any]] = []
+    for batch, request, result in zip(batches, requests, results):
+        batch_rows = result.data.get("rows")
+        if not isinstance(batch_rows, list) or not batch_rows:
+            batch_rows = request[2]["rows"]
+        urls = {str(item.get("url", "")) for item in batch}
+        for row in batch_rows:
+            if not isinstance(row, dict):
+                continue
+            mapped = {}
+            for key, value in row.items():
+                column = lookup.get(_column_key(key))
+                if column:
+                    mapped[column] = value
+            if url_column and mapped.get(url_column) in (None, "", "NA") and len(urls) == 1:
+                mapped[url_column] = next(iter(urls))
+            rows.append(mapped)
+
+    merged = {"columns": columns, "rows": _dedupe_rows(_normalize_rows(rows, columns))}
+    fallback = {"columns": columns, "rows": [row for request in requests for row in request[2]["rows"]]}
+    return LLMResult(content="", model=EXTRACTION_MODEL, data=merged), fallback
+
+
+def _use_map_reduce(chunks: List[Dict[str, Any]]) -> bool:
+    mode = os.getenv("EXTRACTION_MODE", EXTRACTION_MODE).strip().lower()
+    return mode == "map_reduce" and len(_extraction_batches(chunks)) > 1
+
+
+def _extract_batch(request: tuple) -> LLMResult:
+    prompt, schema_hint, fallback, _ = request
+    return call_llm_json_result(prompt=prompt, schema_hint=schema_hint, fallback=fallback, model_name=EXTRACTION_MODEL)
+
+
+def extraction_node(state):
+    chunks = _chunks_to_extract(state)
+    if not chunks and carried(state, "extracted_items"):
+        return state
+
+    if _use_map_reduce(chunks):
+        batches, requests = _map_requests(state, chunks)
+        workers = max(1, int(os.getenv("EXTRACTION_MAP_WORKERS", str(EXTRACTION_MAP_WORKERS))))
+        # A timed-out batch falls back to heuristic rows for its own chunks only.
+        with ThreadPoolExecutor(max_workers=min(workers, len(requests))) as executor:
+            results = list(executor.map(carry_context(_extract_batch), requests))
+        result, fallback = _reduce_results(state, batches, requests, results)
+        return _apply_extraction(state, result, fallback)
+
+    prompt, schema_hint, fallback, state["context_pack"] = _extraction_request(state, chunks)
+    result = call_llm_json_result(
+        prompt=prompt,
+        schema_hint=schema_hint,
+        fallback=fallback,
+        model_name=EXTRACTION_MODEL,
+    )
+    return _apply_extraction(state, result, fallback)
+
+
+async def extraction_node_async(state):
+    chunks = _chunks_to_extract(state)
+    if not chunks and carried(state, "extracted_items"):
+        return state
+
+    if _use_map_reduce(chunks):
+        batches, requests = _map_requests(state, chunks)
+        slots = asyncio.Semaphore(max(1, int(os.getenv("EXTRACTION_MAP_WORKERS", str(EXTRACTION_MAP_WORKERS)))))
+
+        async def _extract(request: tuple) -> LLMResult:
+            prompt, schema_hint, fallback, _ = request
+            async with slots:
+                return await call_llm_json_result_async(
+                    prompt=prompt, schema_hint=schema_hint, fallback=fallback, model_name=EXTRACTION_MODEL
+                )
+
+        results = await asyncio.gather(*(_extract(request) for request in requests))
+        result, fallback = _reduce_results(state, batches, requests, results)
+        return _apply_extraction(state, result, fallback)
+
+    prompt, schema_hint, fallback, state["context_pack"] = _extraction_request(state, chunks)
+    result = await call_llm_json_result_async(
+        prompt=prompt,
+        schema_hint=schema_hint,
+        fallback=fallback,
+        model_name=EXTRACTION_MODEL,
+    )
+    return _apply_extraction(state, result, fallback)
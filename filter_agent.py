@@ -1,15 +1,26 @@
 from __future__ import annotations
 
+import asyncio
 import os
 import re
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
 from urllib.parse import urlparse
 
-import requests
-
 try:
-    from llm_client import call_llm_json, pop_warning
+    import page_cache
+    from async_http import async_http_head
+    from http_client import http_head
+    from llm_client import call_llm_json_result, call_llm_json_result_async
+    from metrics import carry_context
+    from run_registry import carried, mark_done, paper_url, unseen
 except ImportError:
-    from .llm_client import call_llm_json, pop_warning
+    from . import page_cache
+    from .async_http import async_http_head
+    from .http_client import http_head
+    from .llm_client import call_llm_json_result, call_llm_json_result_async
+    from .metrics import carry_context
+    from .run_registry import carried, mark_done, paper_url, unseen
 
 
 BLOCK_STATUSES = {401, 403, 407, 429, 503}
@@ -17,6 +28,11 @@ FILTER_MODEL = os.getenv("OLLAMA_MODEL_FILTER", os.getenv("OLLAMA_MODEL", "llama
 BLOCKED_HOST_KEYWORDS = {"github.com", "rth.dk", "reddit.com", "youtube.com"}
 BLOCKED_PATH_KEYWORDS = {"/about", "/help", "/docs", "/faq", "/blog"}
 NON_HTML_EXTENSIONS = {".pdf", ".doc", ".docx", ".ppt", ".pptx", ".xls", ".xlsx", ".zip"}
+FILTER_BATCH_SCORING = os.getenv("FILTER_BATCH_SCORING", "1") == "1"
+FILTER_BATCH_SIZE = max(1, int(os.getenv("FILTER_BATCH_SIZE", "8")))
+FILTER_BATCH_SNIPPET_CHARS = 300
+FILTER_PROBE_WORKERS = max(1, int(os.getenv("FILTER_PROBE_WORKERS", "8")))
+FILTER_LLM_WORKERS = max(1, int(os.getenv("FILTER_LLM_WORKERS", "4")))
 
 
 def _keyword_score(text: str, query: str) -> float:
@@ -35,8 +51,24 @@ def _is_valid_url(url: str) -> bool:
 
 
 def _status_obstruction(url: str) -> str:
+    # A fresh cached copy means the page was fetched with status 200 recently; skip the probe.
+    if page_cache.is_fresh(url):
+        return ""
     try:
-        response = requests.head(url, timeout=8, allow_redirects=True, headers={"User-Agent": "Mozilla/5.0"})
+        response = http_head(url, timeout=8, allow_redirects=True, headers={"User-Agent": "Mozilla/5.0"})
+        if response.status_code in BLOCK_STATUSES:
+            return f"status-{response.status_code}"
+    except Exception:
+        return "head-failed"
+    return ""
+
+
+async def _status_obstruction_async(url: str) -> str:
+    # page_cache is SQLite on disk; its lookups run in a worker thread so the loop keeps going.
+    if await asyncio.to_thread(page_cache.is_fresh, url):
+        return ""
+    try:
+        response = await async_http_head(url, timeout=8, headers={"User-Agent": "Mozilla/5.0"})
         if response.status_code in BLOCK_STATUSES:
             return f"status-{response.status_code}"
     except Exception:
@@ -57,8 +89,12 @@ def _is_noise_or_nonpaper_url(url: str) -> bool:
     return False
 
 
-def _llm_relevant(paper: dict, goal: str, fallback_score: float) -> tuple[bool, float]:
-    prompt = f"""
+RELEVANCE_SCHEMA_HINT = "{relevant:boolean, score:number}"
+BATCH_SCHEMA_HINT = "{results:[{index:number, relevant:boolean, score:number}]}"
+
+
+def _relevance_prompt(paper: dict, goal: str) -> str:
+    return f"""
 User goal:
 {goal}
 
@@ -71,27 +107,182 @@ Abstract/Snippet:
 Return JSON:
 {{"relevant": true/false, "score": number between 0 and 1}}
 """
-    parsed = call_llm_json(
-        prompt=prompt,
-        schema_hint="{relevant:boolean, score:number}",
-        fallback={"relevant": fallback_score >= 0.2, "score": fallback_score},
-        model_name=FILTER_MODEL,
-    )
+
+
+def _relevance_fallback(fallback_score: float) -> dict:
+    return {"relevant": fallback_score >= 0.2, "score": fallback_score}
+
+
+def _relevance_from(result, fallback_score: float) -> tuple[bool, float, str]:
+    parsed = result.data
 
     score = float(parsed.get("score", fallback_score) or fallback_score)
     relevant = bool(parsed.get("relevant", score >= 0.2))
-    return relevant, max(0.0, min(score, 1.0))
+    return relevant, max(0.0, min(score, 1.0)), result.warning
 
 
-def filter_node(state):
-    goal = state["goal"]
-    query = state["search_query"]
+def _llm_relevant(paper: dict, goal: str, fallback_score: float) -> tuple[bool, float, str]:
+    result = call_llm_json_result(
+        prompt=_relevance_prompt(paper, goal),
+        schema_hint=RELEVANCE_SCHEMA_HINT,
+        fallback=_relevance_fallback(fallback_score),
+        model_name=FILTER_MODEL,
+    )
+    return _relevance_from(result, fallback_score)
 
-    filtered = []
+
+async def _llm_relevant_async(paper: dict, goal: str, fallback_score: float) -> tuple[bool, float, str]:
+    result = await call_llm_json_result_async(
+        prompt=_relevance_prompt(paper, goal),
+        schema_hint=RELEVANCE_SCHEMA_HINT,
+        fallback=_relevance_fallback(fallback_score),
+        model_name=FILTER_MODEL,
+    )
+    return _relevance_from(result, fallback_score)
+
+
+def _coerce_bool(value, default: bool) -> bool:
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, (int, float)):
+        return value != 0
+    if isinstance(value, str):
+        lowered = value.strip().lower()
+        if lowered in {"true", "yes", "1"}:
+            return True
+        if lowered in {"false", "no", "0"}:
+            return False
+    return default
+
+
+def _parse_batch_results(parsed: dict, size: int) -> Dict[int, tuple[bool, float]]:
+    entries = parsed.get("results")
+    if not isinstance(entries, list):
+        entries = next((value for value in parsed.values() if isinstance(value, list)), [])
+
+    results: Dict[int, tuple[bool, float]] = {}
+    for entry in entries:
+        if not isinstance(entry, dict):
+            continue
+        try:
+            index = int(entry.get("index"))
+            score = float(entry.get("score"))
+        except (TypeError, ValueError):
+            continue
+        if not 0 <= index < size or index in results:
+            continue
+        score = max(0.0, min(score, 1.0))
+        results[index] = (_coerce_bool(entry.get("relevant"), score >= 0.2), score)
+    return results
+
+
+def _batch_prompt(papers: List[dict], goal: str) -> str:
+    listing = "\n\n".join(
+        f"[{idx}] Title: {paper.get('title', '')}\n"
+        f"Snippet: {str(paper.get('summary', ''))[:FILTER_BATCH_SNIPPET_CHARS]}"
+        for idx, paper in enumerate(papers)
+    )
+    return f"""
+User goal:
+{goal}
+
+Judge each search result below for relevance to the goal.
+
+{listing}
+
+Return JSON with one entry per result:
+{{"results": [{{"index": number, "relevant": true/false, "score": number between 0 and 1}}]}}
+"""
+
+
+def _llm_relevant_batch(papers: List[dict], goal: str) -> tuple[Dict[int, tuple[bool, float]], str]:
+    result = call_llm_json_result(
+        prompt=_batch_prompt(papers, goal),
+        schema_hint=BATCH_SCHEMA_HINT,
+        fallback={},
+        model_name=FILTER_MODEL,
+    )
+    return _parse_batch_results(result.data, len(papers)), result.warning
+
+
+async def _llm_relevant_batch_async(papers: List[dict], goal: str) -> tuple[Dict[int, tuple[bool, float]], str]:
+    result = await call_llm_json_result_async(
+        prompt=_batch_prompt(papers, goal),
+        schema_hint=BATCH_SCHEMA_HINT,
+        fallback={},
+        model_name=FILTER_MODEL,
+    )
+    return _parse_batch_results(result.data, len(papers)), result.warning
+
+
+def _score_candidates(gated: List[tuple[dict, float]], goal: str, state) -> List[tuple[bool, float]]:
+    scores: List[tuple[bool, float] | None] = [None] * len(gated)
+
+    if FILTER_BATCH_SCORING and len(gated) > 1:
+        for start in range(0, len(gated), FILTER_BATCH_SIZE):
+            batch = [paper for paper, _ in gated[start : start + FILTER_BATCH_SIZE]]
+            results, warning = _llm_relevant_batch(batch, goal)
+            for offset, result in results.items():
+                scores[start + offset] = result
+            if warning:
+                state["errors"].append(warning)
+
+    # Anything the batch answer skipped or garbled is judged on its own, in parallel.
+    pending = [idx for idx, score in enumerate(scores) if score is None]
+    if pending:
+        workers = max(1, int(os.getenv("FILTER_LLM_WORKERS", str(FILTER_LLM_WORKERS))))
+        with ThreadPoolExecutor(max_workers=min(workers, len(pending))) as executor:
+            answers = executor.map(
+                carry_context(lambda idx: _llm_relevant(paper=gated[idx][0], goal=goal, fallback_score=gated[idx][1])),
+                pending,
+            )
+            for idx, (relevant, score, warning) in zip(pending, answers):
+                scores[idx] = (relevant, score)
+                if warning:
+                    state["errors"].append(warning)
+
+    return scores
+
+
+async def _score_candidates_async(gated: List[tuple[dict, float]], goal: str, state) -> List[tuple[bool, float]]:
+    scores: List[tuple[bool, float] | None] = [None] * len(gated)
+
+    if FILTER_BATCH_SCORING and len(gated) > 1:
+        starts = list(range(0, len(gated), FILTER_BATCH_SIZE))
+        answers = await asyncio.gather(
+            *(
+                _llm_relevant_batch_async([paper for paper, _ in gated[start : start + FILTER_BATCH_SIZE]], goal)
+                for start in starts
+            )
+        )
+        for start, (results, warning) in zip(starts, answers):
+            for offset, result in results.items():
+                scores[start + offset] = result
+            if warning:
+                state["errors"].append(warning)
+
+    pending = [idx for idx, score in enumerate(scores) if score is None]
+    answers = await asyncio.gather(
+        *(_llm_relevant_async(paper=gated[idx][0], goal=goal, fallback_score=gated[idx][1]) for idx in pending)
+    )
+    for idx, (relevant, score, warning) in zip(pending, answers):
+        scores[idx] = (relevant, score)
+        if warning:
+            state["errors"].append(warning)
+
+    return scores
+
+
+def _gate_candidates(state):
+    query = state["search_query"]
     audits = []
-    semantic_scores = []
+    gated = []
+
+    # Candidates judged in an earlier iteration keep their audit and verdict.
+    candidates = unseen(state, "filter", state["candidate_papers"], paper_url)
+    mark_done(state, "filter", candidates, paper_url)
 
-    for paper in state["candidate_papers"]:
+    for paper in candidates:
         url = str(paper.get("html_link", "")).strip()
         title = str(paper.get("title", "")).strip()
         summary = str(paper.get("summary", "")).strip()
@@ -104,14 +295,13 @@ def filter_node(state):
             "relevant": False,
             "obstruction": "",
         }
+        audits.append(audit)
 
         if not _is_valid_url(url):
             audit["obstruction"] = "invalid-url"
-            audits.append(audit)
             continue
         if _is_noise_or_nonpaper_url(url):
             audit["obstruction"] = "filtered-nonpaper-source"
-            audits.append(audit)
             continue
 
         combined = f"{title} {summary}"
@@ -119,35 +309,84 @@ def filter_node(state):
         audit["keyword_score"] = keyword_score
 
         if keyword_score < 0.08:
-            audits.append(audit)
             continue
 
-        relevant, semantic_score = _llm_relevant(paper=paper, goal=goal, fallback_score=keyword_score)
-        warning = pop_warning()
-        if warning:
-            state["errors"].append(warning)
-        audit["semantic_score"] = semantic_score
+        gated.append((paper, audit, url, keyword_score))
 
-        if not relevant:
-            audits.append(audit)
-            continue
+    return audits, gated
 
-        obstruction = _status_obstruction(url)
-        if obstruction:
-            audit["obstruction"] = obstruction
-            audits.append(audit)
-            continue
 
-        audit["relevant"] = True
-        filtered.append(paper)
-        semantic_scores.append(semantic_score)
-        audits.append(audit)
-
-    state["filtered_papers"] = filtered
-    state["url_audit"] = audits
+def _finish_filter(state, filtered, audits):
+    state["filtered_papers"] = carried(state, "filtered_papers") + filtered
+    state["url_audit"] = carried(state, "url_audit") + audits
 
+    filtered = state["filtered_papers"]
+    semantic_scores = [audit["semantic_score"] for audit in state["url_audit"] if audit["relevant"]]
     pass_rate = (len(filtered) / len(state["candidate_papers"])) if state["candidate_papers"] else 0.0
     semantic_avg = (sum(semantic_scores) / len(semantic_scores)) if semantic_scores else 0.0
     state["agent_confidences"]["filter"] = max(0.0, min((0.6 * pass_rate) + (0.4 * semantic_avg), 1.0))
 
     return state
+
+
+def filter_node(state):
+    goal = state["goal"]
+
+    filtered = []
+    audits, gated = _gate_candidates(state)
+
+    # HEAD probes start for every gated URL while the LLM is judging, but a probe result
+    # is only consulted for candidates the LLM marks relevant, exactly as before.
+    probe_workers = max(1, int(os.getenv("FILTER_PROBE_WORKERS", str(FILTER_PROBE_WORKERS))))
+    probe_pool = ThreadPoolExecutor(max_workers=min(probe_workers, max(len(gated), 1)))
+    try:
+        probes = [probe_pool.submit(carry_context(_status_obstruction), url) for _, _, url, _ in gated]
+        llm_scores = _score_candidates([(paper, kscore) for paper, _, _, kscore in gated], goal, state)
+
+        for (paper, audit, _, _), (relevant, semantic_score), probe in zip(gated, llm_scores, probes):
+            audit["semantic_score"] = semantic_score
+
+            if not relevant:
+                continue
+
+            obstruction = probe.result()
+            if obstruction:
+                audit["obstruction"] = obstruction
+                continue
+
+            audit["relevant"] = True
+            filtered.append(paper)
+    finally:
+        probe_pool.shutdown(wait=False, cancel_futures=True)
+
+    return _finish_filter(state, filtered, audits)
+
+
+async def filter_node_async(state):
+    goal = state["goal"]
+
+    filtered = []
+    audits, gated = _gate_candidates(state)
+
+    probes = [asyncio.create_task(_status_obstruction_async(url)) for _, _, url, _ in gated]
+    try:
+        llm_scores = await _score_candidates_async([(paper, kscore) for paper, _, _, kscore in gated], goal, state)
+
+        for (paper, audit, _, _), (relevant, semantic_score), probe in zip(gated, llm_scores, probes):
+            audit["semantic_score"] = semantic_score
+
+            if not relevant:
+                continue
+
+            obstruction = await probe
+            if obstruction:
+                audit["obstruction"] = obstruction
+                continue
+
+            audit["relevant"] = True
+            filtered.append(paper)
+    finally:
+        for probe in probes:
+            probe.cancel()
+
+    return _finish_filter(state, filtered, audits)
@@ -0,0 +1,214 @@
+from __future__ import annotations
+
+import os
+import re
+from html.entities import name2codepoint
+from typing import Callable, Dict, List
+
+from bs4 import BeautifulSoup
+
+try:
+    from lxml import etree
+except ImportError:
+    etree = None
+
+
+HTML_TEXT_ENGINE = os.getenv("HTML_TEXT_ENGINE", "lxml").strip().lower()
+SKIP_TAGS = ("script", "style", "nav", "footer", "header", "form", "noscript", "svg")
+TEXT_TAGS = ("p", "li", "h1", "h2", "h3", "h4")
+MIN_PART_CHARS = 40
+_WHITESPACE = re.compile(r"\s+")
+# Comments and raw-text blocks are matched whole so markup inside them is not read as tags.
+_MARKUP = re.compile(
+    r"<!--.*?-->|<(script|style)\b[^>]*>.*?</\1\s*>|(<!\[CDATA\[)|<(/?)([A-Za-z][A-Za-z0-9:-]*)([^>]*)>",
+    re.S | re.I,
+)
+VOID_TAGS = frozenset("area base basefont br col frame hr img input isindex link meta param".split())
+# Named references are only decoded the same way when they are known and ';'-terminated.
+_NAMED_REF = re.compile(r"&([A-Za-z][A-Za-z0-9]*)(;?)")
+_KNOWN_REFS = frozenset(name2codepoint) | {"apos"}
+# libxml2 ignores an end tag that would close an open element of higher priority than itself.
+_END_PRIORITY = {"div": 150, "td": 160, "th": 160, "tr": 170, "thead": 180, "tbody": 180, "tfoot": 180,
+                 "table": 190, "head": 200, "body": 200, "html": 220}
+# Void in HTML5 but unknown to libxml2's HTML4 table, which would nest the rest of the page
+# inside them. They hold no text, so swapping them for <br> (which only separates strings,
+# as they do under html.parser) leaves the output unchanged.
+_HTML5_VOID = re.compile(r"</?(?:embed|keygen|source|track|wbr)(?=[\s/>])[^>]*>", re.I)
+# Inline elements libxml2 closes when one of these opens inside them; a later end tag for the
+# inline element then matches an outer element instead.
+_START_CLOSES = {
+    "p": frozenset("b big i s small strike tt u".split()),
+    "table": frozenset({"a"}),
+    "fieldset": frozenset({"a"}),
+    "center": frozenset("b font i".split()),
+}
+_TABLE_PARTS = frozenset("caption colgroup tbody thead tfoot tr td th".split())
+_TABLE_PARENTS = frozenset("table tbody thead tfoot tr".split())
+# Tags libxml2 lets a <p> or heading contain without closing it first.
+PHRASING_TAGS = frozenset(
+    "a abbr audio b bdi bdo br button canvas cite code data dfn em font i iframe img input kbd label "
+    "map mark math noscript object picture q s samp script select option small span strong style sub "
+    "sup svg time u var video".split()
+)
+
+
+def _keep(text: str, parts: List[str]) -> None:
+    text = _WHITESPACE.sub(" ", text).strip()
+    if len(text) >= MIN_PART_CHARS:
+        parts.append(text)
+
+
+def _bs4_text(html: str) -> str:
+    soup = BeautifulSoup(html, "html.parser")
+
+    for tag in soup(list(SKIP_TAGS)):
+        tag.decompose()
+
+    parts: List[str] = []
+    for tag in soup.find_all(list(TEXT_TAGS)):
+        _keep(tag.get_text(" ", strip=True), parts)
+
+    return "\n".join(parts)
+
+
+# Parser target for lxml: libxml2 reports start/end/data events and no tree is built.
+# Boilerplate subtrees are skipped by depth counting, and every open text tag collects the
+# strings under it, so nested matches repeat text the same way find_all + get_text does.
+class _TextTarget:
+    def __init__(self):
+        self.skip_depth = 0
+        self.open: List[tuple[str, int, List[str]]] = []
+        self.slots: List[str | None] = []
+        self.buffer: List[str] = []
+
+    def _flush(self) -> None:
+        # libxml2 may split one text node across several data events; bs4 strips whole nodes.
+        if not self.buffer:
+            return
+        text = "".join(self.buffer).strip()
+        self.buffer = []
+        if text:
+            for _, _, pieces in self.open:
+                pieces.append(text)
+
+    def start(self, tag, attrib) -> None:
+        self._flush()
+        if self.skip_depth or tag in SKIP_TAGS:
+            self.skip_depth += 1
+        elif tag in TEXT_TAGS:
+            # Reserve the output position now: find_all orders matches by their start tag.
+            self.open.append((tag, len(self.slots), []))
+            self.slots.append(None)
+
+    def end(self, tag) -> None:
+        self._flush()
+        if self.skip_depth:
+            self.skip_depth -= 1
+        elif self.open and self.open[-1][0] == tag:
+            _, slot, pieces = self.open.pop()
+            self.slots[slot] = " ".join(pieces)
+
+    def data(self, text) -> None:
+        if not self.skip_depth and self.open:
+            self.buffer.append(text)
+
+    def comment(self, text) -> None:
+        self._flush()
+
+    def close(self) -> str:
+        self._flush()
+        while self.open:
+            _, slot, pieces = self.open.pop()
+            self.slots[slot] = " ".join(pieces)
+        parts: List[str] = []
+        for text in self.slots:
+            _keep(text or "", parts)
+        return "\n".join(parts)
+
+
+def _lxml_safe(html: str) -> bool:
+    # libxml2 applies HTML's implicit end tags (a <div> closes an open <p>, an <li> closes an
+    # open <li>) where html.parser keeps nesting, so the two engines only agree when every
+    # text tag on the page is closed explicitly. Any markup that might be repaired differently
+    # sends the page to the bs4 engine instead.
+    if any(not semicolon or name not in _KNOWN_REFS for name, semicolon in set(_NAMED_REF.findall(html))):
+        return False
+    stack: List[str] = []
+    open_text = 0
+    for _, cdata, closing, name, rest in _MARKUP.findall(html):
+        if cdata:
+            return False
+        if not name:
+            continue
+        name = name.lower()
+        if name in VOID_TAGS:
+            continue
+        if name in ("textarea", "plaintext", "xmp", "template"):
+            return False
+        if closing:
+            if stack and stack[-1] == name:
+                stack.pop()
+                open_text -= name in TEXT_TAGS
+                continue
+            if name not in stack:
+                # A stray end tag still splits the surrounding text under html.parser.
+                if open_text:
+                    return False
+                continue
+            depth = len(stack) - 1 - stack[::-1].index(name)
+            # Closing across open elements: bs4 pops them all, libxml2 may ignore the end tag.
+            priority = _END_PRIORITY.get(name, 100)
+            if any(
+                _END_PRIORITY.get(tag, 100) > priority or tag in TEXT_TAGS or tag in SKIP_TAGS
+                for tag in stack[depth + 1 :]
+            ):
+                return False
+            open_text -= name in TEXT_TAGS
+            del stack[depth:]
+            continue
+        if rest.endswith("/"):
+            return False
+        if name in _TABLE_PARTS and (not stack or stack[-1] not in _TABLE_PARENTS):
+            # Rows and cells outside a table (or inside a cell's <p>/<li>) are repaired differently.
+            return False
+        if stack and stack[-1] in _START_CLOSES.get(name, ()):
+            return False
+        if name in ("a", "form") and name in stack:
+            # libxml2 closes an open <a> and drops a nested <form> start tag, so the end tags
+            # that follow pair up differently from html.parser's nesting.
+            return False
+        if open_text:
+            inner = next(tag for tag in reversed(stack) if tag in TEXT_TAGS)
+            if inner == "li" and name == "li":
+                return False
+            # Checked against the innermost text tag, not just the top of the stack: libxml2
+            # also closes a <p> around an <a> or <span> when a block such as <table> opens.
+            if inner != "li" and name not in PHRASING_TAGS:
+                return False
+        stack.append(name)
+        open_text += name in TEXT_TAGS
+    return not open_text
+
+
+def _lxml_text(html: str) -> str:
+    if not html.strip():
+        return ""
+    markup = _HTML5_VOID.sub("<br>", html)
+    if not _lxml_safe(markup):
+        return _bs4_text(html)
+    parser = etree.HTMLParser(target=_TextTarget(), no_network=True, recover=True)
+    try:
+        parser.feed(markup)
+        return parser.close()
+    except etree.Error:
+        return _bs4_text(html)
+
+
+ENGINES: Dict[str, Callable[[str], str]] = {"bs4": _bs4_text}
+if etree is not None:
+    ENGINES["lxml"] = _lxml_text
+
+
+def extract_text(html: str, engine: str | None = None) -> str:
+    name = (engine or os.getenv("HTML_TEXT_ENGINE", HTML_TEXT_ENGINE)).strip().lower()
+    return ENGINES.get(name, _bs4_text)(html)
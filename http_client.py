@@ -0,0 +1,169 @@
+from __future__ import annotations
+
+import os
+import threading
+import time
+from typing import Dict
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.util.retry import Retry
+
+try:
+    import brotli  # noqa: F401
+
+    _ACCEPT_ENCODING = "gzip, deflate, br"
+except ImportError:
+    try:
+        import brotlicffi  # noqa: F401
+
+        _ACCEPT_ENCODING = "gzip, deflate, br"
+    except ImportError:
+        _ACCEPT_ENCODING = "gzip, deflate"
+
+try:
+    from metrics import record_io
+except ImportError:
+    from .metrics import record_io
+
+
+HTTP_POOL_HOSTS = max(1, int(os.getenv("HTTP_POOL_HOSTS", "32")))
+HTTP_POOL_PER_HOST = max(1, int(os.getenv("HTTP_POOL_PER_HOST", "4")))
+HTTP_RETRIES = max(0, int(os.getenv("HTTP_RETRIES", "2")))
+HTTP_BACKOFF_SECONDS = float(os.getenv("HTTP_BACKOFF_SECONDS", "0.3"))
+# Gateway and overload answers, which a retry can fix; a 500 from the page itself rarely is.
+HTTP_RETRY_STATUSES = (502, 503, 504)
+DEFAULT_HEADERS = {"User-Agent": "Mozilla/5.0", "Accept-Encoding": _ACCEPT_ENCODING}
+
+_STATS_LOCK = threading.Lock()
+_STATS: Dict[str, Dict[str, int]] = {}
+_SESSION = None
+_SESSION_LOCK = threading.Lock()
+
+
+def _record(host: str, key: str) -> None:
+    with _STATS_LOCK:
+        entry = _STATS.setdefault(host, {"requests": 0, "new_connections": 0})
+        entry[key] += 1
+
+
+class _CountingHTTPConnectionPool(HTTPConnectionPool):
+    def _new_conn(self):
+        _record(self.host, "new_connections")
+        return super()._new_conn()
+
+    def urlopen(self, *args, **kwargs):
+        _record(self.host, "requests")
+        return super().urlopen(*args, **kwargs)
+
+
+class _CountingHTTPSConnectionPool(HTTPSConnectionPool):
+    def _new_conn(self):
+        _record(self.host, "new_connections")
+        return super()._new_conn()
+
+    def urlopen(self, *args, **kwargs):
+        _record(self.host, "requests")
+        return super().urlopen(*args, **kwargs)
+
+
+class _CountingAdapter(HTTPAdapter):
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": _CountingHTTPConnectionPool,
+            "https": _CountingHTTPSConnectionPool,
+        }
+
+
+def _build_session() -> requests.Session:
+    retry = Retry(
+        total=HTTP_RETRIES,
+        connect=HTTP_RETRIES,
+        # A read timeout means the server got the request and is slow; resending it only
+        # multiplies the wait (15s timeout x retries) and the load on that host.
+        read=0,
+        status=HTTP_RETRIES,
+        backoff_factor=HTTP_BACKOFF_SECONDS,
+        status_forcelist=HTTP_RETRY_STATUSES,
+        allowed_methods=frozenset({"GET", "HEAD"}),
+        raise_on_status=False,
+    )
+    adapter = _CountingAdapter(
+        pool_connections=HTTP_POOL_HOSTS,
+        pool_maxsize=HTTP_POOL_PER_HOST,
+        max_retries=retry,
+    )
+    session = requests.Session()
+    session.headers.update(DEFAULT_HEADERS)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def get_session() -> requests.Session:
+    global _SESSION
+    if _SESSION is None:
+        with _SESSION_LOCK:
+            if _SESSION is None:
+                _SESSION = _build_session()
+    return _SESSION
+
+
+def _request(method: str, url: str, **kwargs) -> requests.Response:
+    started = time.perf_counter()
+    try:
+        response = get_session().request(method, url, **kwargs)
+    except Exception:
+        record_io(f"http_{method.lower()}", time.perf_counter() - started, error=True)
+        raise
+    body = response.request.body or b""
+    record_io(
+        f"http_{method.lower()}",
+        time.perf_counter() - started,
+        bytes_in=len(response.content),
+        bytes_out=len(body.encode("utf-8") if isinstance(body, str) else body),
+    )
+    return response
+
+
+def http_get(url: str, **kwargs) -> requests.Response:
+    return _request("GET", url, **kwargs)
+
+
+def http_head(url: str, **kwargs) -> requests.Response:
+    kwargs.setdefault("allow_redirects", False)
+    return _request("HEAD", url, **kwargs)
+
+
+def http_post(url: str, **kwargs) -> requests.Response:
+    return _request("POST", url, **kwargs)
+
+
+def connection_stats() -> Dict[str, object]:
+    with _STATS_LOCK:
+        hosts = {host: dict(entry) for host, entry in _STATS.items()}
+    for entry in hosts.values():
+        entry["reused_connections"] = max(entry["requests"] - entry["new_connections"], 0)
+    total_requests = sum(entry["requests"] for entry in hosts.values())
+    total_new = sum(entry["new_connections"] for entry in hosts.values())
+    return {
+        "requests": total_requests,
+        "new_connections": total_new,
+        "reused_connections": max(total_requests - total_new, 0),
+        "hosts": hosts,
+    }
+
+
+def reset_stats() -> None:
+    with _STATS_LOCK:
+        _STATS.clear()
+
+
+def close_session() -> None:
+    global _SESSION
+    with _SESSION_LOCK:
+        if _SESSION is not None:
+            _SESSION.close()
+            _SESSION = None
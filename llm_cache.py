@@ -0,0 +1,157 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", ".llm_cache.sqlite3")
+LLM_CACHE_TTL_SECONDS = float(os.getenv("LLM_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+LLM_CACHE_MAX_ENTRIES = max(1, int(os.getenv("LLM_CACHE_MAX_ENTRIES", "20000")))
+LLM_CACHE_MEMORY_ENTRIES = max(1, int(os.getenv("LLM_CACHE_MEMORY_ENTRIES", "512")))
+
+_LOCK = threading.Lock()
+_MEMORY: "OrderedDict[str, tuple[float, str]]" = OrderedDict()
+_CONN = None
+_CONN_PATH = ""
+_STATS = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "stored": 0, "evicted": 0, "bypassed": 0}
+
+
+def is_enabled() -> bool:
+    return os.getenv("LLM_CACHE_ENABLED", "1") == "1"
+
+
+def is_bypassed() -> bool:
+    return os.getenv("LLM_CACHE_BYPASS", "0") == "1"
+
+
+def make_key(model: str, messages: List[Dict[str, str]], options: Dict[str, Any]) -> str:
+    payload = json.dumps(
+        {"model": model, "messages": messages, "options": options},
+        sort_keys=True,
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _ttl() -> float:
+    return float(os.getenv("LLM_CACHE_TTL_SECONDS", str(LLM_CACHE_TTL_SECONDS)))
+
+
+def _connection() -> sqlite3.Connection:
+    global _CONN, _CONN_PATH
+    path = os.getenv("LLM_CACHE_PATH", LLM_CACHE_PATH)
+    if _CONN is None or _CONN_PATH != path:
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        _CONN = sqlite3.connect(path, check_same_thread=False)
+        _CONN.execute(
+            """
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                content TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )
+            """
+        )
+        _CONN.commit()
+        _CONN_PATH = path
+    return _CONN
+
+
+def _remember(key: str, created_at: float, content: str) -> None:
+    _MEMORY[key] = (created_at, content)
+    _MEMORY.move_to_end(key)
+    while len(_MEMORY) > LLM_CACHE_MEMORY_ENTRIES:
+        _MEMORY.popitem(last=False)
+
+
+def get(key: str) -> Optional[str]:
+    if not is_enabled():
+        return None
+    if is_bypassed():
+        with _LOCK:
+            _STATS["bypassed"] += 1
+        return None
+
+    now = time.time()
+    ttl = _ttl()
+    with _LOCK:
+        cached = _MEMORY.get(key)
+        if cached is not None and now - cached[0] < ttl:
+            _MEMORY.move_to_end(key)
+            _STATS["memory_hits"] += 1
+            return cached[1]
+        _MEMORY.pop(key, None)
+
+        try:
+            conn = _connection()
+            row = conn.execute("SELECT content, created_at FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is not None and now - row[1] >= ttl:
+                conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                conn.commit()
+                row = None
+            if row is not None:
+                conn.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key))
+                conn.commit()
+        except sqlite3.Error:
+            row = None
+
+        if row is None:
+            _STATS["misses"] += 1
+            return None
+        _remember(key, row[1], row[0])
+        _STATS["disk_hits"] += 1
+        return row[0]
+
+
+def put(key: str, content: str) -> None:
+    if not is_enabled() or not content:
+        return
+    now = time.time()
+    with _LOCK:
+        _remember(key, now, content)
+        try:
+            conn = _connection()
+            conn.execute(
+                "INSERT OR REPLACE INTO responses (key, content, created_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, content, now, now),
+            )
+            _evict(conn, now)
+            conn.commit()
+        except sqlite3.Error:
+            return
+        _STATS["stored"] += 1
+
+
+def _evict(conn: sqlite3.Connection, now: float) -> None:
+    expired = conn.execute("DELETE FROM responses WHERE created_at <= ?", (now - _ttl(),)).rowcount
+    max_entries = max(1, int(os.getenv("LLM_CACHE_MAX_ENTRIES", str(LLM_CACHE_MAX_ENTRIES))))
+    count = conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+    overflow = count - max_entries
+    if overflow > 0:
+        conn.execute(
+            "DELETE FROM responses WHERE key IN (SELECT key FROM responses ORDER BY accessed_at ASC LIMIT ?)",
+            (overflow,),
+        )
+    _STATS["evicted"] += max(expired, 0) + max(overflow, 0)
+
+
+def cache_stats() -> Dict[str, Any]:
+    with _LOCK:
+        stats: Dict[str, Any] = dict(_STATS)
+    lookups = stats["memory_hits"] + stats["disk_hits"] + stats["misses"]
+    stats["hit_rate"] = ((stats["memory_hits"] + stats["disk_hits"]) / lookups) if lookups else 0.0
+    return stats
+
+
+def reset_stats() -> None:
+    with _LOCK:
+        for key in _STATS:
+            _STATS[key] = 0
@@ -1,56 +1,98 @@
 from __future__ import annotations
 
+import asyncio
 import json
 import os
-from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeoutError
-from typing import Any, Dict
+import threading
+import time
+import weakref
+from concurrent.futures import TimeoutError as FuturesTimeoutError
+from dataclasses import dataclass, field, replace
+from typing import Any, Dict, List, Sequence
 
+import httpx
 import ollama
-import requests
+
+try:
+    import llm_cache
+    from llm_dispatcher import OLLAMA_MAX_IN_FLIGHT, OLLAMA_QUEUE_TIMEOUT_SECONDS, QueueTimeoutError, get_dispatcher
+    from metrics import record_io, record_llm
+    from ollama_health import get_health
+    from single_flight import SingleFlight
+except ImportError:
+    from . import llm_cache
+    from .llm_dispatcher import OLLAMA_MAX_IN_FLIGHT, OLLAMA_QUEUE_TIMEOUT_SECONDS, QueueTimeoutError, get_dispatcher
+    from .metrics import record_io, record_llm
+    from .ollama_health import get_health
+    from .single_flight import SingleFlight
 
 
 DEFAULT_MODEL_NAME = os.getenv("OLLAMA_MODEL", "llama3.2:3b")
 OLLAMA_HOST = os.getenv("OLLAMA_HOST", "http://127.0.0.1:11434")
 OLLAMA_TIMEOUT_SECONDS = float(os.getenv("OLLAMA_TIMEOUT_SECONDS", "8"))
 OLLAMA_CHAT_TIMEOUT_SECONDS = float(os.getenv("OLLAMA_CHAT_TIMEOUT_SECONDS", "45"))
-_LAST_WARNING = ""
+# Sent with every chat so prompt packing and the model agree on the context window.
+OLLAMA_NUM_CTX = max(512, int(os.getenv("OLLAMA_NUM_CTX", "4096")))
+# How long Ollama keeps a model loaded after a request ("30m", seconds such as "3600", "-1" = forever); empty uses
+# the server default of 5 minutes. Long-running workers set it so models stay warm between jobs.
+OLLAMA_KEEP_ALIVE = os.getenv("OLLAMA_KEEP_ALIVE", "").strip()
+_LAST_WARNING = threading.local()
 _OLLAMA_CLIENT = None
+# Async clients and in-flight semaphores are bound to the event loop that created them.
+_ASYNC_CLIENTS: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Any]" = weakref.WeakKeyDictionary()
+_ASYNC_SLOTS: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore]" = weakref.WeakKeyDictionary()
+# Identical deterministic prompts in flight at once (concurrent goals) are sent to Ollama once.
+_LLM_FLIGHT = SingleFlight("llm")
+
+
+@dataclass
+class LLMResult:
+    content: str
+    model: str
+    warning: str = ""
+    cached: bool = False
+    fell_back: bool = False
+    latency_seconds: float = 0.0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    data: Dict[str, Any] = field(default_factory=dict)
 
 
 def _set_warning(message: str) -> None:
-    global _LAST_WARNING
-    _LAST_WARNING = message
+    _LAST_WARNING.value = message
 
 
 def pop_warning() -> str:
-    global _LAST_WARNING
-    value = _LAST_WARNING
-    _LAST_WARNING = ""
+    value = getattr(_LAST_WARNING, "value", "")
+    _LAST_WARNING.value = ""
     return value
 
 
+def _availability_warning(timeout: float) -> str:
+    health = get_health(OLLAMA_HOST)
+    health.probe_timeout = min(timeout, OLLAMA_TIMEOUT_SECONDS)
+    if health.allow_request():
+        return ""
+    if health.state == "closed":
+        return f"ollama-unavailable: {health.last_error or 'unreachable'} host={OLLAMA_HOST}"
+    return f"ollama-unavailable: circuit-{health.state} host={OLLAMA_HOST}"
+
+
 def is_ollama_available(timeout: float = 1.0) -> bool:
-    try:
-        response = requests.get(
-            f"{OLLAMA_HOST}/api/tags",
-            timeout=min(timeout, OLLAMA_TIMEOUT_SECONDS),
-        )
-        ok = response.status_code == 200
-        if not ok:
-            _set_warning(f"ollama-unavailable: status={response.status_code} host={OLLAMA_HOST}")
-        return ok
-    except Exception:
-        _set_warning(f"ollama-unavailable: host={OLLAMA_HOST}")
-        return False
+    warning = _availability_warning(timeout)
+    if warning:
+        _set_warning(warning)
+    return not warning
 
 
 def _get_ollama_client():
+    # Every sync call goes through this client: the module-level ollama.chat/embed/generate
+    # helpers have no timeout. The HTTP-level timeout tears down the request itself, so a chat
+    # the caller gave up on stops generating instead of keeping Ollama busy. If the client
+    # cannot be built, the error reaches the caller's fallback and the next call tries again.
     global _OLLAMA_CLIENT
     if _OLLAMA_CLIENT is None:
-        try:
-            _OLLAMA_CLIENT = ollama.Client(host=OLLAMA_HOST)
-        except Exception:
-            _OLLAMA_CLIENT = None
+        _OLLAMA_CLIENT = ollama.Client(host=OLLAMA_HOST, timeout=OLLAMA_CHAT_TIMEOUT_SECONDS)
     return _OLLAMA_CLIENT
 
 
@@ -58,53 +100,272 @@ def _resolve_model_name(model_name: str | None) -> str:
     return (model_name or os.getenv("OLLAMA_MODEL") or DEFAULT_MODEL_NAME).strip()
 
 
-def call_llm(
-    prompt: str,
-    system_prompt: str = "",
-    temperature: float = 0.1,
-    fallback: str = "",
-    model_name: str | None = None,
-) -> str:
-    if not is_ollama_available(timeout=1.2):
-        return fallback
+def _get_async_ollama_client():
+    loop = asyncio.get_running_loop()
+    client = _ASYNC_CLIENTS.get(loop)
+    if client is None:
+        client = ollama.AsyncClient(host=OLLAMA_HOST, timeout=OLLAMA_CHAT_TIMEOUT_SECONDS)
+        _ASYNC_CLIENTS[loop] = client
+    return client
+
 
+def _async_slots() -> asyncio.Semaphore:
+    loop = asyncio.get_running_loop()
+    slots = _ASYNC_SLOTS.get(loop)
+    if slots is None:
+        slots = asyncio.Semaphore(max(1, int(os.getenv("OLLAMA_MAX_IN_FLIGHT", str(OLLAMA_MAX_IN_FLIGHT)))))
+        _ASYNC_SLOTS[loop] = slots
+    return slots
+
+
+def _keep_alive() -> str | float | None:
+    # Ollama reads a bare number as seconds but a string as a Go duration, which needs a unit:
+    # "-1" or "3600" must go out as numbers, "30m" as a string.
+    value = os.getenv("OLLAMA_KEEP_ALIVE", OLLAMA_KEEP_ALIVE).strip()
+    if not value:
+        return None
     try:
-        selected_model = _resolve_model_name(model_name)
-        messages = []
-        if system_prompt:
-            messages.append({"role": "system", "content": system_prompt})
-        messages.append({"role": "user", "content": prompt})
+        number = float(value)
+    except ValueError:
+        return value
+    return int(number) if number.is_integer() else number
+
+
+def _prepare_call(prompt: str, system_prompt: str, temperature: float, model_name: str | None):
+    selected_model = _resolve_model_name(model_name)
+    messages = []
+    if system_prompt:
+        messages.append({"role": "system", "content": system_prompt})
+    messages.append({"role": "user", "content": prompt})
+    options = {"temperature": temperature, "num_ctx": max(512, int(os.getenv("OLLAMA_NUM_CTX", str(OLLAMA_NUM_CTX))))}
+    # Only deterministic calls are cached; sampled answers would pin one random draw forever.
+    cache_key = llm_cache.make_key(selected_model, messages, options) if temperature == 0 else ""
+    return selected_model, messages, options, cache_key
+
+
+def _cached_result(cache_key: str, selected_model: str, started: float) -> LLMResult | None:
+    if not cache_key:
+        return None
+    cached = llm_cache.get(cache_key)
+    if cached is None:
+        return None
+    return _recorded(
+        LLMResult(
+            content=cached,
+            model=selected_model,
+            cached=True,
+            latency_seconds=time.perf_counter() - started,
+        )
+    )
+
+
+def _recorded(result: LLMResult) -> LLMResult:
+    record_llm(
+        result.model,
+        result.latency_seconds,
+        prompt_tokens=result.prompt_tokens,
+        completion_tokens=result.completion_tokens,
+        cached=result.cached,
+        fell_back=result.fell_back,
+    )
+    return result
+
+
+def _fallback_result(fallback: str, selected_model: str, warning: str, started: float) -> LLMResult:
+    return _recorded(
+        LLMResult(
+            content=fallback,
+            model=selected_model,
+            warning=warning,
+            fell_back=True,
+            latency_seconds=time.perf_counter() - started,
+        )
+    )
+
 
+def _response_result(response, cache_key: str, selected_model: str, started: float) -> LLMResult:
+    content = response["message"]["content"]
+    get_health(OLLAMA_HOST).record_success()
+    if cache_key:
+        llm_cache.put(cache_key, content)
+    return _recorded(
+        LLMResult(
+            content=content,
+            model=selected_model,
+            latency_seconds=time.perf_counter() - started,
+            prompt_tokens=int(response.get("prompt_eval_count") or 0),
+            completion_tokens=int(response.get("eval_count") or 0),
+        )
+    )
+
+
+def _error_warning(exc: Exception, selected_model: str) -> str:
+    if isinstance(exc, QueueTimeoutError):
+        return f"ollama-queue-timeout: model={selected_model} {exc}"
+    if isinstance(exc, (FuturesTimeoutError, asyncio.TimeoutError, httpx.TimeoutException)):
+        get_health(OLLAMA_HOST).record_failure("chat-timeout")
+        return f"ollama-timeout: model={selected_model} chat>{OLLAMA_CHAT_TIMEOUT_SECONDS}s"
+    # An error response (e.g. unknown model) still proves the server is up.
+    if not isinstance(exc, ollama.ResponseError):
+        get_health(OLLAMA_HOST).record_failure(type(exc).__name__)
+    return f"ollama-call-failed: {type(exc).__name__}: {exc}"
+
+
+def _shared_result(result: LLMResult, fallback: str) -> LLMResult:
+    # Callers fill in .data, so everyone sharing one in-flight answer gets a copy; a shared
+    # fallback carries the caller's own fallback text.
+    if result.fell_back:
+        return replace(result, content=fallback, data=dict(result.data))
+    return replace(result, data=dict(result.data))
+
+
+def _chat_result(selected_model: str, messages, options, cache_key: str, fallback: str, started: float) -> LLMResult:
+    warning = _availability_warning(timeout=1.2)
+    if warning:
+        return _fallback_result(fallback, selected_model, warning, started)
+
+    try:
         def _chat():
-            client = _get_ollama_client()
-            if client is not None:
-                return client.chat(
-                    model=selected_model,
-                    messages=messages,
-                    options={"temperature": temperature},
-                )
-            # Backward-compatible fallback for environments where Client() is unavailable.
-            return ollama.chat(
+            return _get_ollama_client().chat(
                 model=selected_model,
                 messages=messages,
-                options={"temperature": temperature},
+                options=options,
+                keep_alive=_keep_alive(),
             )
 
-        executor = ThreadPoolExecutor(max_workers=1)
-        future = executor.submit(_chat)
+        response = get_dispatcher().call(_chat, timeout=OLLAMA_CHAT_TIMEOUT_SECONDS)
+        return _response_result(response, cache_key, selected_model, started)
+    except Exception as exc:
+        return _fallback_result(fallback, selected_model, _error_warning(exc, selected_model), started)
+
+
+def call_llm_result(
+    prompt: str,
+    system_prompt: str = "",
+    temperature: float = 0.1,
+    fallback: str = "",
+    model_name: str | None = None,
+) -> LLMResult:
+    started = time.perf_counter()
+    selected_model, messages, options, cache_key = _prepare_call(prompt, system_prompt, temperature, model_name)
+
+    cached = _cached_result(cache_key, selected_model, started)
+    if cached is not None:
+        return cached
+    return _shared_result(
+        _LLM_FLIGHT.do(cache_key, lambda: _chat_result(selected_model, messages, options, cache_key, fallback, started)),
+        fallback,
+    )
+
+
+async def _chat_result_async(
+    selected_model: str, messages, options, cache_key: str, fallback: str, started: float
+) -> LLMResult:
+    # A stale health entry means a blocking probe; keep it off the event loop.
+    warning = await asyncio.to_thread(_availability_warning, 1.2)
+    if warning:
+        return _fallback_result(fallback, selected_model, warning, started)
+
+    slots = _async_slots()
+    queue_timeout = float(os.getenv("OLLAMA_QUEUE_TIMEOUT_SECONDS", str(OLLAMA_QUEUE_TIMEOUT_SECONDS)))
+    try:
         try:
-            response = future.result(timeout=OLLAMA_CHAT_TIMEOUT_SECONDS)
+            await asyncio.wait_for(slots.acquire(), timeout=queue_timeout)
+        except asyncio.TimeoutError:
+            raise QueueTimeoutError(f"queued>{queue_timeout}s") from None
+        try:
+            # Cancelling the chat coroutine on timeout closes its HTTP request.
+            response = await asyncio.wait_for(
+                _get_async_ollama_client().chat(
+                    model=selected_model, messages=messages, options=options, keep_alive=_keep_alive()
+                ),
+                timeout=OLLAMA_CHAT_TIMEOUT_SECONDS,
+            )
         finally:
-            # Do not wait for the worker when timed out; return control immediately.
-            future.cancel()
-            executor.shutdown(wait=False, cancel_futures=True)
-        return response["message"]["content"]
-    except FuturesTimeoutError:
-        _set_warning(f"ollama-timeout: model={selected_model} chat>{OLLAMA_CHAT_TIMEOUT_SECONDS}s")
-        return fallback
+            slots.release()
+        return _response_result(response, cache_key, selected_model, started)
+    except Exception as exc:
+        return _fallback_result(fallback, selected_model, _error_warning(exc, selected_model), started)
+
+
+async def call_llm_result_async(
+    prompt: str,
+    system_prompt: str = "",
+    temperature: float = 0.1,
+    fallback: str = "",
+    model_name: str | None = None,
+) -> LLMResult:
+    started = time.perf_counter()
+    selected_model, messages, options, cache_key = _prepare_call(prompt, system_prompt, temperature, model_name)
+
+    cached = _cached_result(cache_key, selected_model, started)
+    if cached is not None:
+        return cached
+    result = await _LLM_FLIGHT.do_async(
+        cache_key, lambda: _chat_result_async(selected_model, messages, options, cache_key, fallback, started)
+    )
+    return _shared_result(result, fallback)
+
+
+def embed_texts(texts: Sequence[str], model_name: str) -> tuple[List[List[float]] | None, str]:
+    warning = _availability_warning(timeout=1.2)
+    if warning:
+        return None, warning
+
+    def _embed():
+        return _get_ollama_client().embed(model=model_name, input=list(texts))
+
+    started = time.perf_counter()
+    try:
+        response = get_dispatcher().call(_embed, timeout=OLLAMA_CHAT_TIMEOUT_SECONDS)
     except Exception as exc:
-        _set_warning(f"ollama-call-failed: {type(exc).__name__}: {exc}")
-        return fallback
+        record_io("ollama_embed", time.perf_counter() - started, error=True)
+        return None, _error_warning(exc, model_name)
+    record_io("ollama_embed", time.perf_counter() - started, bytes_out=sum(len(text.encode("utf-8")) for text in texts))
+    get_health(OLLAMA_HOST).record_success()
+    return [list(vector) for vector in response["embeddings"]], ""
+
+
+def preload_models(model_names: Sequence[str], embed_model_names: Sequence[str] = ()) -> Dict[str, str]:
+    # An empty generate request makes Ollama load the model (and hold it for keep_alive) without
+    # producing tokens, so the first real request does not pay the load time. Embedding models
+    # cannot generate; they are loaded with an empty embed request instead.
+    status: Dict[str, str] = {}
+    embed_models = set(embed_model_names)
+    for model_name in dict.fromkeys(name for name in [*model_names, *embed_model_names] if name):
+        warning = _availability_warning(timeout=1.2)
+        if warning:
+            status[model_name] = warning
+            continue
+        try:
+            client = _get_ollama_client()
+            if model_name in embed_models:
+                client.embed(model=model_name, input="", keep_alive=_keep_alive())
+            else:
+                client.generate(model=model_name, prompt="", keep_alive=_keep_alive())
+            status[model_name] = "loaded"
+        except Exception as exc:
+            status[model_name] = _error_warning(exc, model_name)
+    return status
+
+
+def call_llm(
+    prompt: str,
+    system_prompt: str = "",
+    temperature: float = 0.1,
+    fallback: str = "",
+    model_name: str | None = None,
+) -> str:
+    result = call_llm_result(
+        prompt=prompt,
+        system_prompt=system_prompt,
+        temperature=temperature,
+        fallback=fallback,
+        model_name=model_name,
+    )
+    if result.warning:
+        _set_warning(result.warning)
+    return result.content
 
 
 def extract_json(text: str) -> Dict[str, Any]:
@@ -133,25 +394,75 @@ def extract_json(text: str) -> Dict[str, Any]:
         return {}
 
 
-def call_llm_json(
+def _json_system_prompt(schema_hint: str) -> str:
+    return (
+        "Return only valid JSON. Do not wrap in markdown. "
+        f"Schema hint: {schema_hint}"
+    )
+
+
+def _merge_json_result(result: LLMResult, fallback: Dict[str, Any]) -> LLMResult:
+    parsed = extract_json(result.content)
+    if not parsed:
+        result.data = dict(fallback)
+        result.fell_back = True
+        return result
+    merged = dict(fallback)
+    merged.update(parsed)
+    result.data = merged
+    return result
+
+
+def call_llm_json_result(
     prompt: str,
     schema_hint: str,
     fallback: Dict[str, Any],
     model_name: str | None = None,
-) -> Dict[str, Any]:
-    system_prompt = (
-        "Return only valid JSON. Do not wrap in markdown. "
-        f"Schema hint: {schema_hint}"
+) -> LLMResult:
+    result = call_llm_result(
+        prompt=prompt,
+        system_prompt=_json_system_prompt(schema_hint),
+        temperature=0.0,
+        model_name=model_name,
     )
-    text = call_llm(
+    return _merge_json_result(result, fallback)
+
+
+async def call_llm_json_result_async(
+    prompt: str,
+    schema_hint: str,
+    fallback: Dict[str, Any],
+    model_name: str | None = None,
+) -> LLMResult:
+    result = await call_llm_result_async(
         prompt=prompt,
-        system_prompt=system_prompt,
+        system_prompt=_json_system_prompt(schema_hint),
         temperature=0.0,
         model_name=model_name,
     )
-    parsed = extract_json(text)
-    if not parsed:
-        return fallback
-    merged = dict(fallback)
-    merged.update(parsed)
-    return merged
+    return _merge_json_result(result, fallback)
+
+
+def call_llm_json(
+    prompt: str,
+    schema_hint: str,
+    fallback: Dict[str, Any],
+    model_name: str | None = None,
+) -> Dict[str, Any]:
+    result = call_llm_json_result(
+        prompt=prompt,
+        schema_hint=schema_hint,
+        fallback=fallback,
+        model_name=model_name,
+    )
+    if result.warning:
+        _set_warning(result.warning)
+    return result.data
+
+
+async def close_async_llm_client() -> None:
+    loop = asyncio.get_running_loop()
+    _ASYNC_SLOTS.pop(loop, None)
+    client = _ASYNC_CLIENTS.pop(loop, None)
+    if client is not None:
+        await client.close()
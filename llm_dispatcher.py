@@ -0,0 +1,109 @@
+from __future__ import annotations
+
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FuturesTimeoutError
+from typing import Any, Callable, Dict
+
+
+OLLAMA_MAX_IN_FLIGHT = max(1, int(os.getenv("OLLAMA_MAX_IN_FLIGHT", "2")))
+OLLAMA_QUEUE_TIMEOUT_SECONDS = float(os.getenv("OLLAMA_QUEUE_TIMEOUT_SECONDS", "30"))
+
+
+class QueueTimeoutError(Exception):
+    pass
+
+
+# Process-wide gate in front of Ollama: a fixed pool of worker threads caps the number of
+# requests in flight, and jobs that waited in the queue past their deadline are dropped
+# before they are ever sent. Running requests are bounded by the HTTP client's own timeout,
+# so a caller that gives up does not leave an orphaned generation behind.
+class LLMDispatcher:
+    def __init__(self, max_in_flight: int = OLLAMA_MAX_IN_FLIGHT, queue_timeout: float = OLLAMA_QUEUE_TIMEOUT_SECONDS):
+        self.max_in_flight = max(1, max_in_flight)
+        self.queue_timeout = queue_timeout
+        self._executor = ThreadPoolExecutor(max_workers=self.max_in_flight, thread_name_prefix="llm")
+        self._lock = threading.Lock()
+        self._queued = 0
+        self._in_flight = 0
+        self._counters = {
+            "submitted": 0,
+            "completed": 0,
+            "failed": 0,
+            "timed_out": 0,
+            "expired_in_queue": 0,
+            "peak_queue_depth": 0,
+            "peak_in_flight": 0,
+        }
+
+    def _run(self, fn: Callable[[], Any], enqueued_at: float) -> Any:
+        with self._lock:
+            self._queued -= 1
+            if time.monotonic() - enqueued_at > self.queue_timeout:
+                self._counters["expired_in_queue"] += 1
+                raise QueueTimeoutError(f"queued>{self.queue_timeout}s")
+            self._in_flight += 1
+            self._counters["peak_in_flight"] = max(self._counters["peak_in_flight"], self._in_flight)
+        try:
+            result = fn()
+        except BaseException:
+            with self._lock:
+                self._counters["failed"] += 1
+            raise
+        else:
+            with self._lock:
+                self._counters["completed"] += 1
+            return result
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+
+    def submit(self, fn: Callable[[], Any]) -> Future:
+        with self._lock:
+            self._queued += 1
+            self._counters["submitted"] += 1
+            self._counters["peak_queue_depth"] = max(self._counters["peak_queue_depth"], self._queued)
+        return self._executor.submit(self._run, fn, time.monotonic())
+
+    def call(self, fn: Callable[[], Any], timeout: float) -> Any:
+        future = self.submit(fn)
+        try:
+            return future.result(timeout=self.queue_timeout + timeout)
+        except FuturesTimeoutError:
+            with self._lock:
+                self._counters["timed_out"] += 1
+            if future.cancel():
+                with self._lock:
+                    self._queued -= 1
+            raise
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            stats = dict(self._counters)
+            stats["queue_depth"] = self._queued
+            stats["in_flight"] = self._in_flight
+            stats["max_in_flight"] = self.max_in_flight
+        return stats
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+_DISPATCHER = None
+_DISPATCHER_LOCK = threading.Lock()
+
+
+def get_dispatcher() -> LLMDispatcher:
+    global _DISPATCHER
+    with _DISPATCHER_LOCK:
+        if _DISPATCHER is None:
+            _DISPATCHER = LLMDispatcher(
+                max_in_flight=max(1, int(os.getenv("OLLAMA_MAX_IN_FLIGHT", str(OLLAMA_MAX_IN_FLIGHT)))),
+                queue_timeout=float(os.getenv("OLLAMA_QUEUE_TIMEOUT_SECONDS", str(OLLAMA_QUEUE_TIMEOUT_SECONDS))),
+            )
+        return _DISPATCHER
+
+
+def dispatcher_stats() -> Dict[str, int]:
+    return get_dispatcher().stats()
@@ -0,0 +1,398 @@
+from __future__ import annotations
+
+import asyncio
+import contextvars
+import functools
+import itertools
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, List
+
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1") == "1"
+# Serve the Prometheus text format on this port (0 = off), for long-running workers.
+METRICS_PORT = max(0, int(os.getenv("METRICS_PORT", "0")))
+# Loopback by default: the endpoint has no auth. Set 0.0.0.0 for a scraper on another host.
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+# Latency bucket upper bounds in seconds, as Prometheus histograms use them.
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+_LOCK = threading.Lock()
+_NODES: Dict[str, Dict[str, Any]] = {}
+_IO: Dict[str, Dict[str, Any]] = {}
+_LLM: Dict[str, Dict[str, Any]] = {}
+# Called as listener(node_name, "start" | "end", run) around every instrumented node, even with
+# metrics disabled; the profiler uses this to attribute samples to nodes. `run` is the node run's
+# record: a unique "id", and "overlapped", set once another node ran at the same time.
+_NODE_LISTENERS: List[Callable[[str, str, Dict[str, Any]], None]] = []
+_SERVER = None
+# The node run the current code belongs to. record_io and record_llm charge their counts to it,
+# so goals running side by side in a batch or the service each get their own per-node I/O.
+_CURRENT_RUN: contextvars.ContextVar[Dict[str, Any] | None] = contextvars.ContextVar("node_run", default=None)
+_ACTIVE_RUNS: Dict[int, Dict[str, Any]] = {}
+_RUN_IDS = itertools.count(1)
+
+
+def is_enabled() -> bool:
+    return os.getenv("METRICS_ENABLED", "1" if METRICS_ENABLED else "0") == "1"
+
+
+def _histogram() -> Dict[str, Any]:
+    return {"buckets": [0] * (len(LATENCY_BUCKETS) + 1), "sum": 0.0, "count": 0, "max": 0.0}
+
+
+def _observe(histogram: Dict[str, Any], seconds: float) -> None:
+    for idx, bound in enumerate(LATENCY_BUCKETS):
+        if seconds <= bound:
+            break
+    else:
+        idx = len(LATENCY_BUCKETS)
+    histogram["buckets"][idx] += 1
+    histogram["sum"] += seconds
+    histogram["count"] += 1
+    histogram["max"] = max(histogram["max"], seconds)
+
+
+def _charge(**counts: int) -> None:
+    # Caller holds _LOCK.
+    run = _CURRENT_RUN.get()
+    if run is None:
+        return
+    for key, value in counts.items():
+        run["io"][key] = run["io"].get(key, 0) + value
+
+
+def carry_context(fn: Callable) -> Callable:
+    # ThreadPoolExecutor workers start with an empty context (asyncio.to_thread copies it), so
+    # callables handed to submit()/map() are wrapped to keep counting against the calling node.
+    context = contextvars.copy_context()
+
+    @functools.wraps(fn)
+    def _run(*args, **kwargs):
+        # One copy per call: a Context cannot be entered by two threads at once.
+        return context.copy().run(fn, *args, **kwargs)
+
+    return _run
+
+
+def record_io(kind: str, seconds: float, bytes_in: int = 0, bytes_out: int = 0, error: bool = False) -> None:
+    if not is_enabled():
+        return
+    with _LOCK:
+        entry = _IO.setdefault(kind, {"calls": 0, "errors": 0, "bytes_in": 0, "bytes_out": 0, "latency": _histogram()})
+        entry["calls"] += 1
+        entry["errors"] += int(error)
+        entry["bytes_in"] += bytes_in
+        entry["bytes_out"] += bytes_out
+        _observe(entry["latency"], seconds)
+        _charge(calls=1, bytes_in=bytes_in, bytes_out=bytes_out)
+
+
+def record_llm(
+    model: str,
+    seconds: float,
+    prompt_tokens: int = 0,
+    completion_tokens: int = 0,
+    cached: bool = False,
+    fell_back: bool = False,
+) -> None:
+    if not is_enabled():
+        return
+    with _LOCK:
+        entry = _LLM.setdefault(
+            model,
+            {
+                "calls": 0,
+                "cached": 0,
+                "fallbacks": 0,
+                "prompt_tokens": 0,
+                "completion_tokens": 0,
+                "latency": _histogram(),
+            },
+        )
+        entry["calls"] += 1
+        entry["cached"] += int(cached)
+        entry["fallbacks"] += int(fell_back)
+        entry["prompt_tokens"] += prompt_tokens
+        entry["completion_tokens"] += completion_tokens
+        # Cache hits and fallbacks would drag the histogram towards zero; only model calls count.
+        if not cached and not fell_back:
+            _observe(entry["latency"], seconds)
+        _charge(llm_calls=1, prompt_tokens=prompt_tokens, completion_tokens=completion_tokens)
+
+
+def _begin_run(name: str) -> Dict[str, Any]:
+    run = {
+        "id": next(_RUN_IDS),
+        "name": name,
+        "io": {},
+        "overlapped": False,
+        "started": time.perf_counter(),
+        "cpu": time.process_time(),
+    }
+    with _LOCK:
+        if _ACTIVE_RUNS:
+            run["overlapped"] = True
+            for other in _ACTIVE_RUNS.values():
+                other["overlapped"] = True
+        _ACTIVE_RUNS[run["id"]] = run
+    return run
+
+
+def _end_run(run: Dict[str, Any], error: bool) -> None:
+    wall = time.perf_counter() - run["started"]
+    cpu = time.process_time() - run["cpu"]
+    with _LOCK:
+        _ACTIVE_RUNS.pop(run["id"], None)
+        if not is_enabled():
+            return
+        entry = _NODES.setdefault(
+            run["name"],
+            {
+                "calls": 0,
+                "errors": 0,
+                "wall_seconds": 0.0,
+                "cpu_seconds": 0.0,
+                "solo_calls": 0,
+                "latency": _histogram(),
+                "io": {},
+            },
+        )
+        entry["calls"] += 1
+        entry["errors"] += int(error)
+        entry["wall_seconds"] += wall
+        _observe(entry["latency"], wall)
+        # CPU is process time, so it is only this node's when no other node ran meanwhile.
+        if not run["overlapped"]:
+            entry["solo_calls"] += 1
+            entry["cpu_seconds"] += cpu
+        for key, value in run["io"].items():
+            entry["io"][key] = entry["io"].get(key, 0) + value
+
+
+def add_node_listener(listener: Callable[[str, str, Dict[str, Any]], None]) -> None:
+    with _LOCK:
+        if listener not in _NODE_LISTENERS:
+            _NODE_LISTENERS.append(listener)
+
+
+def remove_node_listener(listener: Callable[[str, str, Dict[str, Any]], None]) -> None:
+    with _LOCK:
+        if listener in _NODE_LISTENERS:
+            _NODE_LISTENERS.remove(listener)
+
+
+def _notify(name: str, phase: str, run: Dict[str, Any]) -> None:
+    for listener in list(_NODE_LISTENERS):
+        listener(name, phase, run)
+
+
+def instrument_node(name: str, node: Callable) -> Callable:
+    # Each run is a context in its own right: I/O is charged to it through _CURRENT_RUN, so the
+    # counts hold with several goals in flight. CPU is process time, so it includes the node's
+    # worker threads but not the parse pool's processes, and is only kept for solo runs.
+    if asyncio.iscoroutinefunction(node):
+
+        @functools.wraps(node)
+        async def _async_node(state):
+            run = _begin_run(name)
+            token = _CURRENT_RUN.set(run)
+            _notify(name, "start", run)
+            error = True
+            try:
+                result = await node(state)
+                error = False
+                return result
+            finally:
+                _CURRENT_RUN.reset(token)
+                _end_run(run, error)
+                _notify(name, "end", run)
+
+        return _async_node
+
+    @functools.wraps(node)
+    def _node(state):
+        run = _begin_run(name)
+        token = _CURRENT_RUN.set(run)
+        _notify(name, "start", run)
+        error = True
+        try:
+            result = node(state)
+            error = False
+            return result
+        finally:
+            _CURRENT_RUN.reset(token)
+            _end_run(run, error)
+            _notify(name, "end", run)
+
+    return _node
+
+
+def _summarise(histogram: Dict[str, Any]) -> Dict[str, Any]:
+    # Percentiles are read off the buckets: each is the upper bound of the bucket it falls in,
+    # or the largest observation past the last bound.
+    def _percentile(pct: float) -> float | None:
+        if not histogram["count"]:
+            return None
+        rank = pct * histogram["count"]
+        seen = 0
+        for idx, count in enumerate(histogram["buckets"][:-1]):
+            seen += count
+            if seen >= rank:
+                return LATENCY_BUCKETS[idx]
+        return round(histogram["max"], 4)
+
+    mean = histogram["sum"] / histogram["count"] if histogram["count"] else 0.0
+    return {
+        "count": histogram["count"],
+        "mean_seconds": round(mean, 4),
+        "max_seconds": round(histogram["max"], 4),
+        "p50_le_seconds": _percentile(0.5),
+        "p95_le_seconds": _percentile(0.95),
+        "buckets": {str(bound): n for bound, n in zip(LATENCY_BUCKETS + ("+Inf",), histogram["buckets"])},
+    }
+
+
+def metrics_snapshot() -> Dict[str, Any]:
+    with _LOCK:
+        nodes = {
+            name: {
+                "calls": entry["calls"],
+                "errors": entry["errors"],
+                "wall_seconds": round(entry["wall_seconds"], 4),
+                "cpu_seconds": round(entry["cpu_seconds"], 4),
+                "solo_calls": entry["solo_calls"],
+                "io": {key: round(value, 4) for key, value in entry["io"].items()},
+                "latency": _summarise(entry["latency"]),
+            }
+            for name, entry in _NODES.items()
+        }
+        io = {
+            kind: {
+                "calls": entry["calls"],
+                "errors": entry["errors"],
+                "bytes_in": entry["bytes_in"],
+                "bytes_out": entry["bytes_out"],
+                "latency": _summarise(entry["latency"]),
+            }
+            for kind, entry in _IO.items()
+        }
+        llm = {
+            model: {
+                "calls": entry["calls"],
+                "cached": entry["cached"],
+                "fallbacks": entry["fallbacks"],
+                "prompt_tokens": entry["prompt_tokens"],
+                "completion_tokens": entry["completion_tokens"],
+                "latency": _summarise(entry["latency"]),
+            }
+            for model, entry in _LLM.items()
+        }
+    return {"nodes": nodes, "io": io, "llm": llm}
+
+
+def reset_metrics() -> None:
+    with _LOCK:
+        _NODES.clear()
+        _IO.clear()
+        _LLM.clear()
+
+
+def _label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _prom_histogram(lines: List[str], name: str, labels: str, histogram: Dict[str, Any]) -> None:
+    cumulative = 0
+    for bound, count in zip(LATENCY_BUCKETS + ("+Inf",), histogram["buckets"]):
+        cumulative += count
+        lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+    lines.append(f"{name}_sum{{{labels}}} {histogram['sum']:.6f}")
+    lines.append(f"{name}_count{{{labels}}} {histogram['count']}")
+
+
+def render_prometheus() -> str:
+    lines: List[str] = []
+    with _LOCK:
+        lines += [
+            "# HELP scraper_node_seconds Wall time per graph node run.",
+            "# TYPE scraper_node_seconds histogram",
+        ]
+        for name, entry in _NODES.items():
+            _prom_histogram(lines, "scraper_node_seconds", f'node="{_label(name)}"', entry["latency"])
+        for metric, key, help_text in (
+            ("scraper_node_cpu_seconds_total", "cpu_seconds", "CPU time of node runs with no other node running."),
+            ("scraper_node_solo_runs_total", "solo_calls", "Node runs with no other node running."),
+            ("scraper_node_errors_total", "errors", "Graph node runs that raised."),
+        ):
+            lines += [f"# HELP {metric} {help_text}", f"# TYPE {metric} counter"]
+            lines += [f'{metric}{{node="{_label(n)}"}} {e[key]}' for n, e in _NODES.items()]
+
+        lines += ["# HELP scraper_io_seconds Latency of HTTP and embedding calls.", "# TYPE scraper_io_seconds histogram"]
+        for kind, entry in _IO.items():
+            _prom_histogram(lines, "scraper_io_seconds", f'kind="{_label(kind)}"', entry["latency"])
+        for metric, key, help_text in (
+            ("scraper_io_errors_total", "errors", "I/O calls that raised."),
+            ("scraper_io_bytes_in_total", "bytes_in", "Response bytes received."),
+            ("scraper_io_bytes_out_total", "bytes_out", "Request bytes sent."),
+        ):
+            lines += [f"# HELP {metric} {help_text}", f"# TYPE {metric} counter"]
+            lines += [f'{metric}{{kind="{_label(k)}"}} {e[key]}' for k, e in _IO.items()]
+
+        lines += ["# HELP scraper_llm_seconds Latency of Ollama chat calls.", "# TYPE scraper_llm_seconds histogram"]
+        for model, entry in _LLM.items():
+            _prom_histogram(lines, "scraper_llm_seconds", f'model="{_label(model)}"', entry["latency"])
+        for metric, key, help_text in (
+            ("scraper_llm_calls_total", "calls", "LLM calls, including cache hits and fallbacks."),
+            ("scraper_llm_cached_total", "cached", "LLM calls answered from the cache."),
+            ("scraper_llm_fallbacks_total", "fallbacks", "LLM calls that fell back."),
+            ("scraper_llm_prompt_tokens_total", "prompt_tokens", "Prompt tokens evaluated."),
+            ("scraper_llm_completion_tokens_total", "completion_tokens", "Completion tokens generated."),
+        ):
+            lines += [f"# HELP {metric} {help_text}", f"# TYPE {metric} counter"]
+            lines += [f'{metric}{{model="{_label(m)}"}} {e[key]}' for m, e in _LLM.items()]
+    return "\n".join(lines) + "\n"
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        if self.path.split("?", 1)[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = render_prometheus().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def start_metrics_server(port: int | None = None, host: str | None = None) -> int:
+    # Idempotent; returns the bound port (0 when disabled).
+    global _SERVER
+    port = max(0, int(os.getenv("METRICS_PORT", str(METRICS_PORT)))) if port is None else port
+    host = os.getenv("METRICS_HOST", METRICS_HOST) if host is None else host
+    with _LOCK:
+        if _SERVER is not None:
+            return _SERVER.server_address[1]
+        if not port:
+            return 0
+        _SERVER = ThreadingHTTPServer((host, port), _MetricsHandler)
+        _SERVER.daemon_threads = True
+        server = _SERVER
+    threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+    return server.server_address[1]
+
+
+def stop_metrics_server() -> None:
+    global _SERVER
+    with _LOCK:
+        server, _SERVER = _SERVER, None
+    if server is not None:
+        server.shutdown()
+        server.server_close()
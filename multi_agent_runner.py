@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+import asyncio
 import json
 import os
 import sys
@@ -7,47 +8,70 @@ import sys
 from langgraph.graph import END, StateGraph
 
 try:
+    from async_http import close_async_client
+    from browser_pool import shutdown_browser_pool
     from evaluator_agent import evaluate_node
-    from extraction_agent import extraction_node
-    from filter_agent import filter_node
+    from extraction_agent import extraction_node, extraction_node_async
+    from filter_agent import filter_node, filter_node_async
+    from llm_client import close_async_llm_client
+    from metrics import instrument_node, start_metrics_server
     from orchestrator_agent import orchestrator_node, orchestrator_router
-    from planner_agent import planner_node
-    from retrieval_agent import retrieval_node
-    from scrape_agent import scrape_node
-    from search_agent import search_node
+    from parse_pool import warm_parse_pool
+    from planner_agent import planner_node, planner_node_async
+    from retrieval_agent import retrieval_node, retrieval_node_async
+    from scrape_agent import scrape_node, scrape_node_async
+    from search_agent import search_node, search_node_async
+    from stream_agent import scrape_retrieval_node
     from state import AgentState, make_initial_state
 except ImportError:
+    from .async_http import close_async_client
+    from .browser_pool import shutdown_browser_pool
     from .evaluator_agent import evaluate_node
-    from .extraction_agent import extraction_node
-    from .filter_agent import filter_node
+    from .extraction_agent import extraction_node, extraction_node_async
+    from .filter_agent import filter_node, filter_node_async
+    from .llm_client import close_async_llm_client
+    from .metrics import instrument_node, start_metrics_server
     from .orchestrator_agent import orchestrator_node, orchestrator_router
-    from .planner_agent import planner_node
-    from .retrieval_agent import retrieval_node
-    from .scrape_agent import scrape_node
-    from .search_agent import search_node
+    from .parse_pool import warm_parse_pool
+    from .planner_agent import planner_node, planner_node_async
+    from .retrieval_agent import retrieval_node, retrieval_node_async
+    from .scrape_agent import scrape_node, scrape_node_async
+    from .search_agent import search_node, search_node_async
+    from .stream_agent import scrape_retrieval_node
     from .state import AgentState, make_initial_state
 
 
 
-def build_app():
+def build_app(async_mode: bool = False, streaming: bool = False):
     workflow = StateGraph(AgentState)
 
-    workflow.add_node("planner", planner_node)
-    workflow.add_node("search", search_node)
-    workflow.add_node("filter", filter_node)
-    workflow.add_node("scrape", scrape_node)
-    workflow.add_node("retrieval", retrieval_node)
-    workflow.add_node("extraction", extraction_node)
-    workflow.add_node("evaluate", evaluate_node)
-    workflow.add_node("orchestrator", orchestrator_node)
+    def _add(name: str, node) -> None:
+        workflow.add_node(name, instrument_node(name, node))
+
+    # Async nodes only run under ainvoke/astream; evaluate and orchestrator do no I/O.
+    _add("planner", planner_node_async if async_mode else planner_node)
+    _add("search", search_node_async if async_mode else search_node)
+    _add("filter", filter_node_async if async_mode else filter_node)
+    if streaming:
+        _add("scrape_retrieval", scrape_retrieval_node)
+    else:
+        _add("scrape", scrape_node_async if async_mode else scrape_node)
+        _add("retrieval", retrieval_node_async if async_mode else retrieval_node)
+    _add("extraction", extraction_node_async if async_mode else extraction_node)
+    _add("evaluate", evaluate_node)
+    _add("orchestrator", orchestrator_node)
 
     workflow.set_entry_point("planner")
 
     workflow.add_edge("planner", "search")
     workflow.add_edge("search", "filter")
-    workflow.add_edge("filter", "scrape")
-    workflow.add_edge("scrape", "retrieval")
-    workflow.add_edge("retrieval", "extraction")
+    if streaming:
+        workflow.add_edge("filter", "scrape_retrieval")
+        workflow.add_edge("scrape_retrieval", "extraction")
+    else:
+        workflow.add_edge("filter", "scrape")
+        workflow.add_edge("scrape", "retrieval")
+        workflow.add_edge("retrieval", "extraction")
     workflow.add_edge("extraction", "evaluate")
     workflow.add_edge("evaluate", "orchestrator")
 
@@ -63,8 +87,18 @@ def build_app():
     return workflow.compile()
 
 
-def run_pipeline(goal: str, max_iterations: int = 2, verbose: bool = False):
-    app = build_app()
+def run_pipeline(goal: str, max_iterations: int = 2, verbose: bool = False, streaming: bool = False):
+    try:
+        return _run_graph(goal, max_iterations=max_iterations, verbose=verbose, streaming=streaming)
+    finally:
+        shutdown_browser_pool()
+
+
+def _run_graph(goal: str, max_iterations: int, verbose: bool, streaming: bool):
+    # Parse workers start in the background while planner and search run.
+    warm_parse_pool()
+    start_metrics_server()
+    app = build_app(streaming=streaming)
     state = make_initial_state(goal=goal, max_iterations=max_iterations)
     if not verbose:
         return app.invoke(state)
@@ -82,6 +116,39 @@ def run_pipeline(goal: str, max_iterations: int = 2, verbose: bool = False):
     return final_state
 
 
+async def run_pipeline_async(
+    goal: str,
+    max_iterations: int = 2,
+    verbose: bool = False,
+    app=None,
+    streaming: bool = False,
+):
+    warm_parse_pool()
+    start_metrics_server()
+    app = app or build_app(async_mode=True, streaming=streaming)
+    state = make_initial_state(goal=goal, max_iterations=max_iterations)
+    if not verbose:
+        return await app.ainvoke(state)
+
+    final_state = state
+    async for event in app.astream(state):
+        if not isinstance(event, dict):
+            continue
+        for node_name, node_state in event.items():
+            if node_name == "__end__":
+                continue
+            print(f"[NODE] {node_name} completed", flush=True)
+            if isinstance(node_state, dict):
+                final_state = node_state
+    return final_state
+
+
+async def close_async_resources() -> None:
+    await close_async_client()
+    await close_async_llm_client()
+    await asyncio.to_thread(shutdown_browser_pool)
+
+
 if __name__ == "__main__":
     user_goal = "Extract PROTACs and linkers from 2025 in table format"
     if len(sys.argv) > 1:
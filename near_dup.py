@@ -0,0 +1,176 @@
+from __future__ import annotations
+
+import hashlib
+import os
+import random
+import re
+import threading
+from collections import Counter
+from typing import Dict, List, Optional
+from urllib.parse import parse_qsl, unquote_plus, urldefrag, urlencode, urlparse, urlunparse
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+NEAR_DUP_ENABLED = os.getenv("NEAR_DUP_ENABLED", "1") == "1"
+# Documents whose 64-bit SimHashes differ in at most this many bits are treated as copies.
+SIMHASH_MAX_DISTANCE = max(0, min(int(os.getenv("SIMHASH_MAX_DISTANCE", "3")), 15))
+# Chunks whose estimated Jaccard similarity over word shingles reaches this are dropped.
+MINHASH_THRESHOLD = float(os.getenv("MINHASH_THRESHOLD", "0.8"))
+MINHASH_PERMUTATIONS = 64
+MINHASH_BANDS = 16
+SHINGLE_WORDS = 3
+# Click and campaign identifiers only; short names such as "ref" or "src" select content on some sites.
+TRACKING_PARAMS = {"fbclid", "gclid", "dclid", "msclkid", "mc_cid", "mc_eid", "ref_src", "sessionid"}
+_WORD = re.compile(r"[a-z0-9]+")
+_MASK64 = (1 << 64) - 1
+
+_rng = random.Random(0x5EED)
+_MINHASH_MASKS = [_rng.getrandbits(64) for _ in range(MINHASH_PERMUTATIONS)]
+_NP_MASKS = np.array(_MINHASH_MASKS, dtype=np.uint64) if np is not None else None
+
+_STATS_LOCK = threading.Lock()
+_STATS = {"urls_dropped": 0, "docs_dropped": 0, "chunks_dropped": 0}
+
+
+def is_enabled() -> bool:
+    return os.getenv("NEAR_DUP_ENABLED", "1" if NEAR_DUP_ENABLED else "0") == "1"
+
+
+def record(key: str, count: int = 1) -> None:
+    if count:
+        with _STATS_LOCK:
+            _STATS[key] += count
+
+
+def near_dup_stats() -> Dict[str, int]:
+    with _STATS_LOCK:
+        return dict(_STATS)
+
+
+def reset_stats() -> None:
+    with _STATS_LOCK:
+        for key in _STATS:
+            _STATS[key] = 0
+
+
+def _is_tracking(name: str) -> bool:
+    name = name.lower()
+    return name.startswith("utm_") or name in TRACKING_PARAMS
+
+
+def strip_tracking(url: str) -> str:
+    # Still a fetchable URL: only the fragment and click-tracking parameters are removed. The
+    # other parameters keep their original spelling and order; with none removed the query is
+    # left as it was, since re-encoding can change what some servers return.
+    url = urldefrag(url.strip())[0]
+    parsed = urlparse(url)
+    pairs = [pair for pair in parsed.query.split("&") if pair]
+    kept = [pair for pair in pairs if not _is_tracking(unquote_plus(pair.split("=", 1)[0]))]
+    if len(kept) == len(pairs):
+        return url
+    return urlunparse(parsed._replace(query="&".join(kept)))
+
+
+def canonical_url(url: str) -> str:
+    # Dedupe key only: scheme, "www.", default ports, trailing slashes and query order are dropped.
+    parsed = urlparse(strip_tracking(url))
+    host = (parsed.hostname or "").lower()
+    if host.startswith("www."):
+        host = host[4:]
+    if parsed.port and parsed.port not in (80, 443):
+        host = f"{host}:{parsed.port}"
+    path = re.sub(r"/{2,}", "/", parsed.path or "/").rstrip("/") or "/"
+    query = urlencode(sorted(parse_qsl(parsed.query, keep_blank_values=True)))
+    return f"{host}{path}" + (f"?{query}" if query else "")
+
+
+def _hash64(token: str) -> int:
+    return int.from_bytes(hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest(), "big")
+
+
+def _shingles(text: str) -> List[str]:
+    words = _WORD.findall(text.lower())
+    if len(words) <= SHINGLE_WORDS:
+        return [" ".join(words)] if words else []
+    return [" ".join(words[i : i + SHINGLE_WORDS]) for i in range(len(words) - SHINGLE_WORDS + 1)]
+
+
+def simhash(text: str) -> int:
+    weights = [0] * 64
+    for token, count in Counter(_WORD.findall(text.lower())).items():
+        value = _hash64(token)
+        for bit in range(64):
+            weights[bit] += count if value >> bit & 1 else -count
+    return sum(1 << bit for bit, weight in enumerate(weights) if weight > 0)
+
+
+def minhash(text: str) -> tuple:
+    hashes = list({_hash64(shingle) for shingle in _shingles(text)})
+    if not hashes:
+        return tuple([_MASK64] * MINHASH_PERMUTATIONS)
+    if np is not None:
+        values = np.array(hashes, dtype=np.uint64)
+        return tuple(int(v) for v in np.bitwise_xor.outer(_NP_MASKS, values).min(axis=1))
+    # XOR with a fixed random mask acts as one cheap permutation of the 64-bit hash space.
+    return tuple(min(value ^ mask for value in hashes) for mask in _MINHASH_MASKS)
+
+
+# Two hashes within `max_distance` bits must agree exactly on at least one of max_distance+1
+# bit blocks, so a new document is only compared with the entries sharing one of its blocks.
+class SimHashIndex:
+    def __init__(self, max_distance: int = SIMHASH_MAX_DISTANCE):
+        self.max_distance = max_distance
+        self._blocks = max_distance + 1
+        self._width = 64 // self._blocks
+        self._tables: List[Dict[int, List[int]]] = [{} for _ in range(self._blocks)]
+
+    def _keys(self, value: int) -> List[int]:
+        mask = (1 << self._width) - 1
+        return [value >> (i * self._width) & mask for i in range(self._blocks)]
+
+    def add(self, text: str) -> bool:
+        value = simhash(text)
+        keys = self._keys(value)
+        for table, key in zip(self._tables, keys):
+            for other in table.get(key, ()):
+                if bin(value ^ other).count("1") <= self.max_distance:
+                    return True
+        for table, key in zip(self._tables, keys):
+            table.setdefault(key, []).append(value)
+        return False
+
+
+# Banded MinHash: chunks sharing any band are candidates, confirmed by signature agreement.
+class MinHashLSH:
+    def __init__(self, threshold: float = MINHASH_THRESHOLD):
+        self.threshold = threshold
+        self._rows = MINHASH_PERMUTATIONS // MINHASH_BANDS
+        self._buckets: List[Dict[tuple, List[tuple]]] = [{} for _ in range(MINHASH_BANDS)]
+
+    def add(self, text: str) -> bool:
+        signature = minhash(text)
+        bands = [signature[i * self._rows : (i + 1) * self._rows] for i in range(MINHASH_BANDS)]
+        for buckets, band in zip(self._buckets, bands):
+            for other in buckets.get(band, ()):
+                agreement = sum(a == b for a, b in zip(signature, other)) / MINHASH_PERMUTATIONS
+                if agreement >= self.threshold:
+                    return True
+        for buckets, band in zip(self._buckets, bands):
+            buckets.setdefault(band, []).append(signature)
+        return False
+
+
+def new_doc_index() -> Optional[SimHashIndex]:
+    if not is_enabled():
+        return None
+    return SimHashIndex(max(0, min(int(os.getenv("SIMHASH_MAX_DISTANCE", str(SIMHASH_MAX_DISTANCE))), 15)))
+
+
+def new_chunk_index() -> Optional[MinHashLSH]:
+    if not is_enabled():
+        return None
+    return MinHashLSH(float(os.getenv("MINHASH_THRESHOLD", str(MINHASH_THRESHOLD))))
@@ -0,0 +1,147 @@
+from __future__ import annotations
+
+import os
+import threading
+import time
+from typing import Dict
+
+try:
+    from http_client import http_get
+except ImportError:
+    from .http_client import http_get
+
+
+OLLAMA_HEALTH_TTL_SECONDS = float(os.getenv("OLLAMA_HEALTH_TTL_SECONDS", "15"))
+OLLAMA_BREAKER_FAILURES = max(1, int(os.getenv("OLLAMA_BREAKER_FAILURES", "3")))
+OLLAMA_BREAKER_COOLDOWN_SECONDS = float(os.getenv("OLLAMA_BREAKER_COOLDOWN_SECONDS", "10"))
+OLLAMA_PROBE_TIMEOUT_SECONDS = float(os.getenv("OLLAMA_PROBE_TIMEOUT_SECONDS", "1.2"))
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half-open"
+
+
+# Tracks whether an Ollama host is usable. A recent success (probe or chat) is trusted for
+# `ttl` seconds; `failure_threshold` consecutive failures open the circuit so callers get
+# the fallback immediately, and a background probe closes it again once the host answers.
+class OllamaHealth:
+    def __init__(
+        self,
+        host: str,
+        ttl: float = OLLAMA_HEALTH_TTL_SECONDS,
+        failure_threshold: int = OLLAMA_BREAKER_FAILURES,
+        cooldown: float = OLLAMA_BREAKER_COOLDOWN_SECONDS,
+        probe_timeout: float = OLLAMA_PROBE_TIMEOUT_SECONDS,
+    ):
+        self.host = host
+        self.ttl = ttl
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.probe_timeout = probe_timeout
+        self.state = CLOSED
+        self.last_error = ""
+        self._lock = threading.Lock()
+        self._probe_lock = threading.Lock()
+        self._last_ok = 0.0
+        self._opened_at = 0.0
+        self._failures = 0
+        self._counters = {
+            "probes_sent": 0,
+            "probes_saved": 0,
+            "short_circuited": 0,
+            "failures": 0,
+            "circuit_opened": 0,
+            "circuit_closed": 0,
+        }
+
+    def probe(self) -> bool:
+        with self._lock:
+            self._counters["probes_sent"] += 1
+        try:
+            response = http_get(f"{self.host}/api/tags", timeout=self.probe_timeout)
+            ok = response.status_code == 200
+            reason = "" if ok else f"status={response.status_code}"
+        except Exception:
+            ok = False
+            reason = "unreachable"
+        if ok:
+            self.record_success()
+        else:
+            self.record_failure(reason)
+        return ok
+
+    def allow_request(self) -> bool:
+        now = time.monotonic()
+        with self._lock:
+            if self.state != CLOSED:
+                self._counters["short_circuited"] += 1
+                if self.state == OPEN and now - self._opened_at >= self.cooldown:
+                    self.state = HALF_OPEN
+                    threading.Thread(target=self._half_open_probe, name="ollama-health", daemon=True).start()
+                return False
+            if now - self._last_ok < self.ttl:
+                self._counters["probes_saved"] += 1
+                return True
+
+        # Only one caller probes a stale host; the rest reuse its answer.
+        with self._probe_lock:
+            with self._lock:
+                if self.state == CLOSED and time.monotonic() - self._last_ok < self.ttl:
+                    self._counters["probes_saved"] += 1
+                    return True
+                if self.state != CLOSED:
+                    self._counters["short_circuited"] += 1
+                    return False
+            return self.probe()
+
+    def _half_open_probe(self) -> None:
+        if not self.probe():
+            with self._lock:
+                if self.state == HALF_OPEN:
+                    self.state = OPEN
+                    self._opened_at = time.monotonic()
+
+    def record_success(self) -> None:
+        with self._lock:
+            if self.state != CLOSED:
+                self._counters["circuit_closed"] += 1
+            self.state = CLOSED
+            self._failures = 0
+            self._last_ok = time.monotonic()
+            self.last_error = ""
+
+    def record_failure(self, reason: str = "") -> None:
+        with self._lock:
+            self._counters["failures"] += 1
+            self._failures += 1
+            self._last_ok = 0.0
+            self.last_error = reason
+            if self.state == CLOSED and self._failures >= self.failure_threshold:
+                self.state = OPEN
+                self._opened_at = time.monotonic()
+                self._counters["circuit_opened"] += 1
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            stats: Dict[str, object] = dict(self._counters)
+            stats["state"] = self.state
+            stats["consecutive_failures"] = self._failures
+        return stats
+
+
+_HEALTH: Dict[str, OllamaHealth] = {}
+_HEALTH_LOCK = threading.Lock()
+
+
+def get_health(host: str) -> OllamaHealth:
+    with _HEALTH_LOCK:
+        health = _HEALTH.get(host)
+        if health is None:
+            health = OllamaHealth(host)
+            _HEALTH[host] = health
+        return health
+
+
+def health_stats() -> Dict[str, Dict[str, object]]:
+    with _HEALTH_LOCK:
+        return {host: health.stats() for host, health in _HEALTH.items()}
@@ -0,0 +1,264 @@
+from __future__ import annotations
+
+import atexit
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from pathlib import Path
+from typing import Any, Dict, Optional
+from urllib.parse import parse_qsl, urlencode, urlparse, urlunparse
+
+
+PAGE_CACHE_DIR = os.getenv("PAGE_CACHE_DIR", ".page_cache")
+PAGE_CACHE_TTL_SECONDS = float(os.getenv("PAGE_CACHE_TTL_SECONDS", str(24 * 3600)))
+PAGE_CACHE_MAX_BYTES = max(1, int(os.getenv("PAGE_CACHE_MAX_BYTES", str(256 * 1024 * 1024))))
+_DEFAULT_PORTS = {"http": 80, "https": 443}
+
+_LOCK = threading.Lock()
+_CONN = None
+_CONN_DIR = ""
+# accessed_at updates from lookups, written in one batch by the next store (before eviction reads
+# them), by flush_page_cache, or once enough have piled up, so a hit does not wait on a commit.
+_ACCESSED: Dict[str, float] = {}
+_ACCESSED_FLUSH_AT = 256
+_STATS = {"hits": 0, "misses": 0, "revalidated": 0, "stored": 0, "evicted": 0, "bytes_saved": 0}
+
+
+def is_enabled() -> bool:
+    return os.getenv("PAGE_CACHE_ENABLED", "1") == "1"
+
+
+def normalize_url(url: str) -> str:
+    parsed = urlparse(url.strip())
+    scheme = (parsed.scheme or "http").lower()
+    host = (parsed.hostname or "").lower()
+    port = parsed.port
+    netloc = host if port in (None, _DEFAULT_PORTS.get(scheme)) else f"{host}:{port}"
+    path = parsed.path or "/"
+    if len(path) > 1:
+        path = path.rstrip("/")
+    query = urlencode(sorted(parse_qsl(parsed.query, keep_blank_values=True)))
+    return urlunparse((scheme, netloc, path, "", query, ""))
+
+
+def _cache_dir() -> Path:
+    return Path(os.getenv("PAGE_CACHE_DIR", PAGE_CACHE_DIR))
+
+
+def _connection() -> sqlite3.Connection:
+    global _CONN, _CONN_DIR
+    root = _cache_dir()
+    if _CONN is None or _CONN_DIR != str(root):
+        if _CONN is not None:
+            _flush_accessed(_CONN)
+            _CONN.commit()
+        (root / "blobs").mkdir(parents=True, exist_ok=True)
+        _CONN = sqlite3.connect(str(root / "index.sqlite3"), check_same_thread=False)
+        _CONN.execute(
+            """
+            CREATE TABLE IF NOT EXISTS pages (
+                url_key TEXT PRIMARY KEY,
+                body_hash TEXT NOT NULL,
+                etag TEXT NOT NULL DEFAULT '',
+                last_modified TEXT NOT NULL DEFAULT '',
+                fetched_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )
+            """
+        )
+        _CONN.execute(
+            """
+            CREATE TABLE IF NOT EXISTS blobs (
+                body_hash TEXT PRIMARY KEY,
+                stored_bytes INTEGER NOT NULL,
+                raw_bytes INTEGER NOT NULL
+            )
+            """
+        )
+        _CONN.commit()
+        _CONN_DIR = str(root)
+    return _CONN
+
+
+def _blob_path(body_hash: str) -> Path:
+    return _cache_dir() / "blobs" / f"{body_hash}.z"
+
+
+def _read_blob(body_hash: str) -> Optional[str]:
+    try:
+        return zlib.decompress(_blob_path(body_hash).read_bytes()).decode("utf-8")
+    except Exception:
+        return None
+
+
+def _flush_accessed(conn: sqlite3.Connection) -> None:
+    if _ACCESSED:
+        conn.executemany(
+            "UPDATE pages SET accessed_at = ? WHERE url_key = ?",
+            [(accessed, key) for key, accessed in _ACCESSED.items()],
+        )
+        _ACCESSED.clear()
+
+
+def lookup(url: str) -> Optional[Dict[str, Any]]:
+    if not is_enabled():
+        return None
+    key = normalize_url(url)
+    # The lock only covers the index row; reading and decompressing the blob happen outside it,
+    # so concurrent scrape threads do not queue behind each other's zlib.
+    with _LOCK:
+        row = _connection().execute(
+            "SELECT body_hash, etag, last_modified, fetched_at FROM pages WHERE url_key = ?",
+            (key,),
+        ).fetchone()
+    if row is None:
+        return None
+    html = _read_blob(row[0])
+    now = time.time()
+    with _LOCK:
+        conn = _connection()
+        if html is None:
+            # Only forget the row if it still points at the missing blob (a store may have replaced it).
+            conn.execute("DELETE FROM pages WHERE url_key = ? AND body_hash = ?", (key, row[0]))
+            conn.commit()
+            _ACCESSED.pop(key, None)
+            return None
+        _ACCESSED[key] = now
+        if len(_ACCESSED) >= _ACCESSED_FLUSH_AT:
+            _flush_accessed(conn)
+            conn.commit()
+    ttl = float(os.getenv("PAGE_CACHE_TTL_SECONDS", str(PAGE_CACHE_TTL_SECONDS)))
+    return {
+        "html": html,
+        "etag": row[1],
+        "last_modified": row[2],
+        "fresh": (now - row[3]) < ttl,
+    }
+
+
+def is_fresh(url: str) -> bool:
+    # Answered from the index row alone: no blob is read and accessed_at is left alone, since
+    # a freshness probe is not a use of the page (the scrape that follows is).
+    if not is_enabled():
+        return False
+    with _LOCK:
+        row = _connection().execute(
+            "SELECT fetched_at FROM pages WHERE url_key = ?",
+            (normalize_url(url),),
+        ).fetchone()
+    ttl = float(os.getenv("PAGE_CACHE_TTL_SECONDS", str(PAGE_CACHE_TTL_SECONDS)))
+    return row is not None and (time.time() - row[0]) < ttl
+
+
+def conditional_headers(entry: Optional[Dict[str, Any]]) -> Dict[str, str]:
+    headers: Dict[str, str] = {}
+    if not entry:
+        return headers
+    if entry.get("etag"):
+        headers["If-None-Match"] = entry["etag"]
+    if entry.get("last_modified"):
+        headers["If-Modified-Since"] = entry["last_modified"]
+    return headers
+
+
+def store(url: str, html: str, etag: str = "", last_modified: str = "") -> None:
+    if not is_enabled() or not html:
+        return
+    raw = html.encode("utf-8")
+    body_hash = hashlib.sha256(raw).hexdigest()
+    key = normalize_url(url)
+    now = time.time()
+    with _LOCK:
+        conn = _connection()
+        if conn.execute("SELECT 1 FROM blobs WHERE body_hash = ?", (body_hash,)).fetchone() is None:
+            compressed = zlib.compress(raw, 6)
+            _blob_path(body_hash).write_bytes(compressed)
+            conn.execute(
+                "INSERT INTO blobs (body_hash, stored_bytes, raw_bytes) VALUES (?, ?, ?)",
+                (body_hash, len(compressed), len(raw)),
+            )
+        previous = conn.execute("SELECT body_hash FROM pages WHERE url_key = ?", (key,)).fetchone()
+        conn.execute(
+            """
+            INSERT OR REPLACE INTO pages (url_key, body_hash, etag, last_modified, fetched_at, accessed_at)
+            VALUES (?, ?, ?, ?, ?, ?)
+            """,
+            (key, body_hash, etag or "", last_modified or "", now, now),
+        )
+        if previous and previous[0] != body_hash:
+            _drop_blob_if_orphaned(conn, previous[0])
+        _ACCESSED.pop(key, None)
+        _flush_accessed(conn)
+        _evict(conn)
+        conn.commit()
+        _STATS["stored"] += 1
+
+
+def mark_revalidated(url: str) -> None:
+    if not is_enabled():
+        return
+    now = time.time()
+    key = normalize_url(url)
+    with _LOCK:
+        conn = _connection()
+        conn.execute("UPDATE pages SET fetched_at = ?, accessed_at = ? WHERE url_key = ?", (now, now, key))
+        conn.commit()
+        _ACCESSED.pop(key, None)
+
+
+def flush_page_cache() -> None:
+    with _LOCK:
+        if _CONN is None or not _ACCESSED:
+            return
+        _flush_accessed(_CONN)
+        _CONN.commit()
+
+
+def _drop_blob_if_orphaned(conn: sqlite3.Connection, body_hash: str) -> None:
+    if conn.execute("SELECT 1 FROM pages WHERE body_hash = ? LIMIT 1", (body_hash,)).fetchone():
+        return
+    conn.execute("DELETE FROM blobs WHERE body_hash = ?", (body_hash,))
+    try:
+        _blob_path(body_hash).unlink()
+    except FileNotFoundError:
+        pass
+
+
+def _evict(conn: sqlite3.Connection) -> None:
+    max_bytes = max(1, int(os.getenv("PAGE_CACHE_MAX_BYTES", str(PAGE_CACHE_MAX_BYTES))))
+    total = conn.execute("SELECT COALESCE(SUM(stored_bytes), 0) FROM blobs").fetchone()[0]
+    if total <= max_bytes:
+        return
+    # Least recently accessed URLs go first; a blob is only deleted once no URL references it.
+    for key, body_hash in conn.execute("SELECT url_key, body_hash FROM pages ORDER BY accessed_at ASC").fetchall():
+        if total <= max_bytes:
+            break
+        conn.execute("DELETE FROM pages WHERE url_key = ?", (key,))
+        size = conn.execute("SELECT stored_bytes FROM blobs WHERE body_hash = ?", (body_hash,)).fetchone()
+        _drop_blob_if_orphaned(conn, body_hash)
+        if size and conn.execute("SELECT 1 FROM blobs WHERE body_hash = ?", (body_hash,)).fetchone() is None:
+            total -= size[0]
+        _STATS["evicted"] += 1
+
+
+def record(event: str, saved_bytes: int = 0) -> None:
+    with _LOCK:
+        _STATS[event] += 1
+        _STATS["bytes_saved"] += saved_bytes
+
+
+def cache_stats() -> Dict[str, int]:
+    with _LOCK:
+        return dict(_STATS)
+
+
+def reset_stats() -> None:
+    with _LOCK:
+        for key in _STATS:
+            _STATS[key] = 0
+
+
+atexit.register(flush_page_cache)
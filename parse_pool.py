@@ -0,0 +1,252 @@
+from __future__ import annotations
+
+import atexit
+import itertools
+import multiprocessing
+import os
+import signal
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FuturesTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, Optional, Tuple
+
+try:
+    from html_text import extract_text
+except ImportError:
+    from .html_text import extract_text
+
+
+# 0 keeps every page in-process. The default leaves one core for the fetch and LLM threads.
+PARSE_WORKERS = max(0, int(os.getenv("PARSE_WORKERS", str(min(4, (os.cpu_count() or 1) - 1)))))
+PARSE_INLINE_MAX_CHARS = max(0, int(os.getenv("PARSE_INLINE_MAX_CHARS", "100000")))
+# A page still parsing this long after a worker picked it up is given up on and its worker is
+# replaced, so a pathological document cannot keep a scrape thread or a pool worker forever.
+# Time spent waiting in the queue does not count.
+PARSE_TIMEOUT_SECONDS = max(1.0, float(os.getenv("PARSE_TIMEOUT_SECONDS", "30")))
+# How often a caller whose page is still queued checks whether a worker has picked it up.
+_QUEUED_POLL_SECONDS = 0.2
+
+# Worker side: where each job reports (job id, pid) as it starts.
+_STARTED = None
+
+
+class ParseTimeoutError(TimeoutError):
+    pass
+
+
+def _init_worker(started) -> None:
+    global _STARTED
+    _STARTED = started
+
+
+def _warm() -> bool:
+    return True
+
+
+def _parse(job: int, html: str, engine: str) -> str:
+    _STARTED.put((job, os.getpid()))
+    return extract_text(html, engine)
+
+
+# HTML-to-text is CPU-bound, so scrape threads parsing large pages serialize on the GIL.
+# Pages above the size threshold go to worker processes instead; smaller ones are parsed in
+# the calling thread, where pickling and the round trip would cost more than the parse.
+# Pages are sent as the str they already are; pickle writes it out as UTF-8 in a single pass.
+#
+# Workers report when they start a page, so the timeout runs from then. A page over the limit
+# gets its worker killed; ProcessPoolExecutor cannot lose one worker, so the whole generation
+# is replaced first and pages caught in the old one are submitted again to the new one.
+class ParsePool:
+    def __init__(self, workers: int = PARSE_WORKERS, inline_max_chars: int = PARSE_INLINE_MAX_CHARS):
+        self.workers = max(1, workers)
+        self.inline_max_chars = inline_max_chars
+        self._broken = False
+        self._lock = threading.Lock()
+        self._jobs = itertools.count(1)
+        self._started: Dict[int, Tuple[float, int]] = {}
+        self._started_lock = threading.Lock()
+        self._counters = {
+            "inline": 0,
+            "offloaded": 0,
+            "chars_offloaded": 0,
+            "fallbacks": 0,
+            "timeouts": 0,
+            "restarts": 0,
+            "resubmitted": 0,
+        }
+        self._executor, self._started_queue = self._spawn()
+
+    def _spawn(self):
+        # spawn rather than fork: the parent already runs HTTP, LLM and browser threads.
+        context = multiprocessing.get_context("spawn")
+        started = context.SimpleQueue()
+        executor = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=context,
+            initializer=_init_worker,
+            initargs=(started,),
+        )
+        threading.Thread(target=self._watch, args=(started,), name="parse-pool-starts", daemon=True).start()
+        return executor, started
+
+    def _watch(self, started) -> None:
+        while True:
+            item = started.get()
+            if item is None:
+                return
+            job, pid = item
+            with self._started_lock:
+                self._started[job] = (time.monotonic(), pid)
+
+    def warm(self) -> None:
+        # Start every worker now (imports included) so the first large page does not pay for it.
+        for _ in range(self.workers):
+            self._executor.submit(_warm)
+
+    def _count(self, key: str, amount: int = 1) -> None:
+        with self._lock:
+            self._counters[key] += amount
+
+    def _replace(self, executor: ProcessPoolExecutor, pid: int) -> None:
+        with self._lock:
+            if self._executor is not executor:
+                return
+            old_queue = self._started_queue
+            self._executor, self._started_queue = self._spawn()
+            self._counters["restarts"] += 1
+        try:
+            os.kill(pid, signal.SIGTERM)
+        except OSError:
+            pass
+        executor.shutdown(wait=False)
+        old_queue.put(None)
+        self.warm()
+
+    def _wait(self, job: int, executor: ProcessPoolExecutor, future, timeout: float) -> str:
+        while True:
+            with self._started_lock:
+                started = self._started.get(job)
+            if started is None:
+                wait = _QUEUED_POLL_SECONDS
+            else:
+                wait = started[0] + timeout - time.monotonic()
+                if wait <= 0:
+                    self._replace(executor, started[1])
+                    raise ParseTimeoutError(f"parse took over {timeout:g}s")
+            try:
+                return future.result(timeout=wait)
+            except FuturesTimeoutError:
+                continue
+
+    def clean_text(self, html: str, engine: Optional[str] = None) -> str:
+        if self._broken or len(html) < self.inline_max_chars:
+            self._count("inline")
+            return extract_text(html, engine)
+
+        name = (engine or os.getenv("HTML_TEXT_ENGINE", "lxml")).strip().lower()
+        timeout = max(1.0, float(os.getenv("PARSE_TIMEOUT_SECONDS", str(PARSE_TIMEOUT_SECONDS))))
+        job = next(self._jobs)
+        try:
+            while True:
+                executor = self._executor
+                try:
+                    text = self._wait(job, executor, executor.submit(_parse, job, html, name), timeout)
+                    break
+                except (BrokenProcessPool, RuntimeError):
+                    if self._executor is executor:
+                        raise
+                    # Another page's worker was replaced under this one; parse it in the new generation.
+                    self._count("resubmitted")
+                    with self._started_lock:
+                        self._started.pop(job, None)
+        except ParseTimeoutError:
+            self._count("timeouts")
+            raise
+        except (BrokenProcessPool, RuntimeError):
+            # A worker died or the pool is shutting down; finish the run in-process.
+            self._broken = True
+            self._count("fallbacks")
+            return extract_text(html, engine)
+        finally:
+            with self._started_lock:
+                self._started.pop(job, None)
+        self._count("offloaded")
+        self._count("chars_offloaded", len(html))
+        return text
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            stats = dict(self._counters)
+        stats["workers"] = self.workers
+        stats["inline_max_chars"] = self.inline_max_chars
+        return stats
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=True, cancel_futures=True)
+        self._started_queue.put(None)
+
+
+_POOL: Optional[ParsePool] = None
+_POOL_LOCK = threading.Lock()
+_INLINE_COUNT = 0
+
+
+def get_parse_pool() -> Optional[ParsePool]:
+    global _POOL
+    workers = max(0, int(os.getenv("PARSE_WORKERS", str(PARSE_WORKERS))))
+    if workers == 0:
+        return None
+    with _POOL_LOCK:
+        if _POOL is None:
+            _POOL = ParsePool(
+                workers=workers,
+                inline_max_chars=max(0, int(os.getenv("PARSE_INLINE_MAX_CHARS", str(PARSE_INLINE_MAX_CHARS)))),
+            )
+            _POOL.warm()
+        return _POOL
+
+
+def warm_parse_pool() -> None:
+    get_parse_pool()
+
+
+def clean_text(html: str) -> str:
+    global _INLINE_COUNT
+    pool = get_parse_pool()
+    if pool is None:
+        with _POOL_LOCK:
+            _INLINE_COUNT += 1
+        return extract_text(html)
+    return pool.clean_text(html)
+
+
+def parse_stats() -> Dict[str, int]:
+    with _POOL_LOCK:
+        pool = _POOL
+        inline = _INLINE_COUNT
+    if pool is None:
+        return {
+            "inline": inline,
+            "offloaded": 0,
+            "chars_offloaded": 0,
+            "fallbacks": 0,
+            "timeouts": 0,
+            "restarts": 0,
+            "resubmitted": 0,
+            "workers": 0,
+        }
+    stats = pool.stats()
+    stats["inline"] += inline
+    return stats
+
+
+def shutdown_parse_pool() -> None:
+    global _POOL
+    with _POOL_LOCK:
+        pool, _POOL = _POOL, None
+    if pool is not None:
+        pool.close()
+
+
+atexit.register(shutdown_parse_pool)
@@ -5,9 +5,9 @@ import re
 from typing import List
 
 try:
-    from llm_client import call_llm_json, pop_warning
+    from llm_client import call_llm_json_result, call_llm_json_result_async
 except ImportError:
-    from .llm_client import call_llm_json, pop_warning
+    from .llm_client import call_llm_json_result, call_llm_json_result_async
 
 
 STOPWORDS = {
@@ -113,16 +113,19 @@ def _infer_columns(goal: str) -> List[str]:
     return [p for p in parts if p and len(p) > 1]
 
 
-def planner_node(state):
-    goal = state["goal"]
+PLAN_SCHEMA_HINT = "{search_query:string, output_format:string, table_columns:string[]}"
+
 
-    fallback = {
+def _plan_fallback(goal: str) -> dict:
+    return {
         "search_query": _fallback_query(goal),
         "output_format": _infer_output_format(goal),
         "table_columns": _infer_columns(goal),
     }
 
-    prompt = f"""
+
+def _plan_prompt(goal: str) -> str:
+    return f"""
 User request:
 {goal}
 
@@ -133,15 +136,11 @@ Return JSON with keys:
 - table_columns: array of column names for table output
 """
 
-    planned = call_llm_json(
-        prompt=prompt,
-        schema_hint="{search_query:string, output_format:string, table_columns:string[]}",
-        fallback=fallback,
-        model_name=PLANNER_MODEL,
-    )
-    warning = pop_warning()
-    if warning:
-        state["errors"].append(warning)
+
+def _apply_plan(state, result, fallback: dict):
+    if result.warning:
+        state["errors"].append(result.warning)
+    planned = result.data
 
     state["search_query"] = str(planned.get("search_query") or fallback["search_query"]).strip()
 
@@ -157,3 +156,27 @@ Return JSON with keys:
 
     state["agent_confidences"]["planner"] = 0.8 if state["search_query"] else 0.35
     return state
+
+
+def planner_node(state):
+    goal = state["goal"]
+    fallback = _plan_fallback(goal)
+    result = call_llm_json_result(
+        prompt=_plan_prompt(goal),
+        schema_hint=PLAN_SCHEMA_HINT,
+        fallback=fallback,
+        model_name=PLANNER_MODEL,
+    )
+    return _apply_plan(state, result, fallback)
+
+
+async def planner_node_async(state):
+    goal = state["goal"]
+    fallback = _plan_fallback(goal)
+    result = await call_llm_json_result_async(
+        prompt=_plan_prompt(goal),
+        schema_hint=PLAN_SCHEMA_HINT,
+        fallback=fallback,
+        model_name=PLANNER_MODEL,
+    )
+    return _apply_plan(state, result, fallback)
@@ -0,0 +1,227 @@
+from __future__ import annotations
+
+import json
+import os
+import re
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+
+try:
+    from metrics import add_node_listener, remove_node_listener
+except ImportError:
+    from .metrics import add_node_listener, remove_node_listener
+
+
+PROFILE_INTERVAL_MS = max(1.0, float(os.getenv("PROFILE_INTERVAL_MS", "5")))
+PROFILE_MAX_DEPTH = 96
+OUTSIDE_NODES = "(no node)"
+# Innermost Python frames that mean a thread is blocked (locks, sockets, selectors, idle pool
+# workers, sleeps) rather than using CPU. Such samples go into the flamegraph but not the hotspots.
+WAIT_FRAMES = {
+    ("threading.py", "wait"),
+    ("threading.py", "_wait_for_tstate_lock"),
+    ("threading.py", "join"),
+    ("selectors.py", "select"),
+    ("socket.py", "readinto"),
+    ("socket.py", "accept"),
+    ("ssl.py", "read"),
+    ("ssl.py", "recv_into"),
+    ("ssl.py", "do_handshake"),
+    ("queue.py", "get"),
+    ("thread.py", "_worker"),
+    ("_base.py", "result"),
+    ("_base.py", "wait"),
+    ("connection.py", "create_connection"),
+    ("connection.py", "_recv"),
+    ("connection.py", "_poll"),
+    ("base_events.py", "_run_once"),
+    ("tasks.py", "sleep"),
+    ("popen_fork.py", "poll"),
+}
+_THREAD_SUFFIX = re.compile(r"[_-]\d+$")
+
+
+def _frame_label(code) -> str:
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+# Samples every thread's Python stack with sys._current_frames() from a daemon thread, so
+# the pipeline runs unmodified at full speed between samples; the cost is one stack walk per
+# thread per interval. Samples are tagged with the graph node running at that moment.
+# Allocation peaks are opt-in: tracemalloc hooks every allocation, which slows allocation-heavy
+# code such as HTML parsing several times over and would skew the CPU profile it sits beside.
+class SamplingProfiler:
+    def __init__(self, interval_ms: float = PROFILE_INTERVAL_MS, memory: bool = False):
+        self.interval = max(1.0, interval_ms) / 1000.0
+        self.memory = memory
+        self.stacks: Counter = Counter()
+        self.self_samples: Dict[str, Counter] = {}
+        self.total_samples: Dict[str, Counter] = {}
+        self.nodes: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self._active: Dict[int, Tuple[str, float, float, int]] = {}
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+        self._started = 0.0
+        self._elapsed = 0.0
+        self._owns_tracemalloc = False
+
+    def start(self) -> "SamplingProfiler":
+        if self.memory and not tracemalloc.is_tracing():
+            # One frame per allocation keeps tracemalloc's bookkeeping cheap; only peaks are read.
+            tracemalloc.start(1)
+            self._owns_tracemalloc = True
+        add_node_listener(self._on_node)
+        self._started = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        remove_node_listener(self._on_node)
+        self._elapsed = time.perf_counter() - self._started
+        if self._owns_tracemalloc:
+            tracemalloc.stop()
+
+    def __enter__(self) -> "SamplingProfiler":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+    def _on_node(self, name: str, phase: str, run: Dict[str, Any]) -> None:
+        # Runs are keyed by id, so goals running the same node at once are tracked separately.
+        # CPU time and the allocation peak are process-wide, so they are only kept for runs that
+        # had no other node alongside (run["overlapped"]); the peak is only reset for such runs.
+        now, cpu = time.perf_counter(), time.process_time()
+        with self._lock:
+            if phase == "start":
+                baseline = 0
+                if self.memory and tracemalloc.is_tracing():
+                    baseline = tracemalloc.get_traced_memory()[0]
+                    if not self._active:
+                        tracemalloc.reset_peak()
+                self._active[run["id"]] = (name, now, cpu, baseline)
+                return
+            started = self._active.pop(run["id"], None)
+            if started is None:
+                return
+            entry = self.nodes.setdefault(
+                name, {"calls": 0, "solo_calls": 0, "wall_seconds": 0.0, "cpu_seconds": 0.0, "alloc_peak_bytes": 0}
+            )
+            entry["calls"] += 1
+            entry["wall_seconds"] += now - started[1]
+            if run["overlapped"]:
+                return
+            entry["solo_calls"] += 1
+            entry["cpu_seconds"] += cpu - started[2]
+            if self.memory and tracemalloc.is_tracing():
+                peak = tracemalloc.get_traced_memory()[1] - started[3]
+                entry["alloc_peak_bytes"] = max(entry["alloc_peak_bytes"], peak)
+
+    def _node_label(self) -> str:
+        with self._lock:
+            return "+".join(sorted({active[0] for active in self._active.values()})) or OUTSIDE_NODES
+
+    def _run(self) -> None:
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            node = self._node_label()
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                self._sample(node, _THREAD_SUFFIX.sub("", names.get(ident, "thread")), frame)
+
+    def _sample(self, node: str, thread: str, frame) -> None:
+        labels: List[str] = []
+        leaf = (os.path.basename(frame.f_code.co_filename), frame.f_code.co_name)
+        while frame is not None and len(labels) < PROFILE_MAX_DEPTH:
+            labels.append(_frame_label(frame.f_code))
+            frame = frame.f_back
+        labels.reverse()
+        self.stacks[";".join([node, thread] + labels)] += 1
+        if leaf in WAIT_FRAMES:
+            return
+        self.self_samples.setdefault(node, Counter())[labels[-1]] += 1
+        totals = self.total_samples.setdefault(node, Counter())
+        for label in set(labels):
+            totals[label] += 1
+
+    def report(self, top: int = 20) -> Dict[str, Any]:
+        interval_ms = self.interval * 1000.0
+        all_self: Counter = Counter()
+        all_total: Counter = Counter()
+        for counter in self.self_samples.values():
+            all_self.update(counter)
+        for counter in self.total_samples.values():
+            all_total.update(counter)
+
+        def _rows(self_counter: Counter, total_counter: Counter, limit: int) -> List[Dict[str, Any]]:
+            return [
+                {
+                    "function": label,
+                    "self_ms": round(count * interval_ms, 1),
+                    "total_ms": round(total_counter.get(label, 0) * interval_ms, 1),
+                }
+                for label, count in self_counter.most_common(limit)
+            ]
+
+        nodes = {}
+        for name in sorted(set(self.nodes) | set(self.self_samples)):
+            timing = self.nodes.get(name, {})
+            nodes[name] = {
+                "calls": timing.get("calls", 0),
+                "solo_calls": timing.get("solo_calls", 0),
+                "wall_seconds": round(timing.get("wall_seconds", 0.0), 3),
+                "cpu_seconds": round(timing.get("cpu_seconds", 0.0), 3),
+                "alloc_peak_kb": round(timing.get("alloc_peak_bytes", 0) / 1024, 1),
+                "busy_samples": sum(self.self_samples.get(name, Counter()).values()),
+                "hotspots": _rows(self.self_samples.get(name, Counter()), self.total_samples.get(name, Counter()), 5),
+            }
+        return {
+            "interval_ms": interval_ms,
+            "elapsed_seconds": round(self._elapsed, 3),
+            "samples": sum(self.stacks.values()),
+            "memory": self.memory,
+            "nodes": nodes,
+            "hotspots": _rows(all_self, all_total, top),
+        }
+
+    def write(self, prefix: str, top: int = 20) -> Dict[str, Any]:
+        # <prefix>.collapsed is Brendan Gregg's folded format ("node;thread;outer;...;inner count"),
+        # readable by flamegraph.pl, speedscope and inferno.
+        report = self.report(top)
+        base = Path(prefix)
+        base.parent.mkdir(parents=True, exist_ok=True)
+        collapsed = base.with_name(base.name + ".collapsed")
+        with collapsed.open("w", encoding="utf-8") as handle:
+            for stack, count in sorted(self.stacks.items()):
+                handle.write(f"{stack} {count}\n")
+        summary = base.with_name(base.name + ".json")
+        summary.write_text(json.dumps(report, indent=2), encoding="utf-8")
+        report["files"] = {"collapsed": str(collapsed), "summary": str(summary)}
+        return report
+
+
+def format_hotspots(report: Dict[str, Any], top: int = 20) -> str:
+    lines = [f"[PROFILE] {report['samples']} samples every {report['interval_ms']:g}ms over {report['elapsed_seconds']}s"]
+    for name, node in report["nodes"].items():
+        alloc = f"alloc_peak={node['alloc_peak_kb']}KB " if report["memory"] else ""
+        lines.append(
+            f"[PROFILE] {name:<16} calls={node['calls']} wall={node['wall_seconds']}s "
+            f"cpu={node['cpu_seconds']}s (solo_calls={node['solo_calls']}) "
+            f"{alloc}busy_samples={node['busy_samples']}"
+        )
+    lines.append(f"[PROFILE] top {top} functions by self time (blocked threads excluded):")
+    for row in report["hotspots"][:top]:
+        lines.append(f"[PROFILE]   {row['self_ms']:>9.1f}ms self {row['total_ms']:>9.1f}ms total  {row['function']}")
+    return "\n".join(lines)
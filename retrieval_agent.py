@@ -1,18 +1,32 @@
 from __future__ import annotations
 
+import asyncio
+import heapq
 import os
-import re
-from typing import Dict, List
+from typing import Dict, List, Sequence
 
 try:
-    from llm_client import call_llm_json, pop_warning
+    import near_dup
+    from bm25_index import BM25Index, query_terms
+    from embedding_store import cosine_scores
+    from llm_client import call_llm_json_result, call_llm_json_result_async
+    from run_registry import carried, doc_url, mark_done, record_stage, unseen
 except ImportError:
-    from .llm_client import call_llm_json, pop_warning
+    from . import near_dup
+    from .bm25_index import BM25Index, query_terms
+    from .embedding_store import cosine_scores
+    from .llm_client import call_llm_json_result, call_llm_json_result_async
+    from .run_registry import carried, doc_url, mark_done, record_stage, unseen
 
 MAX_CHUNKS = max(5, int(os.getenv("MAX_CHUNKS", "30")))
 RETRIEVAL_LLM_SCORING = os.getenv("RETRIEVAL_LLM_SCORING", "0") == "1"
 MAX_LLM_CHUNKS_PER_DOC = max(1, int(os.getenv("MAX_LLM_CHUNKS_PER_DOC", "3")))
 RETRIEVAL_MODEL = os.getenv("OLLAMA_MODEL_RETRIEVAL", os.getenv("OLLAMA_MODEL", "llama3.2:1b"))
+RETRIEVAL_ENGINE = os.getenv("RETRIEVAL_ENGINE", "keyword").strip().lower()
+RETRIEVAL_MIN_SCORE = float(os.getenv("RETRIEVAL_MIN_SCORE", "0.08"))
+RETRIEVAL_PER_DOC_CHUNKS = max(1, int(os.getenv("RETRIEVAL_PER_DOC_CHUNKS", "4")))
+# Share of the fused score taken by embedding similarity when RETRIEVAL_ENGINE=hybrid.
+RETRIEVAL_HYBRID_WEIGHT = min(1.0, max(0.0, float(os.getenv("RETRIEVAL_HYBRID_WEIGHT", "0.5"))))
 
 
 def _chunk_text(text: str, chunk_size: int = 1800) -> List[str]:
@@ -34,9 +48,7 @@ def _chunk_text(text: str, chunk_size: int = 1800) -> List[str]:
     return chunks
 
 
-def _keyword_score(chunk: str, goal: str) -> float:
-    terms = [t.lower() for t in re.findall(r"[A-Za-z0-9\-]+", goal) if len(t) > 2]
-    terms = list(dict.fromkeys(terms))
+def _keyword_score_terms(chunk: str, terms: Sequence[str]) -> float:
     if not terms:
         return 0.0
     lowered = chunk.lower()
@@ -44,8 +56,12 @@ def _keyword_score(chunk: str, goal: str) -> float:
     return hits / len(terms)
 
 
-def _semantic_score(chunk: str, goal: str, fallback: float) -> float:
-    prompt = f"""
+def _keyword_score(chunk: str, goal: str) -> float:
+    return _keyword_score_terms(chunk, query_terms(goal))
+
+
+def _semantic_prompt(chunk: str, goal: str) -> str:
+    return f"""
 Task:
 Score how useful this text chunk is for answering the user request.
 
@@ -57,64 +73,238 @@ Chunk:
 
 Return JSON: {{"score": number between 0 and 1}}
 """
-    parsed = call_llm_json(
-        prompt=prompt,
+
+
+def _semantic_from(result, fallback: float) -> tuple[float, str]:
+    score = float(result.data.get("score", fallback) or fallback)
+    return max(0.0, min(score, 1.0)), result.warning
+
+
+def _semantic_score(chunk: str, goal: str, fallback: float) -> tuple[float, str]:
+    result = call_llm_json_result(
+        prompt=_semantic_prompt(chunk, goal),
+        schema_hint="{score:number}",
+        fallback={"score": fallback},
+        model_name=RETRIEVAL_MODEL,
+    )
+    return _semantic_from(result, fallback)
+
+
+async def _semantic_score_async(chunk: str, goal: str, fallback: float) -> tuple[float, str]:
+    result = await call_llm_json_result_async(
+        prompt=_semantic_prompt(chunk, goal),
         schema_hint="{score:number}",
         fallback={"score": fallback},
         model_name=RETRIEVAL_MODEL,
     )
-    score = float(parsed.get("score", fallback) or fallback)
-    return max(0.0, min(score, 1.0))
+    return _semantic_from(result, fallback)
+
+
+def _gated_chunks(doc: Dict, terms: Sequence[str]) -> List[tuple[float, str]]:
+    gated = []
+    for chunk in _chunk_text(doc["full_text"]):
+        kscore = _keyword_score_terms(chunk, terms)
+        if kscore < RETRIEVAL_MIN_SCORE:
+            continue
+        gated.append((kscore, chunk))
+    return gated
+
+
+def _drop_duplicate_chunks(chunks: List[tuple], index) -> List[tuple]:
+    # Near-identical chunks (boilerplate repeated across pages, quoted abstracts) are dropped
+    # before ranking so they cannot fill the top-k or the extraction prompt twice.
+    if index is None:
+        return chunks
+    unique = [item for item in chunks if not index.add(item[1])]
+    near_dup.record("chunks_dropped", len(chunks) - len(unique))
+    return unique
+
+
+def _chunk_index(previous: List[Dict]):
+    # Seeded with the chunks kept by earlier iterations, so a new page cannot bring one back.
+    index = near_dup.new_chunk_index()
+    if index is not None:
+        for hit in previous:
+            index.add(hit["chunk"])
+    return index
+
+
+def _chunk_owners(docs: List[Dict]) -> List[tuple[int, str]]:
+    owners = [(doc_idx, chunk) for doc_idx, doc in enumerate(docs) for chunk in _chunk_text(doc["full_text"])]
+    return _drop_duplicate_chunks(owners, near_dup.new_chunk_index())
+
+
+def _bm25_scores(docs: List[Dict], owners: List[tuple[int, str]], terms: Sequence[str]) -> List[float]:
+    index = BM25Index()
+    for doc_idx, chunk in owners:
+        index.add({"title": docs[doc_idx].get("title", ""), "body": chunk})
+    scores = index.score_all(terms)
+    # Raw BM25 is unbounded. Scaling by the score of a chunk that has every goal term puts it on
+    # the keyword ratio's 0-1 scale, so the same gate applies; unlike scaling by the best chunk,
+    # a page that barely mentions the goal still scores low and can be gated out.
+    ceiling = index.reference_score(terms) or 1.0
+    return [min(1.0, scores.get(chunk_id, 0.0) / ceiling) for chunk_id in range(len(owners))]
+
+
+def _semantic_fusion(
+    docs: List[Dict], owners: List[tuple[int, str]], terms: Sequence[str], goal: str, errors: List[str] | None
+) -> List[float]:
+    similarities, warning = cosine_scores(goal, [chunk for _, chunk in owners])
+    if similarities is None:
+        if errors is not None:
+            errors.append(f"{warning}; using bm25 scores")
+        return _bm25_scores(docs, owners, terms)
+    weight = 1.0 if RETRIEVAL_ENGINE == "embedding" else RETRIEVAL_HYBRID_WEIGHT
+    if weight >= 1.0:
+        # BM25 would get no weight, so its index is only built when embedding fails.
+        return [max(0.0, sim) for sim in similarities]
+    lexical = _bm25_scores(docs, owners, terms)
+    return [weight * max(0.0, sim) + (1.0 - weight) * lex for sim, lex in zip(similarities, lexical)]
+
+
+def _gated_by_doc(
+    docs: List[Dict], goal: str, errors: List[str] | None = None, previous: List[Dict] | None = None
+) -> List[List[tuple[float, str]]]:
+    terms = query_terms(goal)
+    if RETRIEVAL_ENGINE not in ("bm25", "embedding", "hybrid"):
+        # Only chunks that pass the keyword gate are signed; the index spans every document.
+        index = _chunk_index(previous or [])
+        return [_drop_duplicate_chunks(_gated_chunks(doc, terms), index) for doc in docs]
+
+    owners = _chunk_owners(docs)
+    if RETRIEVAL_ENGINE == "bm25":
+        scores = _bm25_scores(docs, owners, terms)
+    else:
+        scores = _semantic_fusion(docs, owners, terms, goal, errors)
+
+    gated: List[List[tuple[float, str]]] = [[] for _ in docs]
+    # Owners are in document order, so each doc's chunks stay in document order too.
+    for (doc_idx, chunk), score in zip(owners, scores):
+        if score >= RETRIEVAL_MIN_SCORE:
+            gated[doc_idx].append((score, chunk))
+    return gated
+
+
+def _doc_hits(doc: Dict, scored: List[tuple[float, str]]) -> List[Dict]:
+    scored = sorted(scored, key=lambda x: x[0], reverse=True)
+    return [
+        {
+            "paper_id": doc["paper_id"],
+            "title": doc["title"],
+            "url": doc["url"],
+            "source": doc["source"],
+            "score": score,
+            "chunk": chunk,
+        }
+        for score, chunk in scored[:RETRIEVAL_PER_DOC_CHUNKS]
+    ]
+
+
+def _finish_retrieval(state, retrieved: List[Dict], top_scores: List[float]):
+    # Global top-k by score; earlier entries win ties, as a stable descending sort would.
+    ranked = heapq.nsmallest(MAX_CHUNKS, enumerate(retrieved), key=lambda pair: (-pair[1]["score"], pair[0]))
+    state["retrieved_chunks"] = [item for _, item in ranked]
+    # Every hit's score, not only the top-k kept, so a later incremental iteration can average
+    # over the same hits a from-scratch run would see.
+    state["retrieval_hit_scores"] = list(top_scores)
+
+    avg_score = sum(top_scores) / len(top_scores) if top_scores else 0.0
+    state["agent_confidences"]["retrieval"] = avg_score
+    return state
+
+
+def _docs_to_score(state) -> tuple[List[Dict], List[Dict], List[float]]:
+    # Keyword scores depend only on the chunk, so documents ranked in an earlier iteration keep
+    # their hits and only new ones are chunked. BM25 and embedding scores are scaled across the
+    # whole corpus, so those engines re-rank every document.
+    docs = state["scraped_docs"]
+    if RETRIEVAL_ENGINE in ("bm25", "embedding", "hybrid"):
+        record_stage(state, "retrieval", processed=len(docs), skipped=0)
+        fresh, previous, previous_scores = docs, [], []
+    else:
+        fresh = unseen(state, "retrieval", docs, doc_url)
+        previous, previous_scores = carried(state, "retrieved_chunks"), carried(state, "retrieval_hit_scores")
+    mark_done(state, "retrieval", fresh, doc_url)
+    return fresh, previous, previous_scores
+
+
+def _collect_retrieved(
+    state,
+    scored_docs: List[tuple[Dict, List[tuple[float, str]]]],
+    previous: List[Dict],
+    previous_scores: List[float],
+):
+    retrieved: List[Dict] = list(previous)
+    hit_scores: List[float] = list(previous_scores)
+    for doc, scored in scored_docs:
+        hits = _doc_hits(doc, scored)
+        retrieved.extend(hits)
+        hit_scores.extend(item["score"] for item in hits)
+    return _finish_retrieval(state, retrieved, hit_scores)
+
+
+def _score_doc(doc: Dict, goal: str, errors: List[str], gated: List[tuple[float, str]] | None = None) -> List[tuple[float, str]]:
+    if gated is None:
+        gated = _gated_chunks(doc, query_terms(goal))
+    scored = []
+    for llm_calls_used, (kscore, chunk) in enumerate(gated):
+        if RETRIEVAL_LLM_SCORING and llm_calls_used < MAX_LLM_CHUNKS_PER_DOC:
+            sscore, warning = _semantic_score(chunk, goal, fallback=kscore)
+            if warning:
+                errors.append(warning)
+        else:
+            sscore = kscore
+        score = 0.5 * kscore + 0.5 * sscore
+        scored.append((score, chunk))
+    return scored
 
 
 def retrieval_node(state):
     goal = state["goal"]
-    retrieved: List[Dict] = []
-    top_scores = []
+    scored_docs = []
 
-    total_docs = len(state["scraped_docs"])
-    for doc_idx, doc in enumerate(state["scraped_docs"], start=1):
+    docs, previous, previous_scores = _docs_to_score(state)
+    total_docs = len(docs)
+    gated_by_doc = _gated_by_doc(docs, goal, state["errors"], previous)
+    for doc_idx, (doc, gated) in enumerate(zip(docs, gated_by_doc), start=1):
         print(
             f"[RETRIEVAL] scoring doc {doc_idx}/{total_docs}: {doc.get('title', '')[:80]}",
             flush=True,
         )
-        chunks = _chunk_text(doc["full_text"])
-        scored = []
-        llm_calls_used = 0
-
-        for chunk in chunks:
-            kscore = _keyword_score(chunk, goal)
-            if kscore < 0.08:
-                continue
-            if RETRIEVAL_LLM_SCORING and llm_calls_used < MAX_LLM_CHUNKS_PER_DOC:
-                sscore = _semantic_score(chunk, goal, fallback=kscore)
-                llm_calls_used += 1
-                warning = pop_warning()
-                if warning:
-                    state["errors"].append(warning)
-            else:
-                sscore = kscore
-            score = 0.5 * kscore + 0.5 * sscore
-            scored.append((score, chunk))
+        scored_docs.append((doc, _score_doc(doc, goal, state["errors"], gated=gated)))
 
-        scored.sort(key=lambda x: x[0], reverse=True)
+    return _collect_retrieved(state, scored_docs, previous, previous_scores)
 
-        for score, chunk in scored[:4]:
-            retrieved.append(
-                {
-                    "paper_id": doc["paper_id"],
-                    "title": doc["title"],
-                    "url": doc["url"],
-                    "source": doc["source"],
-                    "score": score,
-                    "chunk": chunk,
-                }
-            )
-            top_scores.append(score)
 
-    retrieved.sort(key=lambda item: item["score"], reverse=True)
-    state["retrieved_chunks"] = retrieved[:MAX_CHUNKS]
+async def retrieval_node_async(state):
+    goal = state["goal"]
+    scored_docs = []
 
-    avg_score = sum(top_scores) / len(top_scores) if top_scores else 0.0
-    state["agent_confidences"]["retrieval"] = avg_score
-    return state
+    async def _score(kscore: float, chunk: str, use_llm: bool) -> tuple[float, str, str]:
+        sscore, warning = kscore, ""
+        if use_llm:
+            sscore, warning = await _semantic_score_async(chunk, goal, fallback=kscore)
+        return 0.5 * kscore + 0.5 * sscore, chunk, warning
+
+    docs, previous, previous_scores = _docs_to_score(state)
+    # Index building and batched embedding calls block, so they run off the event loop.
+    gated_by_doc = await asyncio.to_thread(_gated_by_doc, docs, goal, state["errors"], previous)
+    # Every doc's LLM-scored chunks go out together; OLLAMA_MAX_IN_FLIGHT bounds what reaches Ollama.
+    per_doc = [
+        [
+            _score(kscore, chunk, RETRIEVAL_LLM_SCORING and n < MAX_LLM_CHUNKS_PER_DOC)
+            for n, (kscore, chunk) in enumerate(gated)
+        ]
+        for gated in gated_by_doc
+    ]
+    results = await asyncio.gather(*(asyncio.gather(*coros) for coros in per_doc))
+
+    for doc, doc_results in zip(docs, results):
+        scored = []
+        for score, chunk, warning in doc_results:
+            if warning:
+                state["errors"].append(warning)
+            scored.append((score, chunk))
+        scored_docs.append((doc, scored))
+
+    return _collect_retrieved(state, scored_docs, previous, previous_scores)
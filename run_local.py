@@ -1,6 +1,7 @@
 from __future__ import annotations
 
 import argparse
+import asyncio
 import csv
 import json
 import os
@@ -11,9 +12,16 @@ def build_parser() -> argparse.ArgumentParser:
     parser = argparse.ArgumentParser(description="Run multiagentscraper locally from VS Code terminal.")
     parser.add_argument(
         "--goal",
-        required=True,
+        default="",
         help="User extraction goal. Example: 'Extract PROTACs and linkers from 2025 in table format'",
     )
+    parser.add_argument(
+        "--goals-file",
+        default="",
+        help="Batch mode: run every goal in this JSONL or CSV file instead of --goal.",
+    )
+    parser.add_argument("--concurrency", type=int, default=4, help="Batch mode: goals run at the same time.")
+    parser.add_argument("--out-dir", default="batch_results", help="Batch mode: per-goal results and report.json.")
     parser.add_argument("--max-iterations", type=int, default=int(os.getenv("MAX_ITERATIONS", "1")))
     parser.add_argument("--max-papers", type=int, default=int(os.getenv("MAX_PAPERS", "8")))
     parser.add_argument("--max-chunks", type=int, default=int(os.getenv("MAX_CHUNKS", "20")))
@@ -22,8 +30,124 @@ def build_parser() -> argparse.ArgumentParser:
         action="store_true",
         help="Enable LLM semantic scoring for retrieval chunks (slower).",
     )
+    parser.add_argument(
+        "--retrieval-engine",
+        choices=["keyword", "bm25", "embedding", "hybrid"],
+        default=os.getenv("RETRIEVAL_ENGINE", "keyword"),
+        help="Chunk scorer: keyword hit ratio, a BM25F index over all scraped chunks, embedding "
+        "cosine similarity, or a weighted fusion of BM25 and embeddings.",
+    )
+    parser.add_argument(
+        "--retrieval-hybrid-weight",
+        type=float,
+        default=float(os.getenv("RETRIEVAL_HYBRID_WEIGHT", "0.5")),
+        help="Share of the hybrid score taken by embedding similarity (0-1).",
+    )
+    parser.add_argument("--model-embed", default=os.getenv("OLLAMA_MODEL_EMBED", "nomic-embed-text"))
+    parser.add_argument(
+        "--embed-backend",
+        choices=["ollama", "hashing"],
+        default=os.getenv("EMBED_BACKEND", "ollama"),
+        help="Embed with Ollama, or with a local feature-hashing stand-in that needs no model.",
+    )
+    parser.add_argument("--embed-store-dir", default=os.getenv("EMBED_STORE_DIR", ".embed_store"))
+    parser.add_argument(
+        "--no-embed-store",
+        action="store_true",
+        help="Do not load or save chunk embeddings on disk.",
+    )
+    parser.add_argument("--retrieval-min-score", type=float, default=float(os.getenv("RETRIEVAL_MIN_SCORE", "0.08")))
+    parser.add_argument(
+        "--retrieval-per-doc-chunks",
+        type=int,
+        default=int(os.getenv("RETRIEVAL_PER_DOC_CHUNKS", "4")),
+        help="Maximum chunks kept from each document before the global top-k.",
+    )
+    parser.add_argument(
+        "--no-incremental",
+        action="store_true",
+        help="Re-run filter, scrape, retrieval and extraction from scratch on every research iteration.",
+    )
+    parser.add_argument(
+        "--no-near-dup",
+        action="store_true",
+        help="Keep mirrored URLs, near-identical documents and near-identical chunks.",
+    )
+    parser.add_argument(
+        "--simhash-max-distance",
+        type=int,
+        default=int(os.getenv("SIMHASH_MAX_DISTANCE", "3")),
+        help="Scraped documents whose 64-bit SimHashes differ in at most this many bits are dropped as copies.",
+    )
+    parser.add_argument(
+        "--minhash-threshold",
+        type=float,
+        default=float(os.getenv("MINHASH_THRESHOLD", "0.8")),
+        help="Chunks with at least this estimated Jaccard similarity to an earlier chunk are dropped.",
+    )
+    parser.add_argument(
+        "--no-filter-batch",
+        action="store_true",
+        help="Judge filter candidates with one LLM call each instead of batched prompts.",
+    )
+    parser.add_argument("--filter-batch-size", type=int, default=int(os.getenv("FILTER_BATCH_SIZE", "8")))
+    parser.add_argument(
+        "--filter-llm-workers",
+        type=int,
+        default=int(os.getenv("FILTER_LLM_WORKERS", "4")),
+        help="Concurrent per-candidate LLM judgements when a batch answer is incomplete.",
+    )
+    parser.add_argument(
+        "--filter-probe-workers",
+        type=int,
+        default=int(os.getenv("FILTER_PROBE_WORKERS", "8")),
+        help="Number of concurrent URL HEAD probes during filtering.",
+    )
     parser.add_argument("--max-llm-chunks-per-doc", type=int, default=int(os.getenv("MAX_LLM_CHUNKS_PER_DOC", "2")))
     parser.add_argument("--ollama-chat-timeout", type=int, default=int(os.getenv("OLLAMA_CHAT_TIMEOUT_SECONDS", "35")))
+    parser.add_argument(
+        "--ollama-max-in-flight",
+        type=int,
+        default=int(os.getenv("OLLAMA_MAX_IN_FLIGHT", "2")),
+        help="Maximum concurrent chat requests sent to Ollama.",
+    )
+    parser.add_argument(
+        "--num-ctx",
+        type=int,
+        default=int(os.getenv("OLLAMA_NUM_CTX", "4096")),
+        help="Context window (num_ctx) requested from Ollama; the extraction prompt is packed to fit it.",
+    )
+    parser.add_argument(
+        "--extraction-output-tokens",
+        type=int,
+        default=int(os.getenv("EXTRACTION_OUTPUT_TOKENS", "1024")),
+        help="Tokens of the context window kept free for the extraction answer.",
+    )
+    parser.add_argument(
+        "--extraction-context-tokens",
+        type=int,
+        default=int(os.getenv("EXTRACTION_CONTEXT_TOKENS", "0")),
+        help="Fixed token budget for extraction context (0 = derive from --num-ctx).",
+    )
+    parser.add_argument(
+        "--extraction-mode",
+        choices=["single", "map_reduce"],
+        default=os.getenv("EXTRACTION_MODE", "single"),
+        help="One extraction call over all chunks, or one call per chunk batch with the rows merged.",
+    )
+    parser.add_argument(
+        "--extraction-batch-by",
+        choices=["doc", "budget"],
+        default=os.getenv("EXTRACTION_BATCH_BY", "doc"),
+        help="With map_reduce, batch chunks per source document or by --extraction-batch-tokens.",
+    )
+    parser.add_argument("--extraction-batch-tokens", type=int, default=int(os.getenv("EXTRACTION_BATCH_TOKENS", "1500")))
+    parser.add_argument(
+        "--extraction-map-workers",
+        type=int,
+        default=int(os.getenv("EXTRACTION_MAP_WORKERS", "4")),
+        help="Concurrent batch extraction calls; --ollama-max-in-flight still caps what reaches Ollama.",
+    )
     parser.add_argument("--model", default=os.getenv("OLLAMA_MODEL", "llama3.2:3b"))
     parser.add_argument("--model-planner", default=os.getenv("OLLAMA_MODEL_PLANNER", "llama3.2:1b"))
     parser.add_argument("--model-filter", default=os.getenv("OLLAMA_MODEL_FILTER", "llama3.2:1b"))
@@ -33,13 +157,106 @@ def build_parser() -> argparse.ArgumentParser:
     parser.add_argument(
         "--use-playwright",
         action="store_true",
-        help="Enable Playwright fallback scraping (optional, slower).",
+        help="Enable Playwright fallback scraping through a shared headless browser pool.",
+    )
+    parser.add_argument(
+        "--playwright-pool-size",
+        type=int,
+        default=int(os.getenv("PLAYWRIGHT_POOL_SIZE", "3")),
+        help="Number of pages the shared Playwright browser renders concurrently.",
     )
     parser.add_argument(
         "--playwright-first",
         action="store_true",
         help="Try Playwright first, then fallback to requests when blocked/empty.",
     )
+    parser.add_argument(
+        "--scrape-workers",
+        type=int,
+        default=int(os.getenv("SCRAPE_MAX_WORKERS", "8")),
+        help="Number of URLs fetched concurrently during scraping.",
+    )
+    parser.add_argument(
+        "--scrape-per-host",
+        type=int,
+        default=int(os.getenv("SCRAPE_MAX_PER_HOST", "2")),
+        help="Maximum concurrent connections to a single host during scraping.",
+    )
+    parser.add_argument(
+        "--parse-workers",
+        type=int,
+        default=int(os.getenv("PARSE_WORKERS", str(min(4, (os.cpu_count() or 1) - 1)))),
+        help="Worker processes for HTML-to-text parsing of large pages (0 = parse in-process).",
+    )
+    parser.add_argument(
+        "--parse-inline-max-chars",
+        type=int,
+        default=int(os.getenv("PARSE_INLINE_MAX_CHARS", "100000")),
+        help="Pages shorter than this are parsed in-process to avoid IPC overhead.",
+    )
+    parser.add_argument(
+        "--no-page-cache",
+        action="store_true",
+        help="Disable the on-disk page cache and always fetch pages from the network.",
+    )
+    parser.add_argument("--page-cache-dir", default=os.getenv("PAGE_CACHE_DIR", ".page_cache"))
+    parser.add_argument(
+        "--no-llm-cache",
+        action="store_true",
+        help="Disable the persistent cache of temperature-0 LLM responses.",
+    )
+    parser.add_argument(
+        "--llm-cache-bypass",
+        action="store_true",
+        help="Skip cache lookups for this run but still store fresh responses.",
+    )
+    parser.add_argument("--llm-cache-path", default=os.getenv("LLM_CACHE_PATH", ".llm_cache.sqlite3"))
+    parser.add_argument(
+        "--async-mode",
+        action="store_true",
+        help="Run the pipeline on one asyncio event loop with non-blocking HTTP and Ollama clients.",
+    )
+    parser.add_argument(
+        "--streaming",
+        action="store_true",
+        help="Score each document for retrieval as soon as it is scraped instead of after all scrapes.",
+    )
+    parser.add_argument(
+        "--stream-min-chunks",
+        type=int,
+        default=int(os.getenv("STREAM_EXTRACT_MIN_CHUNKS", "0")),
+        help="With --streaming, start extraction once this many chunks reach --stream-min-score (0 = wait for all).",
+    )
+    parser.add_argument("--stream-min-score", type=float, default=float(os.getenv("STREAM_EXTRACT_MIN_SCORE", "0.5")))
+    parser.add_argument(
+        "--stream-deadline",
+        type=float,
+        default=float(os.getenv("STREAM_DEADLINE_SECONDS", "0")),
+        help="With --streaming, start extraction after this many seconds of scraping (0 = no deadline).",
+    )
+    parser.add_argument("--no-metrics", action="store_true", help="Disable per-node timing and I/O metrics.")
+    parser.add_argument(
+        "--metrics-port",
+        type=int,
+        default=int(os.getenv("METRICS_PORT", "0")),
+        help="Serve metrics in Prometheus text format on this port at /metrics (0 = off).",
+    )
+    parser.add_argument("--metrics-prom", default="", help="Also write the metrics in Prometheus text format here.")
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="Sample the pipeline's stacks; writes <profile-out>.collapsed (flamegraph) and <profile-out>.json.",
+    )
+    parser.add_argument("--profile-out", default="profile", help="Path prefix for the profile files.")
+    parser.add_argument(
+        "--profile-interval-ms", type=float, default=float(os.getenv("PROFILE_INTERVAL_MS", "5")), help="Sampling interval."
+    )
+    parser.add_argument("--profile-top", type=int, default=20, help="Hotspots to print and save.")
+    parser.add_argument(
+        "--profile-memory",
+        action="store_true",
+        help="Also record per-node tracemalloc allocation peaks (slows allocation-heavy code).",
+    )
     parser.add_argument("--save-json", default="result.json", help="Path to save full result JSON.")
     parser.add_argument(
         "--save-table",
@@ -75,15 +292,70 @@ def _write_table_csv(path: str, rows: list, columns: list) -> None:
         writer.writerows(rows)
 
 
+def _batch_writer(out_dir: str):
+    # Each finished goal gets the same two files a single run writes.
+    def _write(record: dict, result: dict | None) -> None:
+        if result is None:
+            return
+        with open(Path(out_dir) / f"{record['id']}.json", "w", encoding="utf-8") as handle:
+            json.dump(result, handle, ensure_ascii=False, indent=2)
+        extracted = result.get("extracted_output") if isinstance(result.get("extracted_output"), dict) else {}
+        columns = extracted.get("columns") if isinstance(extracted.get("columns"), list) else []
+        _write_table_csv(str(Path(out_dir) / f"{record['id']}.csv"), _extract_rows(result), columns)
+
+    return _write
+
+
+def _save_profile(profiler, args) -> None:
+    try:
+        from profiler import format_hotspots
+    except ImportError:
+        from .profiler import format_hotspots
+
+    report = profiler.write(args.profile_out, top=max(1, args.profile_top))
+    print(format_hotspots(report, top=max(1, args.profile_top)))
+    print(f"Saved profile to: {report['files']['collapsed']} and {report['files']['summary']}")
+
+
 def main() -> int:
-    args = build_parser().parse_args()
+    parser = build_parser()
+    args = parser.parse_args()
+    if not args.goal and not args.goals_file:
+        parser.error("one of --goal or --goals-file is required")
+    if args.streaming and args.retrieval_engine != "keyword":
+        # The streaming stage scores each page as it lands, so it cannot use corpus-wide scorers.
+        parser.error(f"--streaming only supports --retrieval-engine keyword (got {args.retrieval_engine})")
 
     os.environ["MAX_ITERATIONS"] = str(max(1, args.max_iterations))
     os.environ["MAX_PAPERS"] = str(max(1, args.max_papers))
     os.environ["MAX_CHUNKS"] = str(max(5, args.max_chunks))
     os.environ["RETRIEVAL_LLM_SCORING"] = "1" if args.retrieval_llm_scoring else "0"
     os.environ["MAX_LLM_CHUNKS_PER_DOC"] = str(max(1, args.max_llm_chunks_per_doc))
+    os.environ["RETRIEVAL_ENGINE"] = args.retrieval_engine
+    os.environ["RETRIEVAL_MIN_SCORE"] = str(args.retrieval_min_score)
+    os.environ["RETRIEVAL_PER_DOC_CHUNKS"] = str(max(1, args.retrieval_per_doc_chunks))
+    os.environ["RETRIEVAL_HYBRID_WEIGHT"] = str(min(1.0, max(0.0, args.retrieval_hybrid_weight)))
+    os.environ["OLLAMA_MODEL_EMBED"] = args.model_embed
+    os.environ["EMBED_BACKEND"] = args.embed_backend
+    os.environ["EMBED_STORE_DIR"] = args.embed_store_dir
+    os.environ["EMBED_STORE_ENABLED"] = "0" if args.no_embed_store else "1"
+    os.environ["INCREMENTAL_ITERATIONS"] = "0" if args.no_incremental else "1"
+    os.environ["NEAR_DUP_ENABLED"] = "0" if args.no_near_dup else "1"
+    os.environ["SIMHASH_MAX_DISTANCE"] = str(max(0, min(args.simhash_max_distance, 15)))
+    os.environ["MINHASH_THRESHOLD"] = str(min(1.0, max(0.0, args.minhash_threshold)))
+    os.environ["FILTER_BATCH_SCORING"] = "0" if args.no_filter_batch else "1"
+    os.environ["FILTER_BATCH_SIZE"] = str(max(1, args.filter_batch_size))
+    os.environ["FILTER_PROBE_WORKERS"] = str(max(1, args.filter_probe_workers))
+    os.environ["FILTER_LLM_WORKERS"] = str(max(1, args.filter_llm_workers))
     os.environ["OLLAMA_CHAT_TIMEOUT_SECONDS"] = str(max(10, args.ollama_chat_timeout))
+    os.environ["OLLAMA_MAX_IN_FLIGHT"] = str(max(1, args.ollama_max_in_flight))
+    os.environ["OLLAMA_NUM_CTX"] = str(max(512, args.num_ctx))
+    os.environ["EXTRACTION_OUTPUT_TOKENS"] = str(max(128, args.extraction_output_tokens))
+    os.environ["EXTRACTION_CONTEXT_TOKENS"] = str(max(0, args.extraction_context_tokens))
+    os.environ["EXTRACTION_MODE"] = args.extraction_mode
+    os.environ["EXTRACTION_BATCH_BY"] = args.extraction_batch_by
+    os.environ["EXTRACTION_BATCH_TOKENS"] = str(max(200, args.extraction_batch_tokens))
+    os.environ["EXTRACTION_MAP_WORKERS"] = str(max(1, args.extraction_map_workers))
     os.environ["OLLAMA_MODEL"] = args.model
     os.environ["OLLAMA_MODEL_PLANNER"] = args.model_planner
     os.environ["OLLAMA_MODEL_FILTER"] = args.model_filter
@@ -92,11 +364,48 @@ def main() -> int:
     os.environ["OLLAMA_HOST"] = args.ollama_host
     os.environ["SCRAPE_USE_PLAYWRIGHT"] = "1" if args.use_playwright else "0"
     os.environ["SCRAPE_PLAYWRIGHT_FIRST"] = "1" if args.playwright_first else "0"
+    os.environ["PLAYWRIGHT_POOL_SIZE"] = str(max(1, args.playwright_pool_size))
+    os.environ["SCRAPE_MAX_WORKERS"] = str(max(1, args.scrape_workers))
+    os.environ["SCRAPE_MAX_PER_HOST"] = str(max(1, args.scrape_per_host))
+    os.environ["STREAM_EXTRACT_MIN_CHUNKS"] = str(max(0, args.stream_min_chunks))
+    os.environ["STREAM_EXTRACT_MIN_SCORE"] = str(args.stream_min_score)
+    os.environ["STREAM_DEADLINE_SECONDS"] = str(max(0.0, args.stream_deadline))
+    os.environ["PARSE_WORKERS"] = str(max(0, args.parse_workers))
+    os.environ["PARSE_INLINE_MAX_CHARS"] = str(max(0, args.parse_inline_max_chars))
+    os.environ["PAGE_CACHE_ENABLED"] = "0" if args.no_page_cache else "1"
+    os.environ["PAGE_CACHE_DIR"] = args.page_cache_dir
+    os.environ["LLM_CACHE_ENABLED"] = "0" if args.no_llm_cache else "1"
+    os.environ["LLM_CACHE_BYPASS"] = "1" if args.llm_cache_bypass else "0"
+    os.environ["LLM_CACHE_PATH"] = args.llm_cache_path
+    os.environ["METRICS_ENABLED"] = "0" if args.no_metrics else "1"
+    os.environ["METRICS_PORT"] = str(max(0, args.metrics_port))
 
     try:
-        from multi_agent_runner import run_pipeline
+        from embedding_store import embedding_stats
+        from http_client import connection_stats
+        from llm_cache import cache_stats as llm_cache_stats
+        from llm_dispatcher import dispatcher_stats
+        from metrics import metrics_snapshot, render_prometheus
+        from multi_agent_runner import close_async_resources, run_pipeline, run_pipeline_async
+        from near_dup import near_dup_stats
+        from ollama_health import health_stats
+        from page_cache import cache_stats
+        from parse_pool import parse_stats
+        from batch_runner import BatchRunner, load_goals
+        from profiler import SamplingProfiler
     except ImportError:
-        from .multi_agent_runner import run_pipeline
+        from .embedding_store import embedding_stats
+        from .http_client import connection_stats
+        from .llm_cache import cache_stats as llm_cache_stats
+        from .llm_dispatcher import dispatcher_stats
+        from .metrics import metrics_snapshot, render_prometheus
+        from .multi_agent_runner import close_async_resources, run_pipeline, run_pipeline_async
+        from .near_dup import near_dup_stats
+        from .ollama_health import health_stats
+        from .page_cache import cache_stats
+        from .parse_pool import parse_stats
+        from .batch_runner import BatchRunner, load_goals
+        from .profiler import SamplingProfiler
 
     print("[INFO] Starting pipeline...", flush=True)
     print(
@@ -104,6 +413,7 @@ def main() -> int:
         f"max_iterations={os.environ['MAX_ITERATIONS']} max_papers={os.environ['MAX_PAPERS']} "
         f"max_chunks={os.environ['MAX_CHUNKS']} retrieval_llm={os.environ['RETRIEVAL_LLM_SCORING']} "
         f"playwright={os.environ['SCRAPE_USE_PLAYWRIGHT']} playwright_first={os.environ['SCRAPE_PLAYWRIGHT_FIRST']} "
+        f"scrape_workers={os.environ['SCRAPE_MAX_WORKERS']} scrape_per_host={os.environ['SCRAPE_MAX_PER_HOST']} "
         f"chat_timeout={os.environ['OLLAMA_CHAT_TIMEOUT_SECONDS']}s",
         flush=True,
     )
@@ -115,13 +425,68 @@ def main() -> int:
         flush=True,
     )
 
-    result = run_pipeline(goal=args.goal, max_iterations=max(1, args.max_iterations), verbose=True)
+    profiler = None
+    if args.profile:
+        profiler = SamplingProfiler(interval_ms=args.profile_interval_ms, memory=args.profile_memory).start()
+
+    if args.goals_file:
+        goals = load_goals(args.goals_file)
+        print(f"[BATCH] {len(goals)} goals from {args.goals_file} concurrency={max(1, args.concurrency)}", flush=True)
+        runner = BatchRunner(
+            out_dir=args.out_dir,
+            concurrency=args.concurrency,
+            max_iterations=args.max_iterations,
+            async_mode=args.async_mode,
+            streaming=args.streaming,
+            on_result=_batch_writer(args.out_dir),
+        )
+        try:
+            report = runner.run(goals)
+        finally:
+            if profiler is not None:
+                profiler.stop()
+        print(json.dumps({key: value for key, value in report.items() if key != "metrics"}, ensure_ascii=False, indent=2))
+        print(f"Saved batch results and report to: {args.out_dir}")
+        if profiler is not None:
+            _save_profile(profiler, args)
+        return 0 if not report["failed"] else 1
+
+    try:
+        if args.async_mode:
+            async def _run_async():
+                try:
+                    return await run_pipeline_async(
+                        goal=args.goal,
+                        max_iterations=max(1, args.max_iterations),
+                        verbose=True,
+                        streaming=args.streaming,
+                    )
+                finally:
+                    await close_async_resources()
+
+            result = asyncio.run(_run_async())
+        else:
+            result = run_pipeline(
+                goal=args.goal,
+                max_iterations=max(1, args.max_iterations),
+                verbose=True,
+                streaming=args.streaming,
+            )
+    finally:
+        if profiler is not None:
+            profiler.stop()
 
     extracted = result.get("extracted_output") if isinstance(result.get("extracted_output"), dict) else {}
     columns = extracted.get("columns") if isinstance(extracted.get("columns"), list) else []
     table_rows = _extract_rows(result)
     rows = len(table_rows)
 
+    pack = result.get("context_pack") or {}
+    metrics = metrics_snapshot()
+    result["metrics"] = metrics
+    http_stats = connection_stats()
+    page_stats = cache_stats()
+    llm_stats = llm_cache_stats()
     summary = {
         "goal": result.get("goal"),
         "search_query": result.get("search_query"),
@@ -129,6 +494,39 @@ def main() -> int:
         "rows": rows,
         "iterations_used": result.get("iteration"),
         "errors": result.get("errors", [])[:5],
+        "iterations": result.get("iteration_stats", []),
+        "context_pack": {
+            "batches": pack.get("batches", 1),
+            "budget_tokens": pack.get("budget_tokens", 0),
+            "used_tokens": pack.get("used_tokens", 0),
+            "packed": len(pack.get("packed", [])),
+            "dropped": len(pack.get("dropped", [])),
+        },
+        "http": {
+            "requests": http_stats["requests"],
+            "new_connections": http_stats["new_connections"],
+            "reused_connections": http_stats["reused_connections"],
+        },
+        "page_cache": {
+            "hits": page_stats["hits"],
+            "misses": page_stats["misses"],
+            "revalidated": page_stats["revalidated"],
+            "bytes_saved": page_stats["bytes_saved"],
+        },
+        "llm_cache": {
+            "hits": llm_stats["memory_hits"] + llm_stats["disk_hits"],
+            "misses": llm_stats["misses"],
+            "hit_rate": round(llm_stats["hit_rate"], 3),
+        },
+        "near_dup": near_dup_stats(),
+        "parse_pool": parse_stats(),
+        "embeddings": embedding_stats(),
+        "ollama_health": health_stats(),
+        "llm_dispatcher": dispatcher_stats(),
+        "node_seconds": {
+            name: {"wall": node["wall_seconds"], "cpu": node["cpu_seconds"], "calls": node["calls"]}
+            for name, node in metrics["nodes"].items()
+        },
     }
     print(json.dumps(summary, ensure_ascii=False, indent=2))
 
@@ -138,6 +536,14 @@ def main() -> int:
             json.dump(result, handle, ensure_ascii=False, indent=2)
         print(f"Saved full result to: {args.save_json}")
 
+    if args.metrics_prom:
+        Path(args.metrics_prom).parent.mkdir(parents=True, exist_ok=True)
+        Path(args.metrics_prom).write_text(render_prometheus(), encoding="utf-8")
+        print(f"Saved Prometheus metrics to: {args.metrics_prom}")
+
+    if profiler is not None:
+        _save_profile(profiler, args)
+
     if args.save_table:
         _write_table_csv(args.save_table, table_rows, columns)
         print(f"Saved table output to: {args.save_table}")
@@ -0,0 +1,61 @@
+from __future__ import annotations
+
+import hashlib
+import os
+from typing import Any, Callable, Dict, Iterable, List, TypeVar
+
+
+# With incremental iterations a research_more loop only fetches, judges, chunks and extracts
+# URLs that earlier iterations have not handled, and merges the results into the state.
+INCREMENTAL_ITERATIONS = os.getenv("INCREMENTAL_ITERATIONS", "1") == "1"
+
+T = TypeVar("T")
+
+
+def incremental() -> bool:
+    return os.getenv("INCREMENTAL_ITERATIONS", "1" if INCREMENTAL_ITERATIONS else "0") == "1"
+
+
+def paper_url(paper: Dict[str, Any]) -> str:
+    return str(paper.get("html_link", "")).strip()
+
+
+def doc_url(doc: Dict[str, Any]) -> str:
+    return str(doc.get("url", "")).strip()
+
+
+def chunk_key(item: Dict[str, Any]) -> str:
+    digest = hashlib.sha1(str(item.get("chunk", "")).encode("utf-8")).hexdigest()[:16]
+    return f"{item.get('url', '')}#{digest}"
+
+
+def record_stage(state, stage: str, processed: int, skipped: int) -> None:
+    stats = state["iteration_stats"]
+    if not stats or stats[-1].get("iteration") != state["iteration"]:
+        stats.append({"iteration": state["iteration"]})
+    stats[-1][stage] = {"processed": processed, "skipped": skipped}
+
+
+def unseen(state, stage: str, items: Iterable[T], key: Callable[[T], str]) -> List[T]:
+    # The registry maps each key to the iteration that first got it through `stage`.
+    items = list(items)
+    if incremental():
+        done = state["run_registry"].get(stage, {})
+        fresh = [item for item in items if key(item) not in done]
+    else:
+        fresh = items
+    record_stage(state, stage, processed=len(fresh), skipped=len(items) - len(fresh))
+    return fresh
+
+
+def mark_done(state, stage: str, items: Iterable[T], key: Callable[[T], str]) -> None:
+    if not incremental():
+        return
+    done = state["run_registry"].setdefault(stage, {})
+    for item in items:
+        done.setdefault(key(item), state["iteration"])
+
+
+def carried(state, field: str) -> List[Any]:
+    # Results of earlier iterations that new work is merged into; empty when not incremental.
+    return list(state[field]) if incremental() else []
@@ -1,16 +1,39 @@
 from __future__ import annotations
 
+import asyncio
 import os
-import re
-from typing import List
+import threading
+import weakref
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, List, Optional
+from urllib.parse import urlparse
 
-import requests
-from bs4 import BeautifulSoup
+try:
+    import near_dup
+    import page_cache
+    from async_http import async_http_get
+    from browser_pool import get_browser_pool
+    from http_client import http_get
+    from metrics import carry_context
+    from parse_pool import clean_text
+    from run_registry import carried, mark_done, paper_url, unseen
+    from single_flight import SingleFlight
+except ImportError:
+    from . import near_dup, page_cache
+    from .async_http import async_http_get
+    from .browser_pool import get_browser_pool
+    from .http_client import http_get
+    from .metrics import carry_context
+    from .parse_pool import clean_text
+    from .run_registry import carried, mark_done, paper_url, unseen
+    from .single_flight import SingleFlight
 
 
 HEADERS = {"User-Agent": "Mozilla/5.0"}
 SCRAPE_USE_PLAYWRIGHT = os.getenv("SCRAPE_USE_PLAYWRIGHT", "0") == "1"
 SCRAPE_PLAYWRIGHT_FIRST = os.getenv("SCRAPE_PLAYWRIGHT_FIRST", "0") == "1"
+SCRAPE_MAX_WORKERS = max(1, int(os.getenv("SCRAPE_MAX_WORKERS", "8")))
+SCRAPE_MAX_PER_HOST = max(1, int(os.getenv("SCRAPE_MAX_PER_HOST", "2")))
 
 BLOCK_MARKERS = [
     "captcha",
@@ -20,50 +43,83 @@ BLOCK_MARKERS = [
     "forbidden",
     "cf-challenge",
 ]
+# Goals running side by side in one process often hit the same URLs.
+_PAGE_FLIGHT = SingleFlight("page")
 
 
 def _clean_full_text(html: str) -> str:
-    soup = BeautifulSoup(html, "html.parser")
+    return clean_text(html)
 
-    for tag in soup(["script", "style", "nav", "footer", "header", "form", "noscript", "svg"]):
-        tag.decompose()
 
-    parts: List[str] = []
-    for tag in soup.find_all(["p", "li", "h1", "h2", "h3", "h4"]):
-        text = re.sub(r"\s+", " ", tag.get_text(" ", strip=True)).strip()
-        if len(text) >= 40:
-            parts.append(text)
+def _cached_page(url: str):
+    cached = page_cache.lookup(url)
+    if cached and cached["fresh"]:
+        page_cache.record("hits", len(cached["html"]))
+    return cached
 
-    return "\n".join(parts)
+
+def _page_from_response(url: str, cached, status_code: int, headers, text: str) -> str:
+    if status_code == 304 and cached:
+        page_cache.mark_revalidated(url)
+        page_cache.record("revalidated", len(cached["html"]))
+        return cached["html"]
+    if status_code == 200 and "text/html" in headers.get("content-type", ""):
+        page_cache.record("misses")
+        page_cache.store(
+            url,
+            text,
+            etag=headers.get("etag", ""),
+            last_modified=headers.get("last-modified", ""),
+        )
+        return text
+    return ""
 
 
 def _fetch_requests(url: str) -> str:
+    return _PAGE_FLIGHT.do(url, lambda: _fetch_requests_once(url))
+
+
+async def _fetch_requests_async(url: str) -> str:
+    return await _PAGE_FLIGHT.do_async(url, lambda: _fetch_requests_once_async(url))
+
+
+def _fetch_requests_once(url: str) -> str:
+    cached = _cached_page(url)
+    if cached and cached["fresh"]:
+        return cached["html"]
+
     try:
-        response = requests.get(url, headers=HEADERS, timeout=15)
-        if response.status_code == 200 and "text/html" in response.headers.get("content-type", ""):
-            return response.text
+        headers = dict(HEADERS)
+        headers.update(page_cache.conditional_headers(cached))
+        response = http_get(url, headers=headers, timeout=15)
+        return _page_from_response(url, cached, response.status_code, response.headers, response.text)
     except Exception:
         return ""
-    return ""
 
 
-def _fetch_playwright(url: str) -> str:
+async def _fetch_requests_once_async(url: str) -> str:
+    # The page cache reads and writes SQLite and blob files; that runs in a worker thread so
+    # other fetches on the loop are not held up behind the disk.
+    cached = await asyncio.to_thread(_cached_page, url)
+    if cached and cached["fresh"]:
+        return cached["html"]
+
     try:
-        from playwright.sync_api import sync_playwright
+        headers = dict(HEADERS)
+        headers.update(page_cache.conditional_headers(cached))
+        response = await async_http_get(url, headers=headers, timeout=15)
+        return await asyncio.to_thread(
+            _page_from_response, url, cached, response.status_code, response.headers, response.text
+        )
     except Exception:
         return ""
 
-    try:
-        with sync_playwright() as playwright:
-            browser = playwright.chromium.launch(headless=True)
-            page = browser.new_page()
-            page.goto(url, timeout=20000, wait_until="domcontentloaded")
-            page.wait_for_timeout(700)
-            html = page.content()
-            browser.close()
-            return html
-    except Exception:
+
+def _fetch_playwright(url: str) -> str:
+    pool = get_browser_pool()
+    if pool is None:
         return ""
+    return pool.render(url)
 
 
 def _looks_blocked(html: str) -> bool:
@@ -73,42 +129,155 @@ def _looks_blocked(html: str) -> bool:
     return any(marker in lowered for marker in BLOCK_MARKERS)
 
 
-def scrape_node(state):
-    docs = []
+# One per process, like the HTTP pool, so every goal in a batch or the service counts against
+# the same SCRAPE_MAX_PER_HOST cap. Coroutines get asyncio semaphores of the same size per event
+# loop; all goals of an async batch share one loop.
+class _HostLimiter:
+    def __init__(self, per_host: int):
+        self.per_host = per_host
+        self._lock = threading.Lock()
+        self._semaphores: Dict[str, threading.BoundedSemaphore] = {}
+        self._async: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[str, asyncio.Semaphore]]" = (
+            weakref.WeakKeyDictionary()
+        )
+
+    def get(self, url: str) -> threading.BoundedSemaphore:
+        host = (urlparse(url).netloc or "").lower()
+        with self._lock:
+            semaphore = self._semaphores.get(host)
+            if semaphore is None:
+                semaphore = threading.BoundedSemaphore(self.per_host)
+                self._semaphores[host] = semaphore
+            return semaphore
+
+    def get_async(self, url: str) -> asyncio.Semaphore:
+        host = (urlparse(url).netloc or "").lower()
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            semaphores = self._async.setdefault(loop, {})
+            semaphore = semaphores.get(host)
+            if semaphore is None:
+                semaphore = asyncio.Semaphore(self.per_host)
+                semaphores[host] = semaphore
+            return semaphore
+
+
+_HOST_LIMITER: _HostLimiter | None = None
+_HOST_LIMITER_LOCK = threading.Lock()
+
+
+def get_host_limiter(per_host: int) -> _HostLimiter:
+    # A changed SCRAPE_MAX_PER_HOST starts a new limiter; fetches already holding a slot finish on the old one.
+    global _HOST_LIMITER
+    with _HOST_LIMITER_LOCK:
+        if _HOST_LIMITER is None or _HOST_LIMITER.per_host != per_host:
+            _HOST_LIMITER = _HostLimiter(per_host)
+        return _HOST_LIMITER
+
+
+def _fetch_html(url: str, use_playwright: bool, playwright_first: bool) -> str:
+    if use_playwright and playwright_first:
+        html = _fetch_playwright(url)
+        if _looks_blocked(html):
+            html = _fetch_requests(url)
+    else:
+        html = _fetch_requests(url)
+        if (not html or _looks_blocked(html)) and use_playwright:
+            html = _fetch_playwright(url)
+    return html
+
+
+def _build_doc(paper: dict, url: str, html: str) -> Optional[dict]:
+    if not html:
+        return None
+
+    full_text = _clean_full_text(html)
+    if len(full_text) < 600:
+        return None
+
+    return {
+        "paper_id": paper.get("id"),
+        "title": paper.get("title", ""),
+        "source": paper.get("source", "arxiv"),
+        "url": url,
+        "full_text": full_text,
+        "char_count": len(full_text),
+    }
+
+
+def _scrape_paper(paper: dict, use_playwright: bool, playwright_first: bool, limiter: _HostLimiter) -> Optional[dict]:
+    url = paper.get("html_link", "")
+
+    with limiter.get(url):
+        html = _fetch_html(url, use_playwright, playwright_first)
+
+    return _build_doc(paper, url, html)
+
+
+async def _fetch_html_async(url: str, use_playwright: bool, playwright_first: bool) -> str:
+    # The browser pool runs on its own loop thread; waiting on it from a worker thread keeps this loop free.
+    if use_playwright and playwright_first:
+        html = await asyncio.to_thread(_fetch_playwright, url)
+        if _looks_blocked(html):
+            html = await _fetch_requests_async(url)
+    else:
+        html = await _fetch_requests_async(url)
+        if (not html or _looks_blocked(html)) and use_playwright:
+            html = await asyncio.to_thread(_fetch_playwright, url)
+    return html
+
+
+async def _scrape_paper_async(
+    paper: dict,
+    use_playwright: bool,
+    playwright_first: bool,
+    workers: asyncio.Semaphore,
+    limiter: _HostLimiter,
+) -> Optional[dict]:
+    url = paper.get("html_link", "")
+
+    async with workers, limiter.get_async(url):
+        html = await _fetch_html_async(url, use_playwright, playwright_first)
+
+    return await asyncio.to_thread(_build_doc, paper, url, html)
+
+
+def _scrape_settings():
     use_playwright = os.getenv("SCRAPE_USE_PLAYWRIGHT", "0") == "1"
     playwright_first = os.getenv("SCRAPE_PLAYWRIGHT_FIRST", "0") == "1"
+    max_workers = max(1, int(os.getenv("SCRAPE_MAX_WORKERS", str(SCRAPE_MAX_WORKERS))))
+    per_host = max(1, int(os.getenv("SCRAPE_MAX_PER_HOST", str(SCRAPE_MAX_PER_HOST))))
+    return use_playwright, playwright_first, max_workers, per_host
 
-    for paper in state["filtered_papers"]:
-        url = paper.get("html_link", "")
 
-        html = ""
-        if use_playwright and playwright_first:
-            html = _fetch_playwright(url)
-            if _looks_blocked(html):
-                html = _fetch_requests(url)
-        else:
-            html = _fetch_requests(url)
-            if (not html or _looks_blocked(html)) and use_playwright:
-                html = _fetch_playwright(url)
-
-        if not html:
-            continue
-
-        full_text = _clean_full_text(html)
-        if len(full_text) < 600:
-            continue
-
-        docs.append(
-            {
-                "paper_id": paper.get("id"),
-                "title": paper.get("title", ""),
-                "source": paper.get("source", "arxiv"),
-                "url": url,
-                "full_text": full_text,
-                "char_count": len(full_text),
-            }
-        )
+def _papers_to_scrape(state) -> List[dict]:
+    # A URL that was fetched in an earlier iteration, or failed to yield a document, is not retried.
+    return unseen(state, "scrape", state["filtered_papers"], paper_url)
 
+
+def _drop_near_duplicates(docs: List[dict], index) -> List[dict]:
+    # The same paper on a publisher site, PubMed and PMC, or a syndicated press release, only
+    # needs to be chunked and scored once; the first copy in filter order is kept.
+    if index is None:
+        return docs
+    unique = [doc for doc in docs if not index.add(doc["full_text"])]
+    near_dup.record("docs_dropped", len(docs) - len(unique))
+    return unique
+
+
+def _doc_index(previous: List[dict]):
+    index = near_dup.new_doc_index()
+    if index is not None:
+        for doc in previous:
+            index.add(doc["full_text"])
+    return index
+
+
+def _finish_scrape(state, docs: List[dict], use_playwright: bool, playwright_first: bool, deduped: bool = False):
+    previous = carried(state, "scraped_docs")
+    if not deduped:
+        docs = _drop_near_duplicates(docs, _doc_index(previous))
+    docs = previous + docs
     state["scraped_docs"] = docs
 
     if docs:
@@ -124,3 +293,52 @@ def scrape_node(state):
     else:
         state["agent_confidences"]["scrape_mode"] = 0.9
     return state
+
+
+def scrape_node(state):
+    use_playwright, playwright_first, max_workers, per_host = _scrape_settings()
+
+    papers = _papers_to_scrape(state)
+    mark_done(state, "scrape", papers, paper_url)
+    limiter = get_host_limiter(per_host)
+    results: List[Optional[dict]] = [None] * len(papers)
+
+    if papers:
+        # Results land in their original slot so scraped_docs order does not depend on fetch timing.
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(papers))) as executor:
+            futures = {
+                executor.submit(carry_context(_scrape_paper), paper, use_playwright, playwright_first, limiter): idx
+                for idx, paper in enumerate(papers)
+            }
+            for future in as_completed(futures):
+                try:
+                    results[futures[future]] = future.result()
+                except Exception as exc:
+                    state["errors"].append(f"scrape-failed: {type(exc).__name__}: {exc}")
+
+    docs = [doc for doc in results if doc is not None]
+    return _finish_scrape(state, docs, use_playwright, playwright_first)
+
+
+async def scrape_node_async(state):
+    use_playwright, playwright_first, max_workers, per_host = _scrape_settings()
+
+    papers = _papers_to_scrape(state)
+    mark_done(state, "scrape", papers, paper_url)
+    workers = asyncio.Semaphore(max_workers)
+    limiter = get_host_limiter(per_host)
+    results = await asyncio.gather(
+        *(
+            _scrape_paper_async(paper, use_playwright, playwright_first, workers, limiter)
+            for paper in papers
+        ),
+        return_exceptions=True,
+    )
+
+    docs = []
+    for result in results:
+        if isinstance(result, BaseException):
+            state["errors"].append(f"scrape-failed: {type(result).__name__}: {result}")
+        elif result is not None:
+            docs.append(result)
+    return _finish_scrape(state, docs, use_playwright, playwright_first)
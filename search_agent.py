@@ -4,9 +4,13 @@ import os
 from typing import Dict, List
 
 try:
-    from duckduckgo_search import search_duckduckgo
+    import near_dup
+    from duckduckgo_search import search_duckduckgo, search_duckduckgo_async
+    from run_registry import carried, mark_done, paper_url, unseen
 except ImportError:
-    from .duckduckgo_search import search_duckduckgo
+    from . import near_dup
+    from .duckduckgo_search import search_duckduckgo, search_duckduckgo_async
+    from .run_registry import carried, mark_done, paper_url, unseen
 
 
 MAX_PAPERS = max(1, int(os.getenv("MAX_PAPERS", "12")))
@@ -23,12 +27,44 @@ def _dedupe_by_title(papers: List[Dict]) -> List[Dict]:
         deduped.append(paper)
     return deduped
 
+
+def _dedupe_by_url(papers: List[Dict]) -> List[Dict]:
+    # Tracking parameters and fragments are stripped from the fetched URL; the dedupe key also
+    # ignores scheme, "www." and trailing slashes, so mirrors of one address are fetched once.
+    if not near_dup.is_enabled():
+        return papers
+    deduped = []
+    seen = set()
+    for paper in papers:
+        url = near_dup.strip_tracking(str(paper.get("html_link", "")))
+        key = near_dup.canonical_url(url)
+        if key in seen:
+            continue
+        seen.add(key)
+        deduped.append({**paper, "html_link": url})
+    near_dup.record("urls_dropped", len(papers) - len(deduped))
+    return deduped
+
+
+def _apply_results(state, web_results: List[Dict]):
+    merged = _dedupe_by_url(_dedupe_by_title(web_results))[:MAX_PAPERS]
+    fresh = unseen(state, "search", merged, paper_url)
+    mark_done(state, "search", fresh, paper_url)
+
+    state["candidate_papers"] = _dedupe_by_url(_dedupe_by_title(carried(state, "candidate_papers") + fresh))
+    state["agent_confidences"]["search"] = min(len(merged) / float(MAX_PAPERS), 1.0)
+    return state
+
+
 def search_node(state):
     query = state["search_query"]
 
     web_results = search_duckduckgo(query, max_results=MAX_PAPERS)
-    merged = _dedupe_by_title(web_results)[:MAX_PAPERS]
+    return _apply_results(state, web_results)
 
-    state["candidate_papers"] = merged
-    state["agent_confidences"]["search"] = min(len(merged) / float(MAX_PAPERS), 1.0)
-    return state
+
+async def search_node_async(state):
+    query = state["search_query"]
+
+    web_results = await search_duckduckgo_async(query, max_results=MAX_PAPERS)
+    return _apply_results(state, web_results)
@@ -0,0 +1,457 @@
+from __future__ import annotations
+
+import argparse
+import csv
+import io
+import json
+import os
+import queue
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List
+from urllib.parse import parse_qs, urlparse
+
+try:
+    from browser_pool import shutdown_browser_pool
+    from embedding_store import EMBED_MODEL
+    from extraction_agent import EXTRACTION_MODEL
+    from filter_agent import FILTER_MODEL
+    from http_client import connection_stats
+    from llm_cache import cache_stats as llm_cache_stats
+    from llm_client import OLLAMA_HOST, preload_models
+    from llm_dispatcher import dispatcher_stats
+    from metrics import render_prometheus
+    from multi_agent_runner import build_app
+    from ollama_health import OPEN, get_health
+    from page_cache import cache_stats
+    from parse_pool import shutdown_parse_pool, warm_parse_pool
+    from planner_agent import PLANNER_MODEL
+    from retrieval_agent import RETRIEVAL_ENGINE, RETRIEVAL_MODEL
+    from single_flight import single_flight_stats
+    from state import make_initial_state
+except ImportError:
+    from .browser_pool import shutdown_browser_pool
+    from .embedding_store import EMBED_MODEL
+    from .extraction_agent import EXTRACTION_MODEL
+    from .filter_agent import FILTER_MODEL
+    from .http_client import connection_stats
+    from .llm_cache import cache_stats as llm_cache_stats
+    from .llm_client import OLLAMA_HOST, preload_models
+    from .llm_dispatcher import dispatcher_stats
+    from .metrics import render_prometheus
+    from .multi_agent_runner import build_app
+    from .ollama_health import OPEN, get_health
+    from .page_cache import cache_stats
+    from .parse_pool import shutdown_parse_pool, warm_parse_pool
+    from .planner_agent import PLANNER_MODEL
+    from .retrieval_agent import RETRIEVAL_ENGINE, RETRIEVAL_MODEL
+    from .single_flight import single_flight_stats
+    from .state import make_initial_state
+
+
+SERVICE_WORKERS = max(1, int(os.getenv("SERVICE_WORKERS", "2")))
+# Jobs waiting beyond this are refused with 429 instead of queueing without bound.
+SERVICE_QUEUE_SIZE = max(1, int(os.getenv("SERVICE_QUEUE_SIZE", "32")))
+SERVICE_MAX_ITERATIONS = max(1, int(os.getenv("SERVICE_MAX_ITERATIONS", "3")))
+SERVICE_MAX_GOAL_CHARS = max(16, int(os.getenv("SERVICE_MAX_GOAL_CHARS", "2000")))
+# Finished jobs kept for polling; the oldest are forgotten first.
+SERVICE_MAX_JOBS = max(1, int(os.getenv("SERVICE_MAX_JOBS", "500")))
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+# What a finished job keeps of its final state. Candidate papers, scraped documents and chunks
+# are dropped so SERVICE_MAX_JOBS retained jobs cost kilobytes each, not megabytes.
+RESULT_FIELDS = ("extracted_output", "extracted_items", "errors", "iteration", "global_confidence", "context_pack")
+
+
+def _rows(state: Dict[str, Any]) -> tuple[List[str], List[Dict[str, Any]]]:
+    extracted = state.get("extracted_output") if isinstance(state.get("extracted_output"), dict) else {}
+    columns = extracted.get("columns") if isinstance(extracted.get("columns"), list) else []
+    rows = extracted.get("rows") if isinstance(extracted.get("rows"), list) else None
+    if rows is None:
+        rows = [item for item in state.get("extracted_items") or [] if isinstance(item, dict)]
+    return columns, rows
+
+
+def _event(node: str, state: Dict[str, Any], elapsed: float) -> Dict[str, Any]:
+    event = {
+        "node": node,
+        "elapsed_seconds": round(elapsed, 3),
+        "iteration": state.get("iteration", 0),
+        "search_query": state.get("search_query", ""),
+        "candidates": len(state.get("candidate_papers") or []),
+        "filtered": len(state.get("filtered_papers") or []),
+        "scraped": len(state.get("scraped_docs") or []),
+        "chunks": len(state.get("retrieved_chunks") or []),
+    }
+    if node == "extraction":
+        # Rows are partial results: later iterations can still add to them.
+        event["columns"], event["rows"] = _rows(state)
+    if node == "evaluate":
+        event["global_confidence"] = state.get("global_confidence", 0.0)
+    return event
+
+
+class Job:
+    def __init__(self, goal: str, max_iterations: int):
+        self.id = uuid.uuid4().hex[:12]
+        self.goal = goal
+        self.max_iterations = max_iterations
+        self.status = QUEUED
+        self.created = time.time()
+        self.started = 0.0
+        self.finished = 0.0
+        self.events: List[Dict[str, Any]] = []
+        self.result: Dict[str, Any] | None = None
+        self.error = ""
+        self.changed = threading.Condition()
+
+    def add_event(self, event: Dict[str, Any]) -> None:
+        with self.changed:
+            self.events.append(event)
+            self.changed.notify_all()
+
+    def finish(self, status: str, result: Dict[str, Any] | None, error: str = "") -> None:
+        with self.changed:
+            self.status = status
+            self.result = None if result is None else {key: result[key] for key in RESULT_FIELDS if key in result}
+            self.error = error
+            self.finished = time.time()
+            self.changed.notify_all()
+
+    def summary(self) -> Dict[str, Any]:
+        with self.changed:
+            summary = {
+                "id": self.id,
+                "goal": self.goal,
+                "status": self.status,
+                "created": self.created,
+                "queue_seconds": round((self.started or time.time()) - self.created, 3),
+                "run_seconds": round((self.finished or time.time()) - self.started, 3) if self.started else 0.0,
+                "events": [{k: v for k, v in event.items() if k != "rows"} for event in self.events],
+            }
+            if self.result is not None:
+                columns, rows = _rows(self.result)
+                summary.update(
+                    {
+                        "rows": len(rows),
+                        "columns": columns,
+                        "global_confidence": self.result.get("global_confidence"),
+                        "iterations_used": self.result.get("iteration"),
+                        "warnings": self.result.get("errors", [])[:5],
+                    }
+                )
+            if self.error:
+                summary["error"] = self.error
+        return summary
+
+
+class AdmissionError(Exception):
+    def __init__(self, status: int, message: str, retry_after: int = 0):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+
+
+# Keeps everything warm for the life of the process: one compiled graph, the parse pool, the
+# HTTP pools and caches, and the Ollama models (preloaded, held by OLLAMA_KEEP_ALIVE). A bounded
+# queue feeds a fixed set of worker threads; a full queue or an open Ollama circuit breaker
+# refuses new jobs up front rather than letting them time out later.
+class JobService:
+    def __init__(
+        self,
+        workers: int = SERVICE_WORKERS,
+        queue_size: int = SERVICE_QUEUE_SIZE,
+        streaming: bool = False,
+    ):
+        self.workers = max(1, workers)
+        self._queue: "queue.Queue[Job | None]" = queue.Queue(maxsize=max(1, queue_size))
+        self._jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._threads: List[threading.Thread] = []
+        self._run_seconds: List[float] = []
+        self._counters = {"submitted": 0, "rejected_full": 0, "rejected_unhealthy": 0, "done": 0, "failed": 0}
+        self.models: Dict[str, str] = {}
+        warm_parse_pool()
+        self.app = build_app(streaming=streaming)
+
+    def start(self, preload: bool = True) -> "JobService":
+        if preload:
+            threading.Thread(target=self._preload, name="model-preload", daemon=True).start()
+        for idx in range(self.workers):
+            thread = threading.Thread(target=self._work, name=f"job-worker-{idx}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        return self
+
+    def _preload(self) -> None:
+        # The agents' own model names, so OLLAMA_MODEL and the per-agent overrides are honoured.
+        # The embedding model is only loaded when the retrieval engine uses it.
+        embed = [EMBED_MODEL] if RETRIEVAL_ENGINE in ("embedding", "hybrid") else []
+        self.models = preload_models([PLANNER_MODEL, FILTER_MODEL, RETRIEVAL_MODEL, EXTRACTION_MODEL], embed)
+        print(f"[SERVICE] models: {self.models}", flush=True)
+
+    def _retry_after(self) -> int:
+        with self._lock:
+            recent = self._run_seconds[-20:]
+        typical = sum(recent) / len(recent) if recent else 30.0
+        return max(1, int(typical * (self._queue.qsize() + 1) / self.workers))
+
+    def submit(self, goal: str, max_iterations: int) -> Job:
+        if get_health(OLLAMA_HOST).stats()["state"] == OPEN:
+            with self._lock:
+                self._counters["rejected_unhealthy"] += 1
+            raise AdmissionError(503, "ollama unavailable (circuit open)", retry_after=10)
+        job = Job(goal, max(1, min(max_iterations, SERVICE_MAX_ITERATIONS)))
+        try:
+            self._queue.put_nowait(job)
+        except queue.Full:
+            with self._lock:
+                self._counters["rejected_full"] += 1
+            raise AdmissionError(429, "job queue is full", retry_after=self._retry_after()) from None
+        with self._lock:
+            self._counters["submitted"] += 1
+            self._jobs[job.id] = job
+            self._forget_old()
+        return job
+
+    def _forget_old(self) -> None:
+        finished = [job_id for job_id, job in self._jobs.items() if job.status in (DONE, FAILED)]
+        for job_id in finished[: max(0, len(self._jobs) - SERVICE_MAX_JOBS)]:
+            del self._jobs[job_id]
+
+    def get(self, job_id: str) -> Job | None:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def _work(self) -> None:
+        while True:
+            job = self._queue.get()
+            if job is None:
+                return
+            self._run(job)
+
+    def _run(self, job: Job) -> None:
+        job.status = RUNNING
+        job.started = time.time()
+        state = make_initial_state(goal=job.goal, max_iterations=job.max_iterations)
+        final_state = state
+        try:
+            for event in self.app.stream(state):
+                if not isinstance(event, dict):
+                    continue
+                for node_name, node_state in event.items():
+                    if node_name == "__end__" or not isinstance(node_state, dict):
+                        continue
+                    final_state = node_state
+                    job.add_event(_event(node_name, node_state, time.time() - job.started))
+        except Exception as exc:
+            job.finish(FAILED, final_state, f"{type(exc).__name__}: {exc}")
+        else:
+            job.finish(DONE, final_state)
+        with self._lock:
+            self._counters["failed" if job.status == FAILED else "done"] += 1
+            self._run_seconds = self._run_seconds[-99:] + [job.finished - job.started]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            counters = dict(self._counters)
+            runs = sorted(self._run_seconds)
+            running = sum(1 for job in self._jobs.values() if job.status == RUNNING)
+        http_stats = connection_stats()
+        page_stats = cache_stats()
+        llm_stats = llm_cache_stats()
+        return {
+            **counters,
+            "workers": self.workers,
+            "running": running,
+            "queued": self._queue.qsize(),
+            "queue_size": self._queue.maxsize,
+            "run_seconds_p50": round(runs[len(runs) // 2], 3) if runs else None,
+            "models": self.models,
+            "ollama": get_health(OLLAMA_HOST).stats(),
+            "llm_dispatcher": dispatcher_stats(),
+            "single_flight": single_flight_stats(),
+            "http": {"requests": http_stats["requests"], "reused_connections": http_stats["reused_connections"]},
+            "page_cache": {"hits": page_stats["hits"], "misses": page_stats["misses"]},
+            "llm_cache": {"hits": llm_stats["memory_hits"] + llm_stats["disk_hits"], "misses": llm_stats["misses"]},
+        }
+
+    def shutdown(self) -> None:
+        for _ in self._threads:
+            self._queue.put(None)
+        for thread in self._threads:
+            thread.join(timeout=5)
+        shutdown_browser_pool()
+        shutdown_parse_pool()
+
+
+class _ServiceHandler(BaseHTTPRequestHandler):
+    server_version = "MultiAgentScraper/1.0"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status: int, body: str, content_type: str, headers: Dict[str, str] | None = None) -> None:
+        payload = body.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(payload)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _json(self, status: int, payload: Any, headers: Dict[str, str] | None = None) -> None:
+        self._send(status, json.dumps(payload, ensure_ascii=False), "application/json", headers)
+
+    def _job(self, job_id: str) -> Job | None:
+        job = self.server.service.get(job_id)
+        if job is None:
+            self._json(404, {"error": f"unknown job {job_id}"})
+        return job
+
+    def do_POST(self):
+        if urlparse(self.path).path.rstrip("/") != "/jobs":
+            self._json(404, {"error": "not found"})
+            return
+        try:
+            length = int(self.headers.get("Content-Length", "0") or 0)
+            body = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError:
+            self._json(400, {"error": "body must be JSON"})
+            return
+        goal = str(body.get("goal") or "").strip() if isinstance(body, dict) else ""
+        if not goal or len(goal) > SERVICE_MAX_GOAL_CHARS:
+            self._json(400, {"error": f"goal is required (at most {SERVICE_MAX_GOAL_CHARS} characters)"})
+            return
+        try:
+            max_iterations = int(body.get("max_iterations") or 1)
+            job = self.server.service.submit(goal, max_iterations)
+        except AdmissionError as exc:
+            self._json(exc.status, {"error": str(exc)}, {"Retry-After": str(exc.retry_after)})
+            return
+        except ValueError:
+            self._json(400, {"error": "max_iterations must be an integer"})
+            return
+        self._json(202, {"id": job.id, "status": job.status}, {"Location": f"/jobs/{job.id}"})
+
+    def do_GET(self):
+        parsed = urlparse(self.path)
+        parts = [part for part in parsed.path.split("/") if part]
+        if parts == ["health"]:
+            self._json(200, self.server.service.stats())
+        elif parts == ["metrics"]:
+            self._send(200, render_prometheus(), "text/plain; version=0.0.4; charset=utf-8")
+        elif len(parts) == 2 and parts[0] == "jobs":
+            job = self._job(parts[1])
+            if job is not None:
+                self._json(200, job.summary())
+        elif len(parts) == 3 and parts[0] == "jobs" and parts[2] == "events":
+            job = self._job(parts[1])
+            if job is not None:
+                self._stream_events(job)
+        elif len(parts) == 3 and parts[0] == "jobs" and parts[2] in ("table", "result"):
+            job = self._job(parts[1])
+            if job is not None:
+                self._final(job, parts[2], parse_qs(parsed.query).get("format", ["json"])[0])
+        else:
+            self._json(404, {"error": "not found"})
+
+    def _stream_events(self, job: Job) -> None:
+        # Newline-delimited JSON, one line per finished node, closed after the final status line.
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+        sent = 0
+        try:
+            while True:
+                with job.changed:
+                    while sent == len(job.events) and job.status in (QUEUED, RUNNING):
+                        job.changed.wait(timeout=15)
+                        if sent == len(job.events) and job.status in (QUEUED, RUNNING):
+                            break
+                    pending = job.events[sent:]
+                    finished = job.status in (DONE, FAILED)
+                if pending:
+                    sent += len(pending)
+                    self.wfile.write("".join(json.dumps(event, ensure_ascii=False) + "\n" for event in pending).encode())
+                elif not finished:
+                    # Keeps proxies from closing an idle stream while a slow node runs.
+                    self.wfile.write(b'{"node": "heartbeat"}\n')
+                self.wfile.flush()
+                if finished and sent == len(job.events):
+                    break
+            self.wfile.write((json.dumps({"node": "__end__", **job.summary()}, ensure_ascii=False) + "\n").encode())
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    def _final(self, job: Job, what: str, fmt: str) -> None:
+        if job.status in (QUEUED, RUNNING):
+            self._json(409, {"error": f"job is {job.status}", "status": job.status})
+            return
+        if what == "result":
+            self._json(200, job.result or {})
+            return
+        columns, rows = _rows(job.result or {})
+        if fmt != "csv":
+            self._json(200, {"columns": columns, "rows": rows})
+            return
+        out = io.StringIO()
+        fieldnames = columns or sorted({key for row in rows for key in row})
+        writer = csv.DictWriter(out, fieldnames=fieldnames, quoting=csv.QUOTE_ALL, extrasaction="ignore")
+        writer.writeheader()
+        writer.writerows(rows)
+        self._send(200, out.getvalue(), "text/csv; charset=utf-8")
+
+
+class ServiceServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address: tuple[str, int], service: JobService):
+        super().__init__(address, _ServiceHandler)
+        self.service = service
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Serve the pipeline over HTTP with a warm graph and a job queue.")
+    parser.add_argument("--host", default=os.getenv("SERVICE_HOST", "127.0.0.1"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("SERVICE_PORT", "8765")))
+    parser.add_argument("--workers", type=int, default=SERVICE_WORKERS, help="Jobs run at the same time.")
+    parser.add_argument("--queue-size", type=int, default=SERVICE_QUEUE_SIZE, help="Jobs allowed to wait.")
+    parser.add_argument("--streaming", action="store_true", help="Use the overlapped scrape+retrieval node.")
+    parser.add_argument("--no-preload", action="store_true", help="Do not load the Ollama models at startup.")
+    return parser
+
+
+def main() -> int:
+    parser = build_parser()
+    args = parser.parse_args()
+    if args.streaming and RETRIEVAL_ENGINE != "keyword":
+        parser.error(f"--streaming only supports RETRIEVAL_ENGINE=keyword (got {RETRIEVAL_ENGINE})")
+    service = JobService(workers=args.workers, queue_size=args.queue_size, streaming=args.streaming)
+    service.start(preload=not args.no_preload)
+    server = ServiceServer((args.host, args.port), service)
+    print(
+        f"[SERVICE] listening on http://{args.host}:{server.server_address[1]} "
+        f"workers={service.workers} queue_size={args.queue_size}",
+        flush=True,
+    )
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.shutdown()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,85 @@
+from __future__ import annotations
+
+import asyncio
+import os
+import threading
+import weakref
+from concurrent.futures import Future
+from typing import Any, Awaitable, Callable, Dict
+
+
+SINGLE_FLIGHT_ENABLED = os.getenv("SINGLE_FLIGHT_ENABLED", "1") == "1"
+
+_STATS_LOCK = threading.Lock()
+_STATS: Dict[str, Dict[str, int]] = {}
+
+
+def is_enabled() -> bool:
+    return os.getenv("SINGLE_FLIGHT_ENABLED", "1" if SINGLE_FLIGHT_ENABLED else "0") == "1"
+
+
+def _record(name: str, key: str) -> None:
+    with _STATS_LOCK:
+        entry = _STATS.setdefault(name, {"leaders": 0, "shared": 0})
+        entry[key] += 1
+
+
+def single_flight_stats() -> Dict[str, Dict[str, int]]:
+    with _STATS_LOCK:
+        return {name: dict(entry) for name, entry in _STATS.items()}
+
+
+# Collapses identical calls that are in flight at the same moment: the first caller for a key
+# runs the work and every caller arriving before it finishes waits for and shares its result.
+# Nothing is kept afterwards; the page and LLM caches cover repeats that do not overlap.
+# Threads share a concurrent Future; coroutines share a task on their own event loop.
+class SingleFlight:
+    def __init__(self, name: str):
+        self.name = name
+        self._lock = threading.Lock()
+        self._calls: Dict[str, Future] = {}
+        self._tasks: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[str, asyncio.Task]]" = (
+            weakref.WeakKeyDictionary()
+        )
+
+    def do(self, key: str, fn: Callable[[], Any]) -> Any:
+        if not key or not is_enabled():
+            return fn()
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = self._calls[key] = Future()
+        if not leader:
+            _record(self.name, "shared")
+            return future.result()
+
+        _record(self.name, "leaders")
+        try:
+            result = fn()
+        except BaseException as exc:
+            future.set_exception(exc)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+
+    async def do_async(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        if not key or not is_enabled():
+            return await fn()
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            tasks = self._tasks.setdefault(loop, {})
+        task = tasks.get(key)
+        if task is not None:
+            _record(self.name, "shared")
+        else:
+            _record(self.name, "leaders")
+            task = tasks[key] = loop.create_task(fn())
+            task.add_done_callback(lambda _, key=key: tasks.pop(key, None))
+        # Shielded so a caller that is cancelled (a timeout, a stream deadline) does not cancel
+        # the work the other callers are waiting on.
+        return await asyncio.shield(task)
@@ -14,9 +14,11 @@ class AgentState(TypedDict):
     url_audit: List[Dict[str, Any]]
     scraped_docs: List[Dict[str, Any]]
     retrieved_chunks: List[Dict[str, Any]]
+    retrieval_hit_scores: List[float]
 
     extracted_items: List[Dict[str, Any]]
     extracted_output: Any
+    context_pack: Dict[str, Any]
 
     agent_confidences: Dict[str, float]
     diversity_score: float
@@ -26,6 +28,8 @@ class AgentState(TypedDict):
     iteration: int
     max_iterations: int
     orchestrator_action: str
+    run_registry: Dict[str, Dict[str, int]]
+    iteration_stats: List[Dict[str, Any]]
     errors: List[str]
 
 
@@ -40,8 +44,10 @@ def make_initial_state(goal: str, max_iterations: int = 2) -> AgentState:
         "url_audit": [],
         "scraped_docs": [],
         "retrieved_chunks": [],
+        "retrieval_hit_scores": [],
         "extracted_items": [],
         "extracted_output": {"columns": [], "rows": []},
+        "context_pack": {},
         "agent_confidences": {},
         "diversity_score": 0.0,
         "content_coverage": 0.0,
@@ -49,5 +55,7 @@ def make_initial_state(goal: str, max_iterations: int = 2) -> AgentState:
         "iteration": 0,
         "max_iterations": max_iterations,
         "orchestrator_action": "",
+        "run_registry": {},
+        "iteration_stats": [],
         "errors": [],
     }
@@ -0,0 +1,162 @@
+from __future__ import annotations
+
+import heapq
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeoutError, as_completed
+from typing import Dict, List, Optional
+
+try:
+    from bm25_index import query_terms
+    from metrics import carry_context
+    from retrieval_agent import (
+        MAX_CHUNKS,
+        _chunk_index,
+        _doc_hits,
+        _drop_duplicate_chunks,
+        _finish_retrieval,
+        _gated_chunks,
+        _score_doc,
+    )
+    from run_registry import carried, doc_url, mark_done, paper_url, record_stage
+    from scrape_agent import (
+        _doc_index,
+        _drop_near_duplicates,
+        _finish_scrape,
+        _papers_to_scrape,
+        _scrape_paper,
+        _scrape_settings,
+        get_host_limiter,
+    )
+except ImportError:
+    from .bm25_index import query_terms
+    from .metrics import carry_context
+    from .retrieval_agent import (
+        MAX_CHUNKS,
+        _chunk_index,
+        _doc_hits,
+        _drop_duplicate_chunks,
+        _finish_retrieval,
+        _gated_chunks,
+        _score_doc,
+    )
+    from .run_registry import carried, doc_url, mark_done, paper_url, record_stage
+    from .scrape_agent import (
+        _doc_index,
+        _drop_near_duplicates,
+        _finish_scrape,
+        _papers_to_scrape,
+        _scrape_paper,
+        _scrape_settings,
+        get_host_limiter,
+    )
+
+
+# 0 disables the early start: extraction waits for every document, and the result matches
+# the scrape -> retrieval barrier pipeline exactly.
+STREAM_EXTRACT_MIN_CHUNKS = max(0, int(os.getenv("STREAM_EXTRACT_MIN_CHUNKS", "0")))
+STREAM_EXTRACT_MIN_SCORE = float(os.getenv("STREAM_EXTRACT_MIN_SCORE", "0.5"))
+STREAM_DEADLINE_SECONDS = float(os.getenv("STREAM_DEADLINE_SECONDS", "0"))
+
+
+class _TopK:
+    def __init__(self, k: int):
+        self.k = k
+        self._heap: List[tuple] = []
+
+    def push(self, doc_idx: int, hits: List[Dict]) -> None:
+        # Ties break on document order, then on rank within the document, which is the
+        # order the barrier version's stable sorts produce.
+        for rank, hit in enumerate(hits):
+            entry = (hit["score"], -doc_idx, -rank, hit)
+            if len(self._heap) < self.k:
+                heapq.heappush(self._heap, entry)
+            elif entry[:3] > self._heap[0][:3]:
+                heapq.heapreplace(self._heap, entry)
+
+    def count_at_least(self, score: float) -> int:
+        return sum(1 for entry in self._heap if entry[0] >= score)
+
+    def items(self) -> List[Dict]:
+        return [entry[3] for entry in sorted(self._heap, key=lambda e: e[:3], reverse=True)]
+
+
+def scrape_retrieval_node(state):
+    goal = state["goal"]
+    use_playwright, playwright_first, max_workers, per_host = _scrape_settings()
+    min_chunks = max(0, int(os.getenv("STREAM_EXTRACT_MIN_CHUNKS", str(STREAM_EXTRACT_MIN_CHUNKS))))
+    min_score = float(os.getenv("STREAM_EXTRACT_MIN_SCORE", str(STREAM_EXTRACT_MIN_SCORE)))
+    deadline_seconds = float(os.getenv("STREAM_DEADLINE_SECONDS", str(STREAM_DEADLINE_SECONDS)))
+
+    papers = _papers_to_scrape(state)
+    limiter = get_host_limiter(per_host)
+    docs: List[Optional[dict]] = [None] * len(papers)
+    top_k = _TopK(MAX_CHUNKS)
+    # Chunks kept by earlier iterations compete with the new ones and win ties, as earlier documents do.
+    previous = carried(state, "retrieved_chunks")
+    top_k.push(-1, previous)
+    # Confidence averages every hit so far, including earlier ones that fell out of the top-k.
+    hit_scores: List[float] = carried(state, "retrieval_hit_scores")
+    started = time.monotonic()
+    finished = 0
+    # Fetches cancelled by an early start stay unregistered so the next iteration retries them.
+    completed: List[dict] = []
+    terms = query_terms(goal)
+    doc_index = _doc_index(carried(state, "scraped_docs"))
+    chunk_index = _chunk_index(previous)
+
+    if papers:
+        executor = ThreadPoolExecutor(max_workers=min(max_workers, len(papers)))
+        try:
+            futures = {
+                executor.submit(carry_context(_scrape_paper), paper, use_playwright, playwright_first, limiter): idx
+                for idx, paper in enumerate(papers)
+            }
+            timeout = deadline_seconds if deadline_seconds > 0 else None
+            try:
+                # Each document is chunked and scored here while the pool keeps fetching the rest.
+                for future in as_completed(futures, timeout=timeout):
+                    idx = futures[future]
+                    finished += 1
+                    completed.append(papers[idx])
+                    try:
+                        doc = future.result()
+                    except Exception as exc:
+                        state["errors"].append(f"scrape-failed: {type(exc).__name__}: {exc}")
+                        continue
+                    if doc is None or not _drop_near_duplicates([doc], doc_index):
+                        continue
+                    docs[idx] = doc
+                    print(
+                        f"[STREAM] scoring doc {finished}/{len(papers)}: {doc.get('title', '')[:80]}",
+                        flush=True,
+                    )
+                    gated = _drop_duplicate_chunks(_gated_chunks(doc, terms), chunk_index)
+                    hits = _doc_hits(doc, _score_doc(doc, goal, state["errors"], gated=gated))
+                    top_k.push(idx, hits)
+                    hit_scores.extend(hit["score"] for hit in hits)
+
+                    if min_chunks and finished < len(papers) and top_k.count_at_least(min_score) >= min_chunks:
+                        print(
+                            f"[STREAM] {min_chunks} chunks >= {min_score} after {finished}/{len(papers)} docs; "
+                            "starting extraction",
+                            flush=True,
+                        )
+                        break
+            except FuturesTimeoutError:
+                print(
+                    f"[STREAM] deadline {deadline_seconds}s reached after {finished}/{len(papers)} docs; "
+                    "starting extraction",
+                    flush=True,
+                )
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    scored = [doc for doc in docs if doc is not None]
+    mark_done(state, "scrape", completed, paper_url)
+    record_stage(state, "retrieval", processed=len(scored), skipped=len(carried(state, "scraped_docs")))
+    mark_done(state, "retrieval", scored, doc_url)
+    _finish_scrape(state, scored, use_playwright, playwright_first, deduped=True)
+    _finish_retrieval(state, top_k.items(), hit_scores)
+    print(f"[STREAM] scrape+retrieval finished in {time.monotonic() - started:.2f}s", flush=True)
+    return state